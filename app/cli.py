@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Command Line
+הרצת ייצואים, פעולות המוניות וחימום מטמונים ללא דפדפן (cron / שרת עבודות)
+
+משתמש באותם רכיבים כמו הדפים: SafeQAPI, סינון ההרשאות לפי מחלקות, ייצוא
+ההיסטוריה בזרימה, בדיקת התקינות של ההעלאה ההמונית והמאגר של החישוב הלילי.
+כל פעולה נרשמת ביומן הביקורת עם access_level=cli.
+
+הרצה (מתיקיית הפרויקט, עם אותם משתני סביבה / secrets של האפליקציה):
+    python app/cli.py export-history --start 2026-09-01 --end 2026-09-30 --format parquet -o sep.parquet
+    python app/cli.py export-history --start 2026-09-01 --end 2026-09-30 --as-user manager1 -o sep.csv
+    python app/cli.py bulk-upload users.csv --workers 8
+    python app/cli.py sync-groups memberships.csv --remove-extra --dry-run
+    python app/cli.py warm-cache --month 2026-08 --month 2026-09 --workers 2
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+
+from config import config
+from shared import SafeQAPI
+from permissions import extract_departments_from_groups, fetch_local_user_groups, filter_groups_by_departments
+from utils.audit_schema import ensure_audit_schema
+from utils.audit_writer import get_audit_writer
+from utils.audit_retention import months_back
+from utils.history_export import EXPORT_FORMATS, HISTORY_PAGE_SIZE, export_history, parquet_available
+from utils.report_precompute import full_month_of_range, get_report_store, precompute_month
+
+CONFIG = config.get()
+
+# כמו בדוח ההיסטוריה
+STATUS_FILTERS = {
+    'executed': [1, 5],  # הודפס, התקבל
+    'failed': [2, 3, 4],  # נמחק, פג תוקף, נכשל
+    'all': None,
+}
+
+CLI_USER = 'cli'
+
+
+# ---------- עזרים ----------
+
+def _audit(action: str, details: str, success: bool = True, username: str = CLI_USER):
+    """רישום ביומן הביקורת (כמו AuditLogger, ללא session של Streamlit)"""
+    if not (CONFIG.get('LOG_TO_FILE', True) or CONFIG.get('LOG_TO_DATABASE', True)):
+        return
+    if CONFIG.get('LOG_TO_DATABASE', True):
+        ensure_audit_schema(CONFIG.get('DATABASE_PATH', 'safeq_audit.db'))
+    get_audit_writer().submit({
+        'timestamp': datetime.now().isoformat(), 'username': username, 'user_email': '',
+        'user_groups': '', 'action': action, 'details': details, 'session_id': 'cli',
+        'success': success, 'access_level': 'cli'
+    })
+
+
+def _parse_date(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {value!r}")
+
+
+def _parse_month(value: str) -> str:
+    try:
+        return datetime.strptime(value, '%Y-%m').strftime('%Y-%m')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got {value!r}")
+
+
+def resolve_scope(api, departments: Optional[str], as_user: Optional[str]) -> list:
+    """
+    היקף המחלקות לפעולה: רשימה מפורשת, המחלקות של משתמש מקומי, או ["ALL"]
+
+    as_user מחושב כמו בהתחברות של משתמש מקומי (הקבוצות שלו בפורמט מחלקה).
+    """
+    if as_user:
+        return extract_departments_from_groups(fetch_local_user_groups(api, as_user))
+    if departments:
+        return [name.strip() for name in departments.split(',') if name.strip()]
+    return ["ALL"]
+
+
+def run_pool(items: Iterable, func: Callable, workers: int, label: str) -> List[Tuple[object, object]]:
+    """הרצת func על כל פריט ב-workers threads, עם שורת התקדמות; מחזיר [(פריט, תוצאה)]"""
+    items = list(items)
+    results = []
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='cli') as executor:
+        for done, (item, result) in enumerate(zip(items, executor.map(func, items)), start=1):
+            results.append((item, result))
+            print(f"\r{label}: {done}/{len(items)}", end='', file=sys.stderr, flush=True)
+    if items:
+        print(file=sys.stderr)
+    return results
+
+
+# ---------- export-history ----------
+
+def cmd_export_history(args) -> int:
+    api = SafeQAPI()
+    if args.format == 'parquet' and not parquet_available():
+        print("Parquet export requires pyarrow (pip install pyarrow)", file=sys.stderr)
+        return 2
+    if args.start > args.end:
+        print("--start must not be after --end", file=sys.stderr)
+        return 2
+
+    scope = resolve_scope(api, args.departments, args.as_user)
+    if not scope:
+        print(f"User {args.as_user} has no departments", file=sys.stderr)
+        return 1
+
+    output = args.output or f"history_{args.start}_{args.end}.{EXPORT_FORMATS[args.format]['extension']}"
+    filters = {'username': args.username, 'portname': args.printer, 'jobtype': args.job_type}
+
+    # חודש שחושב מראש נקרא מהמאגר המקומי (כשאין פילטרים לשרת)
+    pages = None
+    month = full_month_of_range(args.start, args.end)
+    if month and not args.no_store and not any(filters.values()):
+        pages = get_report_store().iter_month_pages(month, scope)
+        if pages is not None:
+            print(f"Using precomputed month {month}", file=sys.stderr)
+
+    started = time.monotonic()
+    rows = export_history(
+        api, args.format, output, args.start, args.end,
+        allowed_departments=scope, statuses=STATUS_FILTERS[args.status], page_size=args.page_size,
+        progress=lambda count: print(f"\rrows: {count:,}", end='', file=sys.stderr, flush=True),
+        pages=pages, **filters
+    )
+    print(file=sys.stderr)
+    print(f"Wrote {rows:,} rows to {output} in {time.monotonic() - started:.1f}s")
+    _audit("CLI Export History", f"{args.start} to {args.end}, {args.format}, {rows} rows, scope: {', '.join(scope)}")
+    return 0
+
+
+# ---------- bulk-upload ----------
+
+def _distinct(column) -> List[str]:
+    """ערכים לא ריקים וייחודיים בעמודה, אחרי strip"""
+    return list(dict.fromkeys(value for value in column.str.strip() if value))
+
+
+def cmd_bulk_upload(args) -> int:
+    # בדיקת התקינות ומיפוי השורות - כמו בדף ההעלאה ההמונית
+    from pages.users.bulk_upload_users import read_users_csv, row_to_user_details, validate_excel_data
+
+    api = SafeQAPI()
+    df = read_users_csv(args.file)
+    print(f"Loaded {len(df)} rows from {args.file}", file=sys.stderr)
+
+    # בדיקות הקיום במערכת (שם משתמש / PIN) במקביל, ולא שורה אחרי שורה
+    checks = [('username', value) for value in _distinct(df['username'])]
+    checks += [('pin', value) for value in _distinct(df['shortid'])]
+
+    def check(item):
+        kind, value = item
+        return api.check_username_exists(value) if kind == 'username' else api.check_pin_exists(value)
+
+    known = dict(run_pool(checks, check, args.workers, 'checked'))
+    validated_df, general_errors = validate_excel_data(df, api, known=known)
+    for error in general_errors:
+        print(error, file=sys.stderr)
+    invalid = validated_df[validated_df['status'] != '✅ תקין']
+    for _, row in invalid.iterrows():
+        print(f"  {row['username']}: {row['error_message']}", file=sys.stderr)
+    if general_errors and not args.force:
+        print("File has general errors - fix them or pass --force", file=sys.stderr)
+        return 1
+
+    rows = [row_to_user_details(row) for _, row in validated_df[validated_df['status'] == '✅ תקין'].iterrows()]
+    print(f"{len(rows)} valid, {len(invalid)} invalid", file=sys.stderr)
+    if args.dry_run or not rows:
+        return 0 if invalid.empty else 1
+
+    provider_id = CONFIG['PROVIDERS']['LOCAL']
+
+    def create(item):
+        username, details = item
+        try:
+            return bool(api.create_user(username, provider_id, details))
+        except Exception as e:
+            print(f"\n[ERROR] {username}: {e}", file=sys.stderr)
+            return False
+
+    results = run_pool(rows, create, args.workers, 'created')
+    failed = [username for (username, _), ok in results if not ok]
+    for username in failed:
+        print(f"  failed: {username}", file=sys.stderr)
+    success = len(results) - len(failed)
+    print(f"Created {success} users, {len(failed)} failed")
+    _audit("CLI Bulk Upload Completed", f"File: {os.path.basename(args.file)}, Success: {success}, Failed: {len(failed)}",
+           success=success > 0)
+    return 0 if not failed and invalid.empty else 1
+
+
+# ---------- sync-groups ----------
+
+def _member_name(member) -> str:
+    if isinstance(member, dict):
+        return member.get('userName') or member.get('username') or ''
+    return str(member)
+
+
+def read_memberships(path: str) -> Dict[str, set]:
+    """קובץ CSV עם עמודות username,group -> {קבוצה: משתמשים}"""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    missing = {'username', 'group'} - set(df.columns)
+    if missing:
+        raise ValueError(f"missing columns: {', '.join(sorted(missing))}")
+    desired: Dict[str, set] = {}
+    for username, group in zip(df['username'].str.strip(), df['group'].str.strip()):
+        if username and group:
+            desired.setdefault(group, set()).add(username.lower())
+    return desired
+
+
+def cmd_sync_groups(args) -> int:
+    api = SafeQAPI()
+    try:
+        desired = read_memberships(args.file)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read {args.file}: {e}", file=sys.stderr)
+        return 2
+
+    # רק קבוצות שבהיקף ההרשאות (כמו בדף הקבוצות)
+    scope = resolve_scope(api, args.departments, args.as_user)
+    groups = filter_groups_by_departments(api.get_groups(CONFIG['PROVIDERS']['LOCAL'], max_records=500), scope)
+    known = {group.get('groupName') or group.get('name') for group in groups}
+    out_of_scope = sorted(set(desired) - known)
+    for group in out_of_scope:
+        print(f"  skipped (unknown or out of scope): {group}", file=sys.stderr)
+
+    names = sorted(set(desired) & known)
+    members = dict(run_pool(names, lambda group: api.get_group_members(group, strict=True), args.workers,
+                            'groups read'))
+
+    # קבוצה שלא נקראה לא נחשבת ריקה - אחרת כל החברים בה היו "מתווספים" מחדש
+    unreadable = [group for group in names if members[group] is None]
+    for group in unreadable:
+        print(f"  skipped (members could not be read): {group}", file=sys.stderr)
+    names = [group for group in names if members[group] is not None]
+
+    changes = []  # (פעולה, משתמש, קבוצה)
+    for group in names:
+        current = {_member_name(member).lower() for member in members[group]}
+        changes += [('add', username, group) for username in sorted(desired[group] - current)]
+        if args.remove_extra:
+            changes += [('remove', username, group) for username in sorted(current - desired[group])]
+
+    for action, username, group in changes:
+        print(f"  {action:6} {username} -> {group}", file=sys.stderr)
+    if args.dry_run or not changes:
+        print(f"{len(changes)} changes{' (dry run)' if args.dry_run else ''}")
+        return 1 if unreadable else 0
+
+    def apply(change):
+        action, username, group = change
+        if action == 'add':
+            return api.add_user_to_group(username, group)
+        return api.remove_user_from_group(username, group)
+
+    results = run_pool(changes, apply, args.workers, 'changes')
+    failed = [change for change, ok in results if not ok]
+    for action, username, group in failed:
+        print(f"  failed: {action} {username} -> {group}", file=sys.stderr)
+    print(f"Applied {len(results) - len(failed)} changes, {len(failed)} failed")
+    _audit("CLI Sync Groups",
+           f"File: {os.path.basename(args.file)}, Groups: {len(names)}, Applied: {len(results) - len(failed)}, "
+           f"Failed: {len(failed)}, Unreadable groups: {len(unreadable)}", success=not failed and not unreadable)
+    return 1 if failed or out_of_scope or unreadable else 0
+
+
+# ---------- warm-cache ----------
+
+def cmd_warm_cache(args) -> int:
+    store = get_report_store()
+    months = args.month or [months_back(datetime.now().date(), 1).strftime('%Y-%m')]
+    current = datetime.now().strftime('%Y-%m')
+    for month in months:
+        if month >= current:
+            print(f"{month} is not finished yet", file=sys.stderr)
+            return 2
+
+    todo = [month for month in months if args.force or not store.has_month(month)]
+    for month in sorted(set(months) - set(todo)):
+        print(f"  {month}: already precomputed (--force to recompute)", file=sys.stderr)
+
+    def compute(month):
+        try:
+            # API נפרד לכל thread
+            return precompute_month(SafeQAPI(), store, month)
+        except Exception as e:
+            print(f"\n[ERROR] {month}: {e}", file=sys.stderr)
+            return None
+
+    results = run_pool(todo, compute, args.workers, 'months')
+    for month, result in results:
+        if result is not None:
+            print(f"{month}: {result['documents']:,} documents, {result['pages']:,} pages, "
+                  f"{result['users']:,} users ({result['duration']:.1f}s)")
+    failed = [month for month, result in results if result is None]
+    if todo:
+        _audit("CLI Precompute Reports", f"Months: {', '.join(todo)}, Failed: {len(failed)}", success=not failed)
+    return 1 if failed else 0
+
+
+# ---------- parser ----------
+
+def _add_scope_arguments(parser: argparse.ArgumentParser):
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument('--departments', help='מחלקות מופרדות בפסיק (ברירת מחדל: הכל)')
+    scope.add_argument('--as-user', help='היקף ההרשאות של משתמש מקומי (לפי הקבוצות שלו)')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='SafeQ Cloud Manager command line')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export = subparsers.add_parser('export-history', help='ייצוא היסטוריית מסמכים ל-CSV/Parquet')
+    export.add_argument('--start', type=_parse_date, required=True, help='YYYY-MM-DD')
+    export.add_argument('--end', type=_parse_date, required=True, help='YYYY-MM-DD (כולל)')
+    export.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    export.add_argument('-o', '--output', help='קובץ היעד (ברירת מחדל: history_<start>_<end>.<ext>)')
+    export.add_argument('--status', choices=sorted(STATUS_FILTERS), default='executed')
+    export.add_argument('--username', help='סינון לפי משתמש (בשרת)')
+    export.add_argument('--printer', help='סינון לפי מדפסת (בשרת)')
+    export.add_argument('--job-type', help='PRINT / COPY / SCAN / FAX')
+    export.add_argument('--page-size', type=int, default=HISTORY_PAGE_SIZE)
+    export.add_argument('--no-store', action='store_true', help='לא לקרוא חודש שחושב מראש מהמאגר המקומי')
+    _add_scope_arguments(export)
+    export.set_defaults(func=cmd_export_history)
+
+    upload = subparsers.add_parser('bulk-upload', help='יצירת משתמשים מקומיים מקובץ CSV (כמו בדף ההעלאה)')
+    upload.add_argument('file', help='CSV ללא כותרות: username,full_name,email,password,shortid,department')
+    upload.add_argument('--workers', type=int, default=4, help='בדיקות ויצירות מקבילות')
+    upload.add_argument('--dry-run', action='store_true', help='בדיקת תקינות בלבד')
+    upload.add_argument('--force', action='store_true', help='להעלות את השורות התקינות גם כשיש שגיאות כלליות')
+    upload.set_defaults(func=cmd_bulk_upload)
+
+    sync = subparsers.add_parser('sync-groups', help='סנכרון חברות בקבוצות מקובץ CSV')
+    sync.add_argument('file', help='CSV עם כותרות username,group')
+    sync.add_argument('--workers', type=int, default=4, help='קריאות API מקבילות')
+    sync.add_argument('--remove-extra', action='store_true', help='הסרת חברים שאינם בקובץ מהקבוצות שבקובץ')
+    sync.add_argument('--dry-run', action='store_true', help='הצגת השינויים בלבד')
+    _add_scope_arguments(sync)
+    sync.set_defaults(func=cmd_sync_groups)
+
+    warm = subparsers.add_parser('warm-cache', help='חישוב מוקדם של דוחות חודשיים למאגר המקומי')
+    warm.add_argument('--month', type=_parse_month, action='append', help='YYYY-MM (ברירת מחדל: החודש הקודם)')
+    warm.add_argument('--workers', type=int, default=1, help='חודשים שמחושבים במקביל')
+    warm.add_argument('--force', action='store_true', help='חישוב מחדש גם אם כבר קיים')
+    warm.set_defaults(func=cmd_warm_cache)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
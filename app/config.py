@@ -99,6 +99,70 @@ class Config:
             'AUDIT_LOG_PATH': self._get_secret('AUDIT_LOG_PATH', 'safeq_audit.log'),
             'DATABASE_PATH': self._get_secret('DATABASE_PATH', 'safeq_audit.db'),
 
+            # Audit Writer - כתיבת ביקורת ברקע (async) או מיידית (sync, לבדיקות)
+            'AUDIT_WRITER_MODE': str(self._get_secret('AUDIT_WRITER_MODE', 'async')).lower(),
+            'AUDIT_QUEUE_SIZE': int(self._get_secret('AUDIT_QUEUE_SIZE', '10000')),
+            'AUDIT_BATCH_SIZE': int(self._get_secret('AUDIT_BATCH_SIZE', '200')),
+            'AUDIT_FLUSH_INTERVAL': float(self._get_secret('AUDIT_FLUSH_INTERVAL', '1.0')),
+
+            # Audit Retention - חודשים אחרונים בטבלה הראשית, ישנים יותר בקבצי חודש בארכיון
+            'AUDIT_RETENTION_ENABLED': self._get_secret('AUDIT_RETENTION_ENABLED', True),
+            'AUDIT_HOT_MONTHS': int(self._get_secret('AUDIT_HOT_MONTHS', '6')),
+            'AUDIT_ARCHIVE_DIR': self._get_secret('AUDIT_ARCHIVE_DIR', 'audit_archive'),
+            'AUDIT_COMPRESS_AFTER_MONTHS': int(self._get_secret('AUDIT_COMPRESS_AFTER_MONTHS', '12')),
+            'AUDIT_LOG_MAX_BYTES': int(self._get_secret('AUDIT_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+            'AUDIT_LOG_BACKUPS': int(self._get_secret('AUDIT_LOG_BACKUPS', '10')),
+            'AUDIT_MAINTENANCE_INTERVAL': int(self._get_secret('AUDIT_MAINTENANCE_INTERVAL', '3600')),
+            'AUDIT_MAINTENANCE_DELAY': int(self._get_secret('AUDIT_MAINTENANCE_DELAY', '600')),
+
+            # Audit Analytics - טבלאות סיכום יומיות (כוללות גם היסטוריה שעברה לארכיון)
+            'AUDIT_ANALYTICS_USE_SUMMARY': self._get_secret('AUDIT_ANALYTICS_USE_SUMMARY', True),
+
+            # Login - קריאות מקבילות ומטמון פרופילי הרשאות (שניות)
+            'PARALLEL_MAX_WORKERS': int(self._get_secret('PARALLEL_MAX_WORKERS', '16')),
+            'PERMISSION_CACHE_TTL': int(self._get_secret('PERMISSION_CACHE_TTL', '300')),
+            'PERMISSION_CACHE_MAX_ENTRIES': int(self._get_secret('PERMISSION_CACHE_MAX_ENTRIES', '1000')),
+            'GRAPH_TRANSITIVE_GROUPS': self._get_secret('GRAPH_TRANSITIVE_GROUPS', False),
+            'GRAPH_GROUPS_CACHE_TTL': int(self._get_secret('GRAPH_GROUPS_CACHE_TTL', '600')),
+
+            # OAuth State - memory (תהליך יחיד) או sqlite (כמה replicas על volume משותף)
+            'AUTH_STATE_BACKEND': str(self._get_secret('AUTH_STATE_BACKEND', 'memory')).lower(),
+            'AUTH_STATE_DB_PATH': self._get_secret('AUTH_STATE_DB_PATH', 'safeq_auth_state.db'),
+            'AUTH_STATE_TTL': int(self._get_secret('AUTH_STATE_TTL', '600')),
+
+            # Report Cache - מטמון דוחות משותף לכל ה-sessions
+            'REPORT_CACHE_MAX_ENTRIES': int(self._get_secret('REPORT_CACHE_MAX_ENTRIES', '64')),
+            'REPORT_CACHE_MAX_DOCUMENTS': int(self._get_secret('REPORT_CACHE_MAX_DOCUMENTS', '2000000')),
+            'REPORT_CACHE_TTL': int(self._get_secret('REPORT_CACHE_TTL', '300')),
+
+            # Instrumentation - מדידת זמנים לכל ריצה ופאנל דיבאג ל-superadmin
+            'INSTRUMENTATION_ENABLED': self._get_secret('INSTRUMENTATION_ENABLED', False),
+            'INSTRUMENTATION_WINDOW': int(self._get_secret('INSTRUMENTATION_WINDOW', '500')),
+
+            # Metrics - חשיפת מדדים בפורמט Prometheus בפורט צדדי
+            'METRICS_ENABLED': self._get_secret('METRICS_ENABLED', False),
+            'METRICS_HOST': self._get_secret('METRICS_HOST', '0.0.0.0'),
+            'METRICS_PORT': int(self._get_secret('METRICS_PORT', '9108')),
+            'METRICS_SESSION_IDLE': int(self._get_secret('METRICS_SESSION_IDLE', '900')),
+            'SAFEQ_API_RETRIES': int(self._get_secret('SAFEQ_API_RETRIES', '0')),
+
+            # Export Cache - קבצי Excel שהוכנו, לפי hash של תוכן הטבלה
+            'EXPORT_CACHE_MAX_MB': int(self._get_secret('EXPORT_CACHE_MAX_MB', '256')),
+            'EXPORT_CACHE_TTL': int(self._get_secret('EXPORT_CACHE_TTL', '900')),
+
+            # Background Jobs - שליפת דוחות ארוכים ב-threads רקע
+            'JOBS_MAX_WORKERS': int(self._get_secret('JOBS_MAX_WORKERS', '4')),
+            'JOBS_DIR': self._get_secret('JOBS_DIR', 'report_jobs'),
+            'JOBS_RESULT_TTL': int(self._get_secret('JOBS_RESULT_TTL', '3600')),
+            'JOBS_POLL_INTERVAL': int(self._get_secret('JOBS_POLL_INTERVAL', '2')),
+
+            # Monthly Report Precomputation - חישוב לילי של דוחות החודש הקודם
+            'REPORT_PRECOMPUTE_ENABLED': self._get_secret('REPORT_PRECOMPUTE_ENABLED', True),
+            'REPORT_PRECOMPUTE_HOUR': int(self._get_secret('REPORT_PRECOMPUTE_HOUR', '2')),
+            'REPORT_PRECOMPUTE_KEEP_MONTHS': int(self._get_secret('REPORT_PRECOMPUTE_KEEP_MONTHS', '13')),
+            'REPORT_PRECOMPUTE_CHECK_INTERVAL': int(self._get_secret('REPORT_PRECOMPUTE_CHECK_INTERVAL', '300')),
+            'REPORT_STORE_PATH': self._get_secret('REPORT_STORE_PATH', ''),
+
             # Emergency Local Users (from secrets.toml)
             'LOCAL_USERS': self._parse_emergency_users()
         }
@@ -9,10 +9,16 @@ Version: 2.0.1 - UI Overhaul Complete
 import streamlit as st
 import sys
 import os
+from functools import lru_cache
 
 # ייבוא config
 from config import config
 
+from utils.assets import cached_style, load_asset
+from utils.page_loader import lazy_show, page_load_report
+from utils.instrumentation import rerun_trace, show_debug_panel
+from utils.metrics import start_metrics_server, touch_session
+
 # ייבוא permissions
 from permissions import initialize_user_permissions
 
@@ -22,7 +28,7 @@ from main_utils import (
     is_session_valid,
     show_login_page,
     check_config,
-    AuditLogger,
+    get_logger_instance,
     SafeQAPI
 )
 
@@ -45,6 +51,13 @@ def apply_modern_styling_compact(rtl=False):
     """
     סטיילינג מודרני עם sidebar בצד ימין, צבעי Mafil, ורווחים מצומצמים
     """
+    # ה-CSS נבנה ומכווץ פעם אחת לכל כיוון (ראה utils/assets.py)
+    st.markdown(_compact_styles(rtl), unsafe_allow_html=True)
+
+
+@lru_cache(maxsize=2)
+def _compact_styles(rtl: bool) -> str:
+    """בלוק ה-CSS הראשי לפי כיוון (RTL/LTR)"""
     direction = "rtl" if rtl else "ltr"
     text_align = "right" if rtl else "left"
 
@@ -55,7 +68,7 @@ def apply_modern_styling_compact(rtl=False):
     hover_color = "#ffe4e9"  # אדום בהיר מאוד
     sidebar_bg = "#f8fafc"  # רקע עדין אפור-לבן
 
-    st.markdown(f"""
+    return cached_style(f"""
     <style>
         /* Global RTL/LTR */
         .stApp {{
@@ -490,7 +503,7 @@ def apply_modern_styling_compact(rtl=False):
             max-height: 10rem !important;
         }}
     </style>
-    """, unsafe_allow_html=True)
+    """)
 
 
 
@@ -508,7 +521,7 @@ def show_compact_user_info():
     level_text = role_names.get(role, "משתמש")
 
     # CSS לכפתורים וexpander זעירים
-    st.markdown("""
+    st.markdown(cached_style("""
     <style>
         /* כפתורים זעירים בהדר - עם רקע */
         div[data-testid="column"] .stButton > button {
@@ -555,7 +568,7 @@ def show_compact_user_info():
             margin: 0 0.2rem;
         }
     </style>
-    """, unsafe_allow_html=True)
+    """), unsafe_allow_html=True)
 
     # שורה עם expander משתמש ליד כפתורי פעולה
     col_user_exp, col_divider1, col_refresh, col_divider2, col_logout = st.columns([1.5, 0.1, 1, 0.1, 1])
@@ -671,26 +684,31 @@ def main():
     )
 
     init_session_state()
+    start_metrics_server()
+    # ייבוא כאן ולא בראש הקובץ - מסך ההתחברות לא טוען את מודולי הדוחות
+    from utils.report_precompute import start_precompute_scheduler
+    start_precompute_scheduler(SafeQAPI)
 
     # Apply compact styling
     is_logged_in = st.session_state.get('logged_in', False) and is_session_valid()
+    touch_session(st.session_state.session_id, is_logged_in)
     apply_modern_styling_compact(rtl=is_logged_in)
 
     # Hide sidebar before login
     if not is_logged_in:
-        st.markdown("""
+        st.markdown(cached_style("""
         <style>
             section[data-testid="stSidebar"] {
                 display: none !important;
             }
         </style>
-        """, unsafe_allow_html=True)
+        """), unsafe_allow_html=True)
 
     # בדיקת אימות
     if not is_logged_in:
         if st.session_state.get('logged_in') and not is_session_valid():
             st.warning("⚠️ פג תוקף ההתחברות. אנא התחבר שוב.")
-            logger = AuditLogger()
+            logger = get_logger_instance()
             logger.log_action(st.session_state.get('username', 'Unknown'), "Session Expired", "Timeout")
 
             for key in ['logged_in', 'username', 'user_email', 'user_groups',
@@ -705,28 +723,9 @@ def main():
 
     # ===== Sticky Header אמיתי עם HTML טהור =====
 
-    # פונקציה להמרת תמונה ל-base64
-    import base64
-    def img_to_base64(path):
-        try:
-            with open(path, "rb") as f:
-                return base64.b64encode(f.read()).decode()
-        except:
-            return ""
-
-    # טעינת לוגואים
-    import sys
-    import os
-    def resource_path(relative_path: str) -> str:
-        if hasattr(sys, "_MEIPASS"):
-            return os.path.join(sys._MEIPASS, relative_path)
-        return os.path.join(os.path.abspath("."), relative_path)
-
-    mafil_logo_path = resource_path("assets/MafilIT_Logo.png")
-    amit_logo_path = resource_path("assets/Amit_Logo.jpg")
-
-    mafil_logo_b64 = img_to_base64(mafil_logo_path) if os.path.exists(mafil_logo_path) else ""
-    amit_logo_b64 = img_to_base64(amit_logo_path) if os.path.exists(amit_logo_path) else ""
+    # טעינת לוגואים - נקראים ומקודדים פעם אחת לכל תהליך (ראה utils/assets.py)
+    mafil_logo = load_asset("assets/MafilIT_Logo.png")
+    amit_logo = load_asset("assets/Amit_Logo.jpg")
 
     # פרטי משתמש
     username = st.session_state.get('username', 'משתמש')
@@ -735,13 +734,13 @@ def main():
     role_text = role_names.get(role, "משתמש")
 
     # הכנת HTML לוגו Amit
-    if amit_logo_b64:
-        amit_logo_html = f'<img src="data:image/png;base64,{amit_logo_b64}" alt="Amit Logo" class="logo-amit">'
+    if amit_logo:
+        amit_logo_html = f'<img src="{amit_logo.data_uri}" alt="Amit Logo" class="logo-amit">'
     else:
         amit_logo_html = '<div style="width: 4rem;"></div>'
 
     # CSS Header Styles
-    st.markdown("""
+    st.markdown(cached_style("""
     <style>
         /* כפתור סיידבר נשאר גלוי אבל קטן */
         header[data-testid="stHeader"] {
@@ -883,12 +882,12 @@ def main():
             cursor: pointer !important;
         }
     </style>
-    """, unsafe_allow_html=True)
+    """), unsafe_allow_html=True)
 
     # HTML Header - נפרד מה-CSS
     header_html = f"""
     <div class="custom-header">
-        <img src="data:image/png;base64,{mafil_logo_b64}" alt="Mafil Logo" class="logo-mafil">
+        <img src="{mafil_logo.data_uri if mafil_logo else ''}" alt="Mafil Logo" class="logo-mafil">
         <div class="custom-header-title">
             <span class="title-mafil">Mafil</span>
             <span class="title-services">Cloud Manager</span>
@@ -899,7 +898,7 @@ def main():
     st.markdown(header_html, unsafe_allow_html=True)
 
     # CSS למיקום הכפתורים בצד שמאל של ההדר
-    st.markdown("""
+    st.markdown(cached_style("""
     <style>
         /* הסתרת marker */
         #header-controls-marker {
@@ -945,7 +944,7 @@ def main():
             box-shadow: 0 4px 12px rgba(0,0,0,0.15) !important;
         }
     </style>
-    """, unsafe_allow_html=True)
+    """), unsafe_allow_html=True)
 
     # Marker div for CSS targeting
     st.markdown('<div id="header-controls-marker"></div>', unsafe_allow_html=True)
@@ -976,18 +975,19 @@ def main():
     if not check_config():
         st.stop()
 
-    # ייבוא דפים (רק אחרי login!)
-    from pages.my_activity import show as my_activity_show
-    from pages.users.user_list import show as users_list_show
-    from pages.users.search_edit import show as users_search_show
-    from pages.users.add_user import show as users_add_show
-    from pages.users.bulk_upload_users import show as users_bulk_upload_show
-    from pages.groups.groups import show as users_groups_show
-    from pages.printers import show as printers_show
-    from pages.print_queues import show as print_queues_show
-    from pages.pending_prints import show as pending_prints_show
-    from pages.scanning import show as scanning_show
-    from pages.reports import show as reports_show
+    # רישום דפים - כל מודול דף נטען רק בכניסה הראשונה אליו (ראה utils/page_loader.py)
+    my_activity_show = lazy_show('pages.my_activity')
+    audit_analytics_show = lazy_show('pages.audit_analytics')
+    users_list_show = lazy_show('pages.users.user_list')
+    users_search_show = lazy_show('pages.users.search_edit')
+    users_add_show = lazy_show('pages.users.add_user')
+    users_bulk_upload_show = lazy_show('pages.users.bulk_upload_users')
+    users_groups_show = lazy_show('pages.groups.groups')
+    printers_show = lazy_show('pages.printers')
+    print_queues_show = lazy_show('pages.print_queues')
+    pending_prints_show = lazy_show('pages.pending_prints')
+    scanning_show = lazy_show('pages.scanning')
+    reports_show = lazy_show('pages.reports')
 
     # הגדרת דפים עם st.Page() - עם URL ייחודי לכל אחד
     # דפי משתמשים
@@ -1012,6 +1012,7 @@ def main():
 
     # דף הפעילות שלי
     my_activity_page = st.Page(my_activity_show, title="הפעילות שלי", icon="📋", url_path="my_activity")
+    audit_analytics_page = st.Page(audit_analytics_show, title="מגמות שימוש", icon="📈", url_path="audit_analytics")
 
     # דף הבית - עם גישה לאובייקטי Page
     from pages.home import create_home_page
@@ -1046,6 +1047,17 @@ def main():
             st.write(f"Username: {st.session_state.get('username', 'N/A')}")
             st.write(f"Auth Method: {st.session_state.get('auth_method', 'N/A')}")
 
+        if role == 'superadmin':
+            with st.expander("⏱️ זמני טעינת דפים", expanded=False):
+                load_report = page_load_report()
+                if load_report:
+                    for entry in load_report:
+                        st.write(f"{entry['module']}: {entry['ms']}ms")
+                else:
+                    st.caption("עדיין לא נטענו דפים בתהליך הזה")
+
+            show_debug_panel()
+
     # בדיקת הרשאה לגישה לרשימת משתמשים
     # רק superadmin או admin מקומי (משתמש חירום) רואים את רשימת המשתמשים
     can_view_user_list = (role == 'superadmin') or (role == 'admin' and local_username)
@@ -1067,13 +1079,18 @@ def main():
         if st.session_state.get('auth_method') == 'local' and role == 'superadmin':
             user_pages.append(users_bulk_upload_page)
 
+        # מגמות שימוש - מנהלים בלבד
+        activity_pages = [my_activity_page]
+        if role in ('admin', 'superadmin'):
+            activity_pages.append(audit_analytics_page)
+
         nav = st.navigation({
             "ראשי": [home_page],
             "👥 משתמשים": user_pages,
             "🖨️ מדפסות ותורי הדפסה": [printers_page, print_queues_page, pending_prints_page],
             # "📄 סריקה": [scanning_page],  # מוסתר זמנית - לשימוש עתידי
             "📊 דוחות היסטוריים": [reports_page],
-            "📋פעילות": [my_activity_page]
+            "📋פעילות": activity_pages
         })
 
     # בדיקת חיבור בסיידבר
@@ -1082,7 +1099,7 @@ def main():
         st.markdown("##### 🔌 בדיקת חיבור")
         if st.button("בדוק חיבור לשרת", key="sidebar_test_connection", use_container_width=True):
             api = SafeQAPI()
-            logger = AuditLogger()
+            logger = get_logger_instance()
             with st.spinner("בודק..."):
                 if api.test_connection():
                     st.success("✅ החיבור תקין!")
@@ -1101,7 +1118,8 @@ def main():
 
 if __name__ == "__main__":
     try:
-        main()
+        with rerun_trace('main'):
+            main()
     except Exception as e:
         st.error(f"שגיאה קריטית: {str(e)}")
         st.exception(e)
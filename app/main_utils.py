@@ -6,19 +6,23 @@ SafeQ Cloud Manager - Main Application
 
 import streamlit as st
 import requests
-import pandas as pd
 import urllib3
 from typing import Dict, List, Optional
 import json
 import os
-import sqlite3
 import re
 from datetime import datetime, timedelta
-import msal
 import sys
 
 # ייבוא config
 from config import config
+from utils.audit_writer import get_audit_writer, get_audit_retention
+from shared import AuditLogger, get_logger_instance
+from utils.parallel import run_parallel
+from utils.graph_groups import get_group_resolver, GraphGroupsError
+from utils.auth_state import get_auth_state_store
+from utils.audit_queries import AuditQuery, COLUMNS as AUDIT_COLUMNS
+from utils.instrumentation import create_http_session, instrument_methods
 # ייבוא permissions (hybrid auth)
 from permissions import (
     initialize_user_permissions,
@@ -54,81 +58,6 @@ if warnings:
     for warning in warnings:
         st.warning(warning)
 
-class AuditLogger:
-    def __init__(self):
-        self.log_to_file = CONFIG.get('LOG_TO_FILE', True)
-        self.log_to_db = CONFIG.get('LOG_TO_DATABASE', True)
-        self.log_file = CONFIG.get('AUDIT_LOG_PATH', 'safeq_audit.log')
-        self.db_path = CONFIG.get('DATABASE_PATH', 'safeq_audit.db')
-        
-        if self.log_to_db:
-            self._init_database()
-    
-    def _init_database(self):
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    username TEXT NOT NULL,
-                    user_email TEXT,
-                    user_groups TEXT,
-                    action TEXT NOT NULL,
-                    details TEXT,
-                    session_id TEXT,
-                    success BOOLEAN DEFAULT 1,
-                    access_level TEXT
-                )
-            ''')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON audit_logs(timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_username ON audit_logs(username)')
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            st.error(f"כשל באתחול מסד הנתונים: {str(e)}")
-    
-    def log_action(self, username, action, details="", user_email="", user_groups="", success=True, access_level="user"):
-        timestamp = datetime.now().isoformat()
-        session_id = st.session_state.get('session_id', '')
-        
-        # File logging
-        if self.log_to_file:
-            try:
-                log_entry = f"{timestamp} | {username} | {user_email} | {action}"
-                if details: log_entry += f" | {details}"
-                if user_groups: log_entry += f" | Groups: {user_groups}"
-                if not success: log_entry += " | FAILED"
-                
-                with open(self.log_file, "a", encoding="utf-8") as f:
-                    f.write(log_entry + "\n")
-            except: pass
-        
-        # Database logging
-        if self.log_to_db:
-            try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO audit_logs 
-                    (timestamp, username, user_email, user_groups, action, details, session_id, success, access_level)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (timestamp, username, user_email, user_groups, action, details, session_id, success, access_level))
-                conn.commit()
-                conn.close()
-            except: pass
-        
-        # Session logging
-        if 'audit_log' not in st.session_state:
-            st.session_state.audit_log = []
-        st.session_state.audit_log.append({
-            'timestamp': timestamp, 'username': username, 'action': action,
-            'details': details, 'success': success
-        })
-        if len(st.session_state.audit_log) > 50:
-            st.session_state.audit_log = st.session_state.audit_log[-50:]
-
 class EntraIDAuth:
     def __init__(self):
         self.client_id = CONFIG['ENTRA_ID']['CLIENT_ID']
@@ -154,15 +83,13 @@ class EntraIDAuth:
             
             state = str(uuid.uuid4())
             
-            # Save both state and code_verifier to file for later retrieval
+            # Save both state and code_verifier for later retrieval (see utils/auth_state.py)
             try:
-                with open(f'auth_data_{state}.json', 'w') as f:
-                    import json
-                    json.dump({
-                        'code_verifier': code_verifier,
-                        'code_challenge': code_challenge,
-                        'state': state
-                    }, f)
+                get_auth_state_store().put(state, {
+                    'code_verifier': code_verifier,
+                    'code_challenge': code_challenge,
+                    'state': state
+                })
             except Exception as e:
                 st.error(f"Failed to save auth data: {e}")
                 return None
@@ -196,15 +123,12 @@ class EntraIDAuth:
                 st.error("לא נמצא פרמטר state")
                 return None
             
-            # Read auth data from file
+            # Read auth data (one-time use - removed from the store)
             auth_data = None
             try:
-                import json
-                import os
-                with open(f'auth_data_{state}.json', 'r') as f:
-                    auth_data = json.load(f)
-                # Clean up the file
-                os.remove(f'auth_data_{state}.json')
+                auth_data = get_auth_state_store().pop(state)
+                if auth_data is None:
+                    raise KeyError("state not found or expired")
                 st.info("נתוני אימות נשלפו בהצלחה")
             except Exception as e:
                 st.error(f"כשל בשליפת נתוני אימות: {e}")
@@ -263,27 +187,12 @@ class EntraIDAuth:
             return None
     
     def get_user_groups(self, access_token):
+        # כל העמודים (nextLink), עם מטמון לפי object id - ראה utils/graph_groups.py
         try:
-            headers = {'Authorization': f'Bearer {access_token}'}
-            response = requests.get(
-                'https://graph.microsoft.com/v1.0/me/memberOf?$select=displayName,id',
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                groups_data = response.json()
-                groups = []
-                
-                for group in groups_data.get('value', []):
-                    if group.get('@odata.type') == '#microsoft.graph.group':
-                        groups.append({
-                            'displayName': group.get('displayName', ''),
-                            'id': group.get('id', '')
-                        })
-                return groups
-            else:
-                st.warning(f"לא ניתן לשלוף קבוצות משתמש: {response.status_code}")
-                return []
+            return get_group_resolver().resolve(access_token)
+        except GraphGroupsError as e:
+            st.warning(f"לא ניתן לשלוף קבוצות משתמש: {e.status_code}")
+            return []
         except Exception as e:
             st.warning(f"כשל בקבלת קבוצות משתמש: {str(e)}")
             return []
@@ -302,6 +211,7 @@ class EntraIDAuth:
                 return True
         return False
     
+@instrument_methods('api')
 class SafeQAPI:
     def __init__(self):
         self.server_url = CONFIG['SERVER_URL'].rstrip('/')
@@ -310,11 +220,12 @@ class SafeQAPI:
             'X-Api-Key': self.api_key,
             'Content-Type': 'application/x-www-form-urlencoded'
         }
+        self.session = create_http_session()
     
     def test_connection(self):
         try:
             url = f"{self.server_url}/api/v1/groups"
-            response = requests.get(url, headers=self.headers, verify=False, timeout=10)
+            response = self.session.get(url, headers=self.headers, verify=False, timeout=10)
             return response.status_code == 200
         except:
             return False
@@ -323,7 +234,7 @@ class SafeQAPI:
         try:
             url = f"{self.server_url}/api/v1/users/all"
             params = {'providerid': provider_id, 'maxrecords': max_records}
-            response = requests.get(url, headers=self.headers, params=params, verify=False, timeout=30)
+            response = self.session.get(url, headers=self.headers, params=params, verify=False, timeout=30)
             
             if response.status_code == 200:
                 try:
@@ -355,7 +266,7 @@ class SafeQAPI:
             if provider_id:
                 params['providerid'] = provider_id
 
-            response = requests.get(url, headers=self.headers, params=params, verify=False, timeout=10)
+            response = self.session.get(url, headers=self.headers, params=params, verify=False, timeout=10)
             if response.status_code == 200:
                 data = response.json()
 
@@ -447,7 +358,7 @@ class SafeQAPI:
             
             import urllib.parse
             data = urllib.parse.urlencode(form_data)
-            response = requests.put(url, headers=self.headers, data=data, verify=False, timeout=10)
+            response = self.session.put(url, headers=self.headers, data=data, verify=False, timeout=10)
             return response.status_code == 200
         except Exception as e:
             st.error(f"שגיאה ביצירת משתמש: {str(e)}")
@@ -472,7 +383,7 @@ class SafeQAPI:
             import urllib.parse
             encoded_data = urllib.parse.urlencode(data)
             
-            response = requests.post(url, headers=self.headers, data=encoded_data, verify=False, timeout=10)
+            response = self.session.post(url, headers=self.headers, data=encoded_data, verify=False, timeout=10)
             
             if response.status_code == 200:
                 return True
@@ -497,7 +408,7 @@ class SafeQAPI:
             url = f"{self.server_url}/api/v1/users/{username}"
             params = {'providerid': provider_id}
 
-            response = requests.delete(url, headers=self.headers, params=params, verify=False, timeout=10)
+            response = self.session.delete(url, headers=self.headers, params=params, verify=False, timeout=10)
 
             if response.status_code == 200:
                 return True
@@ -522,7 +433,7 @@ class SafeQAPI:
             if provider_id:
                 params['providerid'] = provider_id
             
-            response = requests.get(url, headers=self.headers, params=params, verify=False, timeout=10)
+            response = self.session.get(url, headers=self.headers, params=params, verify=False, timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 if isinstance(data, dict) and 'items' in data and data['items']:
@@ -537,7 +448,7 @@ class SafeQAPI:
     def get_groups(self):
         try:
             url = f"{self.server_url}/api/v1/groups"
-            response = requests.get(url, headers=self.headers, verify=False, timeout=10)
+            response = self.session.get(url, headers=self.headers, verify=False, timeout=10)
             if response.status_code == 200:
                 return response.json()
             return []
@@ -548,7 +459,7 @@ class SafeQAPI:
     def get_group_members(self, group_id):
         try:
             url = f"{self.server_url}/api/v1/groups/{group_id}/members"
-            response = requests.get(url, headers=self.headers, verify=False, timeout=10)
+            response = self.session.get(url, headers=self.headers, verify=False, timeout=10)
             if response.status_code == 200:
                 return response.json()
             return []
@@ -567,7 +478,7 @@ class SafeQAPI:
             import urllib.parse
             encoded_data = urllib.parse.urlencode(data)
             
-            response = requests.put(url, headers=self.headers, data=encoded_data, verify=False, timeout=10)
+            response = self.session.put(url, headers=self.headers, data=encoded_data, verify=False, timeout=10)
             
             if response.status_code == 200:
                 return True
@@ -595,7 +506,7 @@ class SafeQAPI:
             # שליחת group_id כ-parameter
             params = {'groupid': group_id}
 
-            response = requests.delete(url, headers=self.headers, params=params, verify=False, timeout=10)
+            response = self.session.delete(url, headers=self.headers, params=params, verify=False, timeout=10)
 
             if response.status_code == 200:
                 return True
@@ -615,7 +526,7 @@ class SafeQAPI:
     def get_user_groups(self, username):
             try:
                 url = f"{self.server_url}/api/v1/users/{username}/groups"
-                response = requests.get(url, headers=self.headers, verify=False, timeout=10)
+                response = self.session.get(url, headers=self.headers, verify=False, timeout=10)
                 if response.status_code == 200:
                     data = response.json()
                     # אם התגובה היא dictionary עם 'items', קח את הפריטים
@@ -706,7 +617,7 @@ def show_login_page():
         if 'code' in query_params and CONFIG['USE_ENTRA_ID']:
             auth_code = query_params['code']
             entra_auth = EntraIDAuth()
-            logger = AuditLogger()
+            logger = get_logger_instance()
 
             st.success("קוד אימות התקבל! מעבד...")
 
@@ -714,7 +625,13 @@ def show_login_page():
                 token_result = entra_auth.get_token_from_code(auth_code)
 
                 if token_result and 'access_token' in token_result:
-                    user_info = entra_auth.get_user_info(token_result['access_token'])
+                    # /me ו-/me/memberOf לא תלויים זה בזה - נשלפים במקביל
+                    access_token = token_result['access_token']
+                    graph_results = run_parallel({
+                        'user_info': lambda: entra_auth.get_user_info(access_token),
+                        'user_groups': lambda: entra_auth.get_user_groups(access_token)
+                    })
+                    user_info = graph_results['user_info']
 
                     if user_info:
                         # הצגת פרטי המשתמש שהתחבר
@@ -722,7 +639,7 @@ def show_login_page():
                         user_email = user_info['mail'] or user_info['userPrincipalName']
                         st.info(f"👤 משתמש מחובר: **{user_display_name}** ({user_email})")
 
-                        user_groups = entra_auth.get_user_groups(token_result['access_token'])
+                        user_groups = graph_results['user_groups']
                         user_groups_names = [g['displayName'] for g in user_groups]
                         
                         logger.log_action(
@@ -826,6 +743,7 @@ def show_login_page():
             return
         
          # Main Entra ID Login
+        auth_url = None
         if CONFIG['USE_ENTRA_ID']:
             st.markdown("#### 🌐 התחברות ארגונית")
 
@@ -879,7 +797,7 @@ def show_login_page():
                 if not username or not card_id:
                     st.error("❌ אנא הזן שם משתמש וסיסמא")
                 else:
-                    logger = AuditLogger()
+                    logger = get_logger_instance()
 
                     # בדיקה אם יש משתמשי חירום מוגדרים
                     local_users = CONFIG.get('LOCAL_USERS')
@@ -1046,7 +964,7 @@ def show_header():
         # כפתורים בצד ימין (בגלל RTL)
         # כפתור יציאה
         if st.button("🚪 יציאה", key="logout_btn"):
-            logger = AuditLogger()
+            logger = get_logger_instance()
             logger.log_action(
                 st.session_state.username, "Logout",
                 f"Session ended ({st.session_state.auth_method})",
@@ -1092,18 +1010,32 @@ def show_header():
             pass
 
 def show_audit_dashboard():
+    import pandas as pd  # טעינה עצלה - לא נדרש במסך ההתחברות
+
     st.header("📊 דשבורד ביקורת")
     
-    if st.session_state.access_level != 'admin':
+    is_admin = st.session_state.access_level == 'admin'
+    if not is_admin:
         st.warning("👤 באפשרותך לצפות רק בלוגי הפעילות שלך")
     
-    logger = AuditLogger()
+    logger = get_logger_instance()
+    retention = get_audit_retention()
+    
+    # מקור הנתונים: הטבלה הראשית או חודש מהארכיון (מנהלים בלבד)
+    source = None
+    partitions = retention.list_partitions() if is_admin else []
+    if partitions:
+        source_options = [None] + [p['month'] for p in partitions]
+        source = st.selectbox(
+            "מקור נתונים", source_options,
+            format_func=lambda m: "חודשים אחרונים" if m is None else f"ארכיון {m}"
+        )
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        if st.session_state.access_level == 'admin':
-            filter_username = st.text_input("סינון לפי שם משתמש")
+        if is_admin:
+            filter_username = st.text_input("סינון לפי שם משתמש", help="שמות משתמש שמתחילים בטקסט")
         else:
             filter_username = st.session_state.username
             st.text_input("שם משתמש", value=filter_username, disabled=True)
@@ -1115,68 +1047,105 @@ def show_audit_dashboard():
         filter_date_to = st.date_input("עד תאריך")
     
     with col4:
-        log_limit = st.number_input("רשומות", min_value=10, max_value=1000, value=100)
+        page_size = st.number_input("רשומות בעמוד", min_value=10, max_value=1000, value=100)
+    
+    col5, col6 = st.columns(2)
+    
+    with col5:
+        filter_action = st.text_input("פעולה", help="התאמה מדויקת, לדוגמה: Login")
+    
+    with col6:
+        filter_text = st.text_input("חיפוש בפרטים", help="חיפוש טקסט חופשי בשדה הפרטים")
+    
+    filters = {
+        'date_from': filter_date_from,
+        'date_to': filter_date_to,
+        'action': filter_action.strip() or None,
+        'text': filter_text.strip() or None,
+    }
+    if is_admin:
+        filters['username_prefix'] = filter_username.strip() or None
+    else:
+        # משתמש רגיל רואה רק את הרשומות שלו - התאמה מדויקת
+        filters['username'] = st.session_state.username
     
     if st.button("🔍 טען לוגי ביקורת", key="load_audit_logs_btn"):
-        try:
-            conn = sqlite3.connect(logger.db_path)
-            cursor = conn.cursor()
-            
-            query = "SELECT * FROM audit_logs WHERE 1=1"
-            params = []
-            
-            if st.session_state.access_level != 'admin':
-                query += " AND username = ?"
-                params.append(st.session_state.username)
-            elif filter_username:
-                query += " AND username LIKE ?"
-                params.append(f"%{filter_username}%")
-            
-            if filter_date_from:
-                query += " AND timestamp >= ?"
-                params.append(filter_date_from.isoformat())
-            
-            if filter_date_to:
-                query += " AND timestamp <= ?"
-                params.append(filter_date_to.isoformat())
-            
-            query += " ORDER BY timestamp DESC LIMIT ?"
-            params.append(log_limit)
-            
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            
-            if rows:
-                columns = ['id', 'timestamp', 'username', 'user_email', 'user_groups', 
-                          'action', 'details', 'session_id', 'success', 'access_level']
-                
-                df = pd.DataFrame(rows, columns=columns)
-                df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
-                
-                display_cols = ['timestamp', 'username', 'user_email', 'user_groups', 
-                               'action', 'details', 'success', 'access_level']
-                
-                df_display = df[display_cols].copy()
-                df_display.rename(columns={
-                    'timestamp': 'חותמת זמן', 'username': 'שם משתמש', 'user_email': 'אימייל',
-                    'user_groups': 'קבוצות', 'action': 'פעולה', 'details': 'פרטים',
-                    'success': 'הצלחה', 'access_level': 'רמת גישה'
-                }, inplace=True)
-
-                st.dataframe(df_display, use_container_width=True)
-                
-                csv = df.to_csv(index=False)
-                st.download_button(
-                    "💾 הורד CSV", csv.encode('utf-8-sig'),
-                    f"audit_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", "text/csv"
-                )
-                st.success(f"✅ נטענו {len(rows)} רשומות")
+        # וידוא שרשומות שממתינות בתור הכתיבה נכללות בתוצאות
+        get_audit_writer().flush(timeout=2)
+        st.session_state.audit_dashboard = {
+            'source': source,
+            'filters': filters,
+            'page_size': int(page_size),
+            'cursors': [None],  # מחסנית cursors - cursor תחילת כל עמוד שנצפה
+        }
+        st.session_state.pop('audit_csv_export', None)
+    
+    state = st.session_state.get('audit_dashboard')
+    if not state:
+        return
+    
+    try:
+        if state.get('source'):
+            with retention.open_partition(state['source']) as audit_query:
+                rows, next_cursor = audit_query.fetch_page(state['filters'], state['cursors'][-1], state['page_size'])
+        else:
+            audit_query = AuditQuery(logger.db_path)
+            rows, next_cursor = audit_query.fetch_page(state['filters'], state['cursors'][-1], state['page_size'])
+    except Exception as e:
+        st.error(f"כשל בטעינת לוגים: {str(e)}")
+        return
+    
+    if not rows:
+        st.warning("לא נמצאו רשומות")
+        return
+    
+    df = pd.DataFrame(rows, columns=AUDIT_COLUMNS)
+    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    
+    display_cols = ['timestamp', 'username', 'user_email', 'user_groups', 
+                   'action', 'details', 'success', 'access_level']
+    
+    df_display = df[display_cols].copy()
+    df_display.rename(columns={
+        'timestamp': 'חותמת זמן', 'username': 'שם משתמש', 'user_email': 'אימייל',
+        'user_groups': 'קבוצות', 'action': 'פעולה', 'details': 'פרטים',
+        'success': 'הצלחה', 'access_level': 'רמת גישה'
+    }, inplace=True)
+
+    st.dataframe(df_display, use_container_width=True)
+    
+    page_number = len(state['cursors'])
+    nav_prev, nav_info, nav_next = st.columns([1, 2, 1])
+    
+    with nav_prev:
+        if st.button("➡️ הקודם", key="audit_prev_page", disabled=page_number == 1):
+            state['cursors'].pop()
+            st.rerun()
+    
+    with nav_info:
+        st.caption(f"עמוד {page_number} • {len(rows)} רשומות")
+    
+    with nav_next:
+        if st.button("הבא ⬅️", key="audit_next_page", disabled=next_cursor is None):
+            state['cursors'].append(next_cursor)
+            st.rerun()
+    
+    # ייצוא CSV של כל הרשומות התואמות - נבנה רק לפי בקשה, בזרימה מהמסד
+    if st.button("📄 הכן קובץ CSV לכל התוצאות", key="audit_prepare_csv"):
+        with st.spinner("מכין קובץ..."):
+            if state.get('source'):
+                with retention.open_partition(state['source']) as archive_query:
+                    st.session_state.audit_csv_export = archive_query.export_csv(state['filters'])
             else:
-                st.warning("לא נמצאו רשומות")
-            
-            conn.close()
-        except Exception as e:
-            st.error(f"כשל בטעינת לוגים: {str(e)}")
+                st.session_state.audit_csv_export = audit_query.export_csv(state['filters'])
+    
+    export_file = st.session_state.get('audit_csv_export')
+    if export_file is not None:
+        export_file.seek(0)
+        st.download_button(
+            "💾 הורד CSV", export_file.read(),
+            f"audit_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", "text/csv"
+        )
 
 def check_config():
     if CONFIG['SERVER_URL'] == 'https://your-server.com:7300':
@@ -1550,6 +1519,8 @@ def apply_modern_styling(rtl=False):
 
     
 def main():
+    import pandas as pd  # טעינה עצלה - לא נדרש במסך ההתחברות
+
     st.set_page_config(
         page_title="SafeQ Cloud Manager",
         page_icon="🔐",
@@ -1565,7 +1536,7 @@ def main():
     if not is_logged_in:
         if st.session_state.logged_in and not is_session_valid():
             st.warning("⚠️ פג תוקף ההתחברות. אנא התחבר שוב.")
-            logger = AuditLogger()
+            logger = get_logger_instance()
             logger.log_action(st.session_state.username or "Unknown", "Session Expired", "Timeout")
             
             for key in ['logged_in', 'username', 'user_email', 'user_groups', 
@@ -1583,7 +1554,7 @@ def main():
         st.stop()
 
     api = SafeQAPI()
-    logger = AuditLogger()
+    logger = get_logger_instance()
     
     # Sidebar
     with st.sidebar:
@@ -2940,7 +2911,7 @@ if __name__ == "__main__":
         st.info("אנא בדוק את ההגדרות ונסה שוב.")
         
         try:
-            logger = AuditLogger()
+            logger = get_logger_instance()
             username = st.session_state.get('username', 'Unknown')
             user_email = st.session_state.get('user_email', '')
             user_groups_str = ', '.join([g['displayName'] for g in st.session_state.get('user_groups', [])])
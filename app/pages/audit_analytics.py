@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Audit Analytics Page
+דף מגמות שימוש - פעולות ליום, כשלונות, משתמשים פעילים ושעות עומס
+"""
+
+import streamlit as st
+import pandas as pd
+from datetime import datetime, timedelta
+
+from shared import get_logger_instance, check_authentication
+from config import config
+from utils.audit_analytics import AuditAnalytics
+from utils.audit_writer import get_audit_writer
+
+CONFIG = config.get()
+
+
+def show():
+    """הצגת דף אנליטיקת ביקורת"""
+    check_authentication()
+
+    role = st.session_state.get('role', st.session_state.get('access_level', 'viewer'))
+    if role not in ('admin', 'superadmin'):
+        st.error("❌ אין לך הרשאה לצפות בדף זה")
+        return
+
+    logger = get_logger_instance()
+
+    st.header("📈 מגמות שימוש")
+
+    if not logger.log_to_db:
+        st.info("רישום למסד הנתונים מושבת - אין נתונים להצגה")
+        return
+
+    analytics = AuditAnalytics(logger.db_path, use_summary=CONFIG.get('AUDIT_ANALYTICS_USE_SUMMARY', True))
+
+    today = datetime.now().date()
+    col1, col2 = st.columns(2)
+    with col1:
+        date_from = st.date_input("מתאריך", value=today - timedelta(days=30), key="analytics_date_from")
+    with col2:
+        date_to = st.date_input("עד תאריך", value=today, key="analytics_date_to")
+
+    if date_from > date_to:
+        st.error("❌ תאריך ההתחלה מאוחר מתאריך הסיום")
+        return
+
+    # רשומות שממתינות בתור הכתיבה + עדכון אינקרמנטלי של טבלאות הסיכום
+    get_audit_writer().flush(timeout=2)
+    try:
+        analytics.refresh()
+        totals = analytics.totals(date_from, date_to)
+        daily = analytics.daily_activity(date_from, date_to)
+        hourly = analytics.hourly_distribution(date_from, date_to)
+        top_users = analytics.top_users(date_from, date_to)
+        actions = analytics.action_breakdown(date_from, date_to)
+    except Exception as e:
+        st.error(f"כשל בטעינת נתונים: {str(e)}")
+        return
+
+    if not totals['total']:
+        st.info("אין פעילות בטווח שנבחר")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("סה\"כ פעולות", f"{totals['total']:,}")
+    with col2:
+        failure_rate = totals['failures'] / totals['total'] * 100
+        st.metric("פעולות שנכשלו", f"{totals['failures']:,}", f"{failure_rate:.1f}%", delta_color="inverse")
+    with col3:
+        st.metric("משתמשים פעילים", f"{totals['users']:,}")
+
+    st.subheader("פעולות ליום")
+    daily_df = pd.DataFrame(daily).rename(columns={'day': 'יום', 'total': 'פעולות', 'failures': 'כשלונות'})
+    daily_df['יום'] = pd.to_datetime(daily_df['יום'])
+    st.line_chart(daily_df.set_index('יום'))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("שעות עומס")
+        # כל 24 השעות מוצגות, גם שעות ללא פעילות
+        hourly_df = pd.DataFrame(hourly, columns=['hour', 'total']).set_index('hour')
+        hourly_df = hourly_df.reindex(range(24), fill_value=0).rename(columns={'total': 'פעולות'})
+        hourly_df.index.name = 'שעה'
+        st.bar_chart(hourly_df)
+
+    with col2:
+        st.subheader("משתמשים פעילים")
+        users_df = pd.DataFrame(top_users).rename(
+            columns={'username': 'שם משתמש', 'total': 'פעולות', 'failures': 'כשלונות'})
+        st.bar_chart(users_df.set_index('שם משתמש')['פעולות'])
+
+    st.subheader("פילוח לפי פעולה")
+    actions_df = pd.DataFrame(actions).rename(
+        columns={'action': 'פעולה', 'total': 'פעולות', 'failures': 'כשלונות'})
+    actions_df['% כשלונות'] = (actions_df['כשלונות'] / actions_df['פעולות'] * 100).round(1)
+    st.dataframe(actions_df, use_container_width=True, hide_index=True)
+
+    if analytics.use_summary:
+        st.caption("הנתונים מחושבים מטבלאות סיכום יומיות וכוללים גם חודשים שעברו לארכיון")
+    else:
+        st.caption("הנתונים מחושבים ישירות מטבלת הביקורת (חודשים אחרונים בלבד)")
+
+if __name__ == "__main__":
+    show()
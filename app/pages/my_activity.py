@@ -6,6 +6,7 @@ SafeQ Cloud Manager - My Activity Page
 """
 
 import streamlit as st
+import sqlite3
 import sys
 import os
 
@@ -13,6 +14,78 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from shared import get_api_instance, get_logger_instance, check_authentication
+from utils.audit_queries import AuditQuery
+from utils.audit_writer import get_audit_retention, get_audit_writer
+
+PAGE_SIZE = 50
+
+
+def show_entry(log_entry):
+    """הצגת רשומת פעילות אחת"""
+    status_icon = "✅" if log_entry.get('success', True) else "❌"
+    timestamp = str(log_entry.get('timestamp', 'N/A'))[:19].replace('T', ' ')
+    action = log_entry.get('action', 'N/A')
+    details = log_entry.get('details', '')
+
+    with st.expander(f"{status_icon} {action} - {timestamp}"):
+        st.write(f"**פעולה:** {action}")
+        st.write(f"**זמן:** {timestamp}")
+        if details:
+            st.write(f"**פרטים:** {details}")
+        st.write(f"**סטטוס:** {'הצלחה' if log_entry.get('success', True) else 'כישלון'}")
+
+
+def show_session_activity():
+    """הצגת לוג פעולות מה-session state (כשאין מסד נתונים)"""
+    if 'audit_log' in st.session_state and st.session_state.audit_log:
+        st.subheader("פעולות אחרונות")
+        for log_entry in reversed(st.session_state.audit_log):
+            show_entry(log_entry)
+    else:
+        st.info("אין פעולות אחרונות להצגה")
+
+
+def get_user_actions(audit_query, username):
+    """רשימת סוגי הפעולות של המשתמש (נשמר ב-session)"""
+    cache_key = f"my_activity_actions_{username}"
+    if cache_key not in st.session_state:
+        st.session_state[cache_key] = audit_query.distinct_actions({'username': username})
+    return st.session_state[cache_key]
+
+
+def fetch_older(audit_query, retention, state):
+    """
+    העמוד הבא של ציר הזמן: מהטבלה הראשית, וכשהיא נגמרת - מחודשי הארכיון (מהחדש לישן)
+
+    חודשים בלי פעולות של המשתמש מדולגים, כך שכל טעינה מוסיפה פעולות או מסיימת את ציר הזמן.
+    """
+    while True:
+        if state['source'] is None:
+            rows, cursor = audit_query.fetch_page(state['filters'], state['cursor'], PAGE_SIZE)
+        else:
+            try:
+                with retention.open_partition(state['source']) as archive_query:
+                    rows, cursor = archive_query.fetch_page(state['filters'], state['cursor'], PAGE_SIZE)
+            except (OSError, sqlite3.Error) as e:
+                print(f"[ERROR] Could not read audit archive {state['source']}: {str(e)}")
+                rows, cursor = [], None
+
+        state['rows'].extend(rows)
+        state['cursor'] = cursor
+        if rows and state['source'] is not None:
+            state['reached_archive'] = True
+        if cursor is not None or not state['archives']:
+            return
+
+        # סוף הטבלה הראשית / החודש הנוכחי - ממשיכים לחודש הבא בארכיון
+        state['source'] = state['archives'].pop(0)
+        if rows:
+            return
+
+
+def has_older(state) -> bool:
+    return state['cursor'] is not None or bool(state['archives'])
+
 
 def show():
     """הצגת דף הפעילות שלי"""
@@ -22,26 +95,77 @@ def show():
 
     st.header("📋 הפעילות שלי")
 
-    # הצגת לוג פעולות מה-session state
-    if 'audit_log' in st.session_state and st.session_state.audit_log:
-        st.subheader("פעולות אחרונות")
+    username = st.session_state.get('username')
+    if not logger.log_to_db or not username:
+        show_session_activity()
+        return
 
-        for log_entry in reversed(st.session_state.audit_log):
-            status_icon = "✅" if log_entry.get('success', True) else "❌"
-            timestamp = log_entry.get('timestamp', 'N/A')
-            action = log_entry.get('action', 'N/A')
-            details = log_entry.get('details', '')
-
-            with st.expander(f"{status_icon} {action} - {timestamp}"):
-                st.write(f"**פעולה:** {action}")
-                st.write(f"**זמן:** {timestamp}")
-                if details:
-                    st.write(f"**פרטים:** {details}")
-                st.write(f"**סטטוס:** {'הצלחה' if log_entry.get('success', True) else 'כישלון'}")
-    else:
-        st.info("אין פעולות אחרונות להצגה")
+    audit_query = AuditQuery(logger.db_path)
+
+    col1, col2, col3 = st.columns([2, 2, 1])
+
+    with col1:
+        action_options = [None] + get_user_actions(audit_query, username)
+        filter_action = st.selectbox(
+            "פעולה", action_options,
+            format_func=lambda a: "הכל" if a is None else a,
+            key="my_activity_action"
+        )
+
+    with col2:
+        status_options = {"הכל": None, "הצלחה": True, "כישלון": False}
+        filter_status = st.radio(
+            "סטטוס", list(status_options.keys()), horizontal=True, key="my_activity_status"
+        )
 
-    # TODO: הוסף אפשרות לצפות בלוג המלא מה-DB
+    with col3:
+        if st.button("🔄 רענן", key="my_activity_refresh"):
+            st.session_state.pop('my_activity', None)
+            st.session_state.pop(f"my_activity_actions_{username}", None)
+            st.rerun()
+
+    # תמיד רק הרשומות של המשתמש המחובר - התאמה מדויקת על האינדקס (username, timestamp)
+    filters = {
+        'username': username,
+        'action': filter_action,
+        'success': status_options[filter_status],
+    }
+
+    retention = get_audit_retention()
+
+    # שינוי פילטרים (או טעינה ראשונה / רענון) מתחיל את ציר הזמן מחדש
+    state = st.session_state.get('my_activity')
+    if not state or state['filters'] != filters:
+        # רשומות שממתינות בתור הכתיבה צריכות להופיע בציר הזמן - רק כשטוענים מחדש,
+        # לא בכל אינטראקציה בדף
+        get_audit_writer().flush(timeout=2)
+        state = {
+            'filters': filters, 'rows': [], 'cursor': None, 'source': None, 'reached_archive': False,
+            # חודשים שעברו מהטבלה הראשית לארכיון (AUDIT_HOT_MONTHS), מהחדש לישן
+            'archives': [partition['month'] for partition in retention.list_partitions()],
+        }
+        fetch_older(audit_query, retention, state)
+        st.session_state.my_activity = state
+
+    if not state['rows']:
+        st.info("אין פעולות להצגה")
+        return
+
+    st.caption(f"מוצגות {len(state['rows'])} פעולות")
+
+    for log_entry in state['rows']:
+        show_entry(log_entry)
+
+    if state['reached_archive']:
+        st.caption("📦 הפעולות הישנות יותר נטענות מארכיון החודשים")
+
+    # טעינת עמוד ישן יותר רק לפי בקשה
+    if has_older(state):
+        if st.button("⬇️ טען פעולות ישנות יותר", key="my_activity_more"):
+            fetch_older(audit_query, retention, state)
+            st.rerun()
+    else:
+        st.caption("אין פעולות ישנות יותר")
 
 if __name__ == "__main__":
     show()
@@ -9,14 +9,13 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
-import io
 from datetime import datetime
 import pytz
 
 # הוספת תיקיית app ל-path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from shared import get_api_instance, check_authentication
+from shared import get_api_instance, check_authentication, excel_download_button
 from config import config
 
 CONFIG = config.get()
@@ -74,35 +73,6 @@ def build_user_lookup_cache(api, usernames):
 
     return user_cache
 
-def export_to_excel(df: pd.DataFrame, sheet_name: str) -> bytes:
-    """ייצוא DataFrame ל-Excel עם עיצוב"""
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False, engine='openpyxl')
-
-        # עיצוב הגליון
-        workbook = writer.book
-        worksheet = writer.sheets[sheet_name]
-
-        # רוחב עמודות אוטומטי
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-
-    output.seek(0)
-    return output.getvalue()
-
 def show():
     """הצגת דף הדפסות ממתינות"""
     check_authentication()
@@ -226,15 +196,7 @@ def show():
                         st.info(f"📊 סה\"כ {len(df)} הדפסות ממתינות")
 
                     with result_col2:
-                        excel_data = export_to_excel(df, "pending_prints")
-                        st.download_button(
-                            label="📥 ייצא ל-Excel",
-                            data=excel_data,
-                            file_name=f"pending_prints_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            key="export_pending_btn",
-                            use_container_width=True
-                        )
+                        excel_download_button(df, "pending_prints", "pending_prints", key="export_pending_btn")
 
                     # הצגת הטבלה
                     st.dataframe(
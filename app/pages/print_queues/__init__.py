@@ -9,41 +9,11 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
-import io
 
 # הוספת תיקיית app ל-path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from shared import get_api_instance, check_authentication
-
-def export_to_excel(df: pd.DataFrame, sheet_name: str) -> bytes:
-    """ייצוא DataFrame ל-Excel עם עיצוב"""
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False, engine='openpyxl')
-
-        # עיצוב הגליון
-        workbook = writer.book
-        worksheet = writer.sheets[sheet_name]
-
-        # רוחב עמודות אוטומטי
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-
-    output.seek(0)
-    return output.getvalue()
+from shared import get_api_instance, check_authentication, excel_download_button
 
 def filter_input_ports_by_departments(input_ports, allowed_departments):
     """
@@ -183,15 +153,7 @@ def show():
                                 st.success(f"📊 סה\"כ {len(df)} תורי הדפסה")
 
                         with result_col2:
-                            excel_data = export_to_excel(df, "print_queues")
-                            st.download_button(
-                                label="📥 ייצא ל-Excel",
-                                data=excel_data,
-                                file_name=f"print_queues.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                key="export_queues_btn",
-                                use_container_width=True
-                            )
+                            excel_download_button(df, "print_queues", "print_queues", key="export_queues_btn")
 
                         st.dataframe(
                             df,
@@ -11,27 +11,79 @@ import pandas as pd
 from datetime import datetime, timedelta
 import json
 from typing import Dict, List, Optional, Tuple
-import io
+import os
+import tempfile
 import time
 import pytz
 
-from shared import get_api_instance, get_logger_instance, check_authentication
+from shared import get_api_instance, get_logger_instance, check_authentication, excel_download_button, SafeQAPI
 from permissions import filter_users_by_departments
 from config import config
+from utils.report_cache import get_report_cache, make_report_key, report_ttl
+from utils.instrumentation import timed
+from utils.history_export import (
+    EXPORT_FORMATS, HistoryExportError, export_history, filter_documents_by_departments, history_range_iso,
+    parquet_available
+)
+from utils.jobs import get_job_manager
+from utils.report_precompute import full_month_of_range, get_report_store
 
 CONFIG = config.get()
 
 
-def apply_data_filters(df: pd.DataFrame) -> Tuple[pd.DataFrame, dict]:
+@timed()
+def filter_history_dataframe(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
+    """
+    החלת בחירות הסינון על DataFrame ההיסטוריה (ללא UI)
+
+    Args:
+        df: DataFrame מ-prepare_history_dataframe
+        filters: {'search', 'source', 'jobtype', 'status', 'dept'} - 'הכל' = ללא סינון
+
+    Returns:
+        pd.DataFrame: עותק מסונן
+    """
+    filtered_df = df.copy()
+
+    search_text = filters.get('search')
+    if search_text:
+        mask = filtered_df.astype(str).apply(
+            lambda x: x.str.contains(search_text, case=False, na=False)
+        ).any(axis=1)
+        filtered_df = filtered_df[mask]
+
+    for key, column in (('source', 'סוג משתמש'), ('jobtype', 'סוג'), ('status', 'סטטוס'), ('dept', 'מחלקה')):
+        selected = filters.get(key, 'הכל')
+        if selected != 'הכל':
+            filtered_df = filtered_df[filtered_df[column] == selected]
+
+    return filtered_df
+
+
+@timed()
+def apply_data_filters(df: pd.DataFrame, frame: Optional[dict] = None) -> Tuple[pd.DataFrame, dict]:
     """
     הצגת סינונים משותפים לדשבורד ולדוח המפורט
 
     Args:
         df: DataFrame המקורי
+        frame: רשומת המטמון מ-_report_frame - אפשרויות הבחירה והתוצאה המסוננת האחרונה
+               נשמרות בה, כך שריצה חוזרת עם אותן בחירות לא מסננת מחדש
 
     Returns:
         tuple: (DataFrame מסונן, dict של הבחירות)
     """
+    options = frame.get('options') if frame is not None else None
+    if options is None:
+        options = {
+            'source': ['הכל'] + sorted(df['סוג משתמש'].unique().tolist()),
+            'jobtype': ['הכל'] + sorted(df['סוג'].unique().tolist()),
+            'status': ['הכל'] + sorted(df['סטטוס'].unique().tolist()),
+            'dept': ['הכל'] + sorted([d for d in df['מחלקה'].unique() if d], key=str),
+        }
+        if frame is not None:
+            frame['options'] = options
+
     # מונה לאיפוס סינונים - כל פעם שעולה, הקומפוננטים מתאפסים
     if 'filter_reset_counter' not in st.session_state:
         st.session_state.filter_reset_counter = 0
@@ -58,36 +110,32 @@ def apply_data_filters(df: pd.DataFrame) -> Tuple[pd.DataFrame, dict]:
             )
 
         with filter_row1_col2:
-            source_options = ['הכל'] + sorted(df['סוג משתמש'].unique().tolist())
             selected_source = st.selectbox(
                 "סוג משתמש",
-                source_options,
+                options['source'],
                 key=f"shared_filter_source_{counter}"
             )
 
         with filter_row1_col3:
-            jobtype_options = ['הכל'] + sorted(df['סוג'].unique().tolist())
             selected_jobtype = st.selectbox(
                 "סוג עבודה",
-                jobtype_options,
+                options['jobtype'],
                 key=f"shared_filter_jobtype_{counter}"
             )
 
         filter_row2_col1, filter_row2_col2, filter_row2_col3 = st.columns(3)
 
         with filter_row2_col1:
-            status_options = ['הכל'] + sorted(df['סטטוס'].unique().tolist())
             selected_status = st.selectbox(
                 "סטטוס",
-                status_options,
+                options['status'],
                 key=f"shared_filter_status_{counter}"
             )
 
         with filter_row2_col2:
-            dept_options = ['הכל'] + sorted([d for d in df['מחלקה'].unique() if d], key=str)
             selected_dept = st.selectbox(
                 "מחלקה",
-                dept_options,
+                options['dept'],
                 key=f"shared_filter_dept_{counter}"
             )
 
@@ -103,7 +151,6 @@ def apply_data_filters(df: pd.DataFrame) -> Tuple[pd.DataFrame, dict]:
                 st.rerun()
 
     # החלת סינונים
-    filtered_df = df.copy()
     filters_applied = {
         'search': search_text,
         'source': selected_source,
@@ -111,24 +158,15 @@ def apply_data_filters(df: pd.DataFrame) -> Tuple[pd.DataFrame, dict]:
         'status': selected_status,
         'dept': selected_dept
     }
-
-    if search_text:
-        mask = filtered_df.astype(str).apply(
-            lambda x: x.str.contains(search_text, case=False, na=False)
-        ).any(axis=1)
-        filtered_df = filtered_df[mask]
-
-    if selected_source != 'הכל':
-        filtered_df = filtered_df[filtered_df['סוג משתמש'] == selected_source]
-
-    if selected_jobtype != 'הכל':
-        filtered_df = filtered_df[filtered_df['סוג'] == selected_jobtype]
-
-    if selected_status != 'הכל':
-        filtered_df = filtered_df[filtered_df['סטטוס'] == selected_status]
-
-    if selected_dept != 'הכל':
-        filtered_df = filtered_df[filtered_df['מחלקה'] == selected_dept]
+    filter_key = tuple(filters_applied.items())
+    cached = frame.get('filtered') if frame is not None else None
+    if cached is not None and cached['key'] == filter_key:
+        filtered_df = cached['df']
+    else:
+        filtered_df = filter_history_dataframe(df, filters_applied)
+        if frame is not None:
+            # התוצאה האחרונה בלבד; נתוני הדשבורד שלה מחושבים בהצגה הראשונה (_dashboard_stats)
+            frame['filtered'] = {'key': filter_key, 'df': filtered_df, 'stats': None}
 
     # הצגת מידע על הסינון
     if len(filtered_df) < len(df):
@@ -206,6 +244,7 @@ def show_report_settings(api):
                 "📅 7 ימים אחרונים",
                 "📅 30 ימים אחרונים",
                 "📅 חודש נוכחי",
+                "📅 חודש קודם",
                 "🎯 טווח מותאם אישית"
             ]
 
@@ -234,6 +273,10 @@ def show_report_settings(api):
                     'history_filter_username',
                     'history_filter_port',
                     'history_report_data',
+                    'report_job_id',
+                    'report_partial',
+                    'report_frame',
+                    'original_df',
                     'user_lookup_cache',
                     'filtered_df',
                     'filters_applied',
@@ -242,6 +285,7 @@ def show_report_settings(api):
                 for key in keys_to_delete:
                     if key in st.session_state:
                         del st.session_state[key]
+                st.query_params.pop('report_job', None)
                 st.rerun()
 
         # חישוב תאריכים לפי פילטר מהיר
@@ -264,6 +308,13 @@ def show_report_settings(api):
             st.session_state.report_date_start = date_start
             st.session_state.report_date_end = date_end
             show_dates = False
+        elif quick_filter == "📅 חודש קודם":
+            # טווח חודש קלנדרי מלא - נטען מהחישוב הלילי אם קיים
+            date_end = datetime.now().date().replace(day=1) - timedelta(days=1)
+            date_start = date_end.replace(day=1)
+            st.session_state.report_date_start = date_start
+            st.session_state.report_date_end = date_end
+            show_dates = False
         else:  # טווח מותאם אישית
             show_dates = True
             # ברירות מחדל אם לא קיימות
@@ -342,104 +393,384 @@ def show_report_settings(api):
     return date_start, date_end, status_filter_list, max_records, search_clicked
 
 
-def fetch_report_data(api, logger, username, date_start, date_end, status_filter_list, max_records):
+@timed()
+def _fetch_history_range(api, date_start, date_end, max_records, allowed_departments, progress=None,
+                         publish=None):
     """
-    קריאת נתונים מה-API ושמירה ב-session_state
+    טעינת היסטוריית מסמכים לטווח תאריכים (קריאה בודדת או פיצול לשבועות)
+
+    רץ בעבודת רקע (utils/jobs.py) - ללא UI. ההתקדמות מדווחת דרך progress(fraction, message),
+    ומסמכי כל שבוע שנטען (מסוננים לפי היקף ההרשאות) מפורסמים דרך publish(documents).
+
+    Returns:
+        dict: נתוני הדוח מסוננים לפי היקף ההרשאות, או None אם לא התקבלו נתונים
     """
+    progress = progress or (lambda fraction, message='': None)
     date_diff = (date_end - date_start).days
 
     if date_diff < 7:  # טווח קטן - קריאה בודדת
-        with st.spinner("⏳ טוען נתונים..."):
-            date_start_iso = datetime.combine(date_start, datetime.min.time()).isoformat() + "Z"
+        progress(0.0, "⏳ טוען נתונים...")
+        date_start_iso, date_end_iso = history_range_iso(date_start, date_end)
+
+        result = api.get_documents_history(
+            datestart=date_start_iso,
+            dateend=date_end_iso,
+            status=None,  # לא שולחים status ל-API
+            maxrecords=max_records
+        )
 
-            if date_end >= datetime.now().date():
-                date_end_iso = datetime.now().isoformat() + "Z"
-            else:
-                date_end_iso = datetime.combine(date_end, datetime.max.time()).isoformat() + "Z"
+        if not result:
+            return None
 
-            result = api.get_documents_history(
-                datestart=date_start_iso,
-                dateend=date_end_iso,
-                status=None,  # לא שולחים status ל-API
-                maxrecords=max_records
-            )
+        return dict(result, documents=filter_documents_by_departments(result.get('documents', []), allowed_departments))
+
+    # טווח גדול - קריאות מרובות
+    all_documents = []
+    week_ranges = split_date_range_to_weeks(date_start, date_end)
+    total_weeks = len(week_ranges)
+
+    success_count = 0
+    for idx, (week_start, week_end) in enumerate(week_ranges):
+        progress(idx / total_weeks, f"⏳ טוען שבוע {idx + 1} מתוך {total_weeks}...")
 
-            if result:
-                st.session_state.history_report_data = result
-                logger.log_action(
-                    username=username,
-                    action="VIEW_REPORT",
-                    details=f"Date range: {date_start} to {date_end}"
+        week_start_iso, week_end_iso = history_range_iso(week_start, week_end)
+
+        result = api.get_documents_history(
+            datestart=week_start_iso,
+            dateend=week_end_iso,
+            status=None,  # לא שולחים status ל-API
+            maxrecords=max_records
+        )
+
+        if result and 'documents' in result:
+            all_documents.extend(result['documents'])
+            success_count += 1
+            if publish:
+                publish(filter_documents_by_departments(result['documents'], allowed_departments))
+
+    progress(1.0, f"✅ הסתיים! נטענו {success_count} שבועות")
+
+    if not all_documents:
+        return None
+
+    documents = filter_documents_by_departments(all_documents, allowed_departments)
+
+    return {
+        'documents': documents,
+        'recordsOnPage': len(documents),
+        'dateStart': history_range_iso(date_start, date_end)[0],
+        'dateEnd': history_range_iso(date_start, date_end)[1],
+        'weeks': total_weeks,
+        'weeksLoaded': success_count
+    }
+
+
+def _log_report_view(logger, username, date_start, date_end, report_data, from_cache):
+    if report_data.get('weeks'):
+        details = f"Multi-week report: {report_data['weeks']} weeks, {len(report_data['documents'])} documents"
+    else:
+        details = f"Date range: {date_start} to {date_end}"
+
+    logger.log_action(
+        username=username,
+        action="VIEW_REPORT",
+        details=details + (" (cached)" if from_cache else "")
+    )
+
+
+def _load_precomputed_report(date_start, date_end, allowed_departments) -> Optional[dict]:
+    """
+    נתוני הדוח מהחישוב הלילי, אם הטווח הוא בדיוק חודש שכבר חושב (utils/report_precompute.py)
+
+    החודש נשמר במלואו, ולכן אינו מוגבל ב-max_records כמו שליפה שבועית מה-API.
+    """
+    month = full_month_of_range(date_start, date_end)
+    if month is None:
+        return None
+    documents = get_report_store().load_month(month, allowed_departments)
+    if not documents:
+        return None
+
+    date_start_iso, date_end_iso = history_range_iso(date_start, date_end)
+    return {
+        'documents': documents,
+        'recordsOnPage': len(documents),
+        'dateStart': date_start_iso,
+        'dateEnd': date_end_iso,
+        'precomputedMonth': month
+    }
+
+
+def fetch_report_data(api, logger, username, date_start, date_end, status_filter_list, max_records):
+    """
+    טעינת נתוני הדוח - מהמטמון המשותף או מהחישוב הלילי מיד, אחרת כעבודת רקע
+
+    דוח זהה (טווח, פילטרים והיקף הרשאות) מוגש מהמטמון לכל המשתמשים אחרי הטעינה
+    הראשונה, ובקשה זהה בזמן שהטעינה רצה מצטרפת לאותה עבודה. מזהה העבודה נשמר
+    ב-session_state וב-URL (report_job) - אפשר לעבור דף או להתחבר מחדש ולחזור לתוצאה.
+    """
+    allowed_departments = st.session_state.get('allowed_departments', ["ALL"])
+    cache = get_report_cache()
+    cache_key = make_report_key(date_start, date_end, allowed_departments, maxrecords=max_records)
+
+    st.session_state.pop('history_report_data', None)
+    st.session_state.pop('user_lookup_cache', None)
+    st.session_state.pop('report_frame', None)
+
+    report_data = cache.get(cache_key)
+    if report_data is None:
+        report_data = _load_precomputed_report(date_start, date_end, allowed_departments)
+        if report_data is not None:
+            cache.set(cache_key, report_data, ttl=report_ttl(date_end))
+    if report_data is not None:
+        st.session_state.history_report_data = report_data
+        _log_report_view(logger, username, date_start, date_end, report_data, from_cache=True)
+        return
+
+    def run(ctx):
+        # ה-miss כבר נספר ב-cache.get למעלה; עבודות זהות מאוחדות ע"י מנהל העבודות
+        data = cache.peek(cache_key)
+        if data is None:
+            # API נפרד לעבודה - לא תלוי ב-session שהגיש אותה
+            data = _fetch_history_range(SafeQAPI(), date_start, date_end, max_records, allowed_departments,
+                                        progress=ctx.progress, publish=ctx.publish)
+            if data is not None:
+                cache.set(cache_key, data, ttl=report_ttl(date_end))
+        return data
+
+    job = get_job_manager().submit('report', cache_key, run, owner=username,
+                                   description=f"{date_start.isoformat()}|{date_end.isoformat()}")
+    st.session_state.report_job_id = job.id
+    st.query_params['report_job'] = job.id
+
+
+def _finish_report_job(job, logger, username):
+    """סיום עבודה: העברת התוצאה ל-session_state והודעה להצגה אחרי ה-rerun"""
+    st.session_state.pop('report_job_id', None)
+    st.session_state.pop('report_partial', None)
+    st.query_params.pop('report_job', None)
+
+    if job.status == 'done':
+        report_data = get_job_manager().result(job.id)
+        if report_data and report_data.get('documents'):
+            st.session_state.history_report_data = report_data
+            date_start, _, date_end = job.description.partition('|')
+            _log_report_view(logger, username, date_start, date_end, report_data, from_cache=False)
+            if report_data.get('weeks'):
+                st.session_state.report_job_notice = (
+                    'success', f"✅ נטענו {len(report_data['documents'])} מסמכים מ-{report_data['weeksLoaded']} שבועות"
                 )
-            else:
-                st.error("❌ לא הצלחנו לקבל נתונים מהשרת")
-                if 'history_report_data' in st.session_state:
-                    del st.session_state.history_report_data
+        else:
+            st.session_state.report_job_notice = ('error', "❌ לא נמצאו נתונים עבור הטווח שנבחר")
+    elif job.status == 'cancelled':
+        st.session_state.report_job_notice = ('info', "הטעינה בוטלה")
     else:
-        # טווח גדול - קריאות מרובות
-        all_documents = []
-        week_ranges = split_date_range_to_weeks(date_start, date_end)
-        total_weeks = len(week_ranges)
+        st.session_state.report_job_notice = ('error', f"❌ טעינת הדוח נכשלה: {job.error}")
 
-        progress_bar = st.progress(0)
-        status_text = st.empty()
 
-        success_count = 0
-        for idx, (week_start, week_end) in enumerate(week_ranges):
-            status_text.text(f"⏳ טוען שבוע {idx + 1} מתוך {total_weeks}...")
+def _show_partial_report(job, status_filter_list):
+    """
+    דשבורד חלקי מהשבועות שכבר נטענו
 
-            week_start_iso = datetime.combine(week_start, datetime.min.time()).isoformat() + "Z"
+    כל חלק חדש מומר ל-DataFrame ומתווסף פעם אחת לצובר של ה-session, כך שבכל
+    בדיקה מעובדים רק השבועות שהגיעו מאז הבדיקה הקודמת.
+    """
+    state = st.session_state.get('report_partial')
+    if state is None or state['job_id'] != job.id:
+        state = {'job_id': job.id, 'chunks': 0, 'accumulator': DashboardAccumulator()}
+        st.session_state.report_partial = state
+
+    wanted = set(status_filter_list)
+    user_cache = st.session_state.get('user_lookup_cache', {})
+    for documents in get_job_manager().partial(job.id, state['chunks']):
+        documents = [doc for doc in documents if doc.get('status') in wanted]
+        state['accumulator'].add(prepare_history_dataframe(documents, user_cache))
+        state['chunks'] += 1
+
+    if state['accumulator'].total_docs:
+        st.caption(f"📊 תמונת מצב חלקית ({state['chunks']} שבועות נטענו) - מתעדכנת תוך כדי הטעינה")
+        render_dashboard(state['accumulator'].snapshot())
+
+
+def _poll_report_job(logger, username, status_filter_list):
+    """מצב עבודת הדוח הפעילה: התקדמות, ביטול, דשבורד חלקי, ובסיום - rerun של הדף עם התוצאה"""
+    job_id = st.session_state.get('report_job_id')
+    if not job_id:
+        return
 
-            if week_end >= datetime.now().date():
-                week_end_iso = datetime.now().isoformat() + "Z"
-            else:
-                week_end_iso = datetime.combine(week_end, datetime.max.time()).isoformat() + "Z"
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None or not job.can_view(username):
+        st.session_state.pop('report_job_id', None)
+        st.query_params.pop('report_job', None)
+        st.session_state.report_job_notice = ('warning', "⚠️ עבודת הטעינה לא נמצאה - יש להפעיל את הדוח מחדש")
+        st.rerun()
+
+    if job.active:
+        st.progress(job.progress, text=job.message or "⏳ ממתין בתור...")
+        if st.button("✖️ בטל טעינה", key="cancel_report_job"):
+            # עבודה משותפת ממשיכה למשתמשים אחרים שהצטרפו אליה - רק ה-session הזה עוזב
+            manager.cancel(job_id, owner=username)
+            st.session_state.pop('report_job_id', None)
+            st.session_state.pop('report_partial', None)
+            st.query_params.pop('report_job', None)
+            st.session_state.report_job_notice = ('info', "הטעינה בוטלה")
+            st.rerun()
+        _show_partial_report(job, status_filter_list)
+        return
 
-            result = api.get_documents_history(
-                datestart=week_start_iso,
-                dateend=week_end_iso,
-                status=None,  # לא שולחים status ל-API
-                maxrecords=max_records
-            )
+    _finish_report_job(job, logger, username)
+    st.rerun()
 
-            if result and 'documents' in result:
-                all_documents.extend(result['documents'])
-                success_count += 1
 
-            progress_bar.progress((idx + 1) / total_weeks)
+_fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+if _fragment is not None:
+    # רק אזור ההתקדמות רץ מחדש כל JOBS_POLL_INTERVAL שניות, לא כל הדף
+    _poll_report_job = _fragment(run_every=CONFIG.get('JOBS_POLL_INTERVAL', 2))(_poll_report_job)
 
-        # הצגת 100%
-        status_text.text(f"✅ הסתיים! נטענו {success_count} שבועות")
-        progress_bar.progress(1.0)
-        time.sleep(0.5)
 
-        progress_bar.empty()
-        status_text.empty()
+def show_report_job(logger, username, status_filter_list) -> bool:
+    """
+    הצגת עבודת הדוח של ה-session (או של ה-URL, אחרי חיבור מחדש)
 
-        if all_documents:
-            if date_end >= datetime.now().date():
-                final_end_iso = datetime.now().isoformat() + "Z"
-            else:
-                final_end_iso = datetime.combine(date_end, datetime.max.time()).isoformat() + "Z"
+    Returns:
+        bool: True אם עבודה עדיין רצה
+    """
+    if 'report_job_id' not in st.session_state and st.query_params.get('report_job'):
+        st.session_state.report_job_id = st.query_params['report_job']
 
-            st.session_state.history_report_data = {
-                'documents': all_documents,
-                'recordsOnPage': len(all_documents),
-                'dateStart': datetime.combine(date_start, datetime.min.time()).isoformat() + "Z",
-                'dateEnd': final_end_iso
-            }
+    notice = st.session_state.pop('report_job_notice', None)
+    if notice:
+        getattr(st, notice[0])(notice[1])
 
-            st.success(f"✅ נטענו {len(all_documents)} מסמכים מ-{success_count} שבועות")
+    if 'report_job_id' not in st.session_state:
+        return False
 
-            logger.log_action(
-                username=username,
-                action="VIEW_REPORT",
-                details=f"Multi-week report: {total_weeks} weeks, {len(all_documents)} documents"
-            )
-        else:
-            st.error(f"❌ לא נמצאו נתונים עבור הטווח שנבחר ({success_count}/{total_weeks} שבועות הצליחו)")
-            if 'history_report_data' in st.session_state:
-                del st.session_state.history_report_data
+    _poll_report_job(logger, username, status_filter_list)
+
+    if _fragment is None and 'report_job_id' in st.session_state:
+        # Streamlit ללא fragments - בדיקה חוזרת של כל הדף
+        time.sleep(CONFIG.get('JOBS_POLL_INTERVAL', 2))
+        st.rerun()
+    return 'report_job_id' in st.session_state
+
+
+def _combine_groups(current: Optional[pd.DataFrame], chunk: pd.DataFrame, how: dict) -> pd.DataFrame:
+    """איחוד סיכום קבוצות של חלק חדש עם הסיכום המצטבר (אותו אינדקס ממוין כמו groupby על הכל)"""
+    if current is None:
+        return chunk
+    return pd.concat([current, chunk]).groupby(level=0).agg(how)
+
+
+class DashboardAccumulator:
+    """
+    צבירה הדרגתית של נתוני הדשבורד מחלקי DataFrame (prepare_history_dataframe)
+
+    כל חלק מסוכם פעם אחת ומתווסף לסיכומים המצטברים, כך שאפשר להציג כרטיסים
+    וטבלאות Top 10 בזמן שהשבועות הבאים עדיין נטענים. snapshot() מחזיר את אותו
+    מבנה כמו compute_dashboard_stats.
+    """
+
+    USER_AGG = {'עמודים': 'sum', 'צבע': 'sum', 'שם מלא': 'first', 'מסמכים': 'sum'}
+    COUNT_AGG = {'עמודים': 'sum', 'מסמכים': 'sum'}
+
+    def __init__(self):
+        self.total_docs = 0
+        self.total_pages = 0
+        self.total_color_pages = 0
+        self.duplex_pages = 0
+        self.simplex_pages = 0
+        self.job_types: Dict[str, dict] = {}
+        self._users: Optional[pd.DataFrame] = None
+        self._ports: Optional[pd.DataFrame] = None
+        self._departments: Optional[pd.DataFrame] = None
+
+    def add(self, df: pd.DataFrame) -> 'DashboardAccumulator':
+        """הוספת חלק (שורות חדשות בלבד)"""
+        if df.empty:
+            return self
+
+        # כולל כל סוגי העבודות: הדפסה, העתקה, סריקה, פקס
+        self.total_docs += len(df)
+
+        # סינון לפי הדפסה והעתקה בלבד (ללא סריקה ופקס)
+        print_copy_df = df[df['סוג'].isin(['הדפסה', 'העתקה'])]
+        self.total_pages += int(print_copy_df['עמודים'].sum())
+        self.total_color_pages += int(print_copy_df['צבע'].sum())
+        self.duplex_pages += int(print_copy_df[print_copy_df['דופלקס'] == 'כן']['עמודים'].sum())
+        self.simplex_pages += int(print_copy_df[print_copy_df['דופלקס'] == 'לא']['עמודים'].sum())
+
+        # סטטיסטיקות לפי סוג עבודה (לפי סדר ההופעה הראשונה)
+        for job_type, job_type_df in df.groupby('סוג', sort=False):
+            stats = self.job_types.setdefault(job_type, {'count': 0, 'pages': 0})
+            stats['count'] += len(job_type_df)
+            stats['pages'] += int(job_type_df['עמודים'].sum())
+
+        users = df.groupby('משתמש').agg(**{
+            'עמודים': ('עמודים', 'sum'),
+            'צבע': ('צבע', 'sum'),
+            'שם מלא': ('שם מלא', 'first'),  # לוקח את השם המלא הראשון
+            'מסמכים': ('עמודים', 'size'),
+        })
+        self._users = _combine_groups(self._users, users, self.USER_AGG)
+
+        for attr, column in (('_ports', 'מדפסת'), ('_departments', 'מחלקה')):
+            rows = df[df[column] != '']
+            if rows.empty:
+                continue
+            counts = rows.groupby(column).agg(**{'עמודים': ('עמודים', 'sum'), 'מסמכים': ('עמודים', 'size')})
+            setattr(self, attr, _combine_groups(getattr(self, attr), counts, self.COUNT_AGG))
+
+        return self
+
+    def snapshot(self) -> dict:
+        """נתוני הדשבורד לפי מה שנצבר עד עכשיו"""
+        top_users_df = pd.DataFrame(columns=['ש/ל', 'עמודי צבע', 'עמודים', 'מסמכים', 'משתמש', 'שם מלא'])
+        if self._users is not None:
+            user_stats = self._users.reset_index()
+            user_stats['ש/ל'] = user_stats['עמודים'] - user_stats['צבע']
+
+            # מיון לפי עמודים - Top 10
+            top_users_df = user_stats.nlargest(10, 'עמודים')[['שם מלא', 'משתמש', 'מסמכים', 'עמודים', 'צבע', 'ש/ל']]
+            top_users_df.columns = ['שם מלא', 'משתמש', 'מסמכים', 'עמודים', 'עמודי צבע', 'ש/ל']
+
+            # סידור עמודות RTL - מימין לשמאל
+            top_users_df = top_users_df[['ש/ל', 'עמודי צבע', 'עמודים', 'מסמכים', 'משתמש', 'שם מלא']]
+
+        top_ports_df = None
+        if self._ports is not None:
+            top_ports_df = self._ports.reset_index().nlargest(10, 'עמודים')[['עמודים', 'מסמכים', 'מדפסת']]
+
+        dept_df = None
+        if self._departments is not None:
+            dept_df = self._departments.reset_index().sort_values('עמודים', ascending=False)
+            dept_df = dept_df[['עמודים', 'מסמכים', 'מחלקה']]
+
+        total_pages = self.total_pages
+        return {
+            'total_docs': self.total_docs,
+            'total_pages': total_pages,
+            'total_color_pages': self.total_color_pages,
+            'duplex_percentage': (self.duplex_pages / total_pages * 100) if total_pages > 0 else 0,
+            'simplex_percentage': (self.simplex_pages / total_pages * 100) if total_pages > 0 else 0,
+            'job_types': {job_type: dict(stats) for job_type, stats in self.job_types.items()},
+            'top_users': top_users_df,
+            'top_ports': top_ports_df,
+            'departments': dept_df,
+        }
+
+
+@timed()
+def compute_dashboard_stats(df: pd.DataFrame) -> dict:
+    """
+    חישוב נתוני הדשבורד מ-DataFrame ההיסטוריה (ללא UI)
+
+    Returns:
+        dict: total_docs, total_pages, total_color_pages, duplex_percentage, simplex_percentage,
+              job_types ({סוג: {'count', 'pages'}}), top_users, top_ports, departments
+              (top_ports/departments = None כשאין נתונים)
+    """
+    return DashboardAccumulator().add(df).snapshot()
 
 
 def show_dashboard_tab(api, status_filter_list):
@@ -460,21 +791,16 @@ def show_dashboard_tab(api, status_filter_list):
 
     st.markdown("## 📈 סיכום כל העבודות")
 
-    # חישוב סטטיסטיקות ישירות מהDataFrame המסונן
-    # כולל כל סוגי העבודות: הדפסה, העתקה, סריקה, פקס
-    total_docs = len(df)
+    render_dashboard(_dashboard_stats(df))
 
-    # סינון לפי הדפסה והעתקה בלבד (ללא סריקה ופקס)
-    print_copy_df = df[df['סוג'].isin(['הדפסה', 'העתקה'])]
 
-    total_pages = int(print_copy_df['עמודים'].sum())
-    total_color_pages = int(print_copy_df['צבע'].sum())
-
-    # חישוב דו צדדי וחד צדדי (רק הדפסה והעתקה)
-    duplex_pages = int(print_copy_df[print_copy_df['דופלקס'] == 'כן']['עמודים'].sum())
-    simplex_pages = int(print_copy_df[print_copy_df['דופלקס'] == 'לא']['עמודים'].sum())
-    duplex_percentage = (duplex_pages / total_pages * 100) if total_pages > 0 else 0
-    simplex_percentage = (simplex_pages / total_pages * 100) if total_pages > 0 else 0
+def render_dashboard(stats: dict):
+    """כרטיסי הסיכום וטבלאות ה-Top 10 (מ-compute_dashboard_stats או מ-DashboardAccumulator)"""
+    total_docs = stats['total_docs']
+    total_pages = stats['total_pages']
+    total_color_pages = stats['total_color_pages']
+    duplex_percentage = stats['duplex_percentage']
+    simplex_percentage = stats['simplex_percentage']
 
     # כרטיסי סטטיסטיקה
     col1, col2, col3, col4 = st.columns(4)
@@ -528,14 +854,7 @@ def show_dashboard_tab(api, status_filter_list):
     # פילוח לפי סוג עבודה
     st.markdown("### 📋 פילוח לפי סוג עבודה")
 
-    # חישוב סטטיסטיקות לפי סוג עבודה מהDataFrame
-    job_types_stats = {}
-    for job_type in df['סוג'].unique():
-        job_type_df = df[df['סוג'] == job_type]
-        job_types_stats[job_type] = {
-            'count': len(job_type_df),
-            'pages': int(job_type_df['עמודים'].sum())
-        }
+    job_types_stats = stats['job_types']
 
     job_type_names = {
         'הדפסה': '🖨️ הדפסה',
@@ -546,11 +865,11 @@ def show_dashboard_tab(api, status_filter_list):
 
     if job_types_stats:
         cols = st.columns(len(job_types_stats))
-        for idx, (job_type, stats) in enumerate(job_types_stats.items()):
+        for idx, (job_type, job_stats) in enumerate(job_types_stats.items()):
             with cols[idx]:
                 display_name = job_type_names.get(job_type, job_type)
-                count = stats['count']
-                pages = stats['pages']
+                count = job_stats['count']
+                pages = job_stats['pages']
                 # חישוב אחוזים לפי עמודים (ולא לפי מספר עבודות)
                 percentage = (pages / total_pages * 100) if total_pages > 0 else 0
                 st.markdown(f"""
@@ -567,44 +886,15 @@ def show_dashboard_tab(api, status_filter_list):
     # TOP 10 משתמשים
     st.markdown("### 👥 משתמשים מובילים (Top 10)")
 
-    # חישוב סטטיסטיקות משתמשים מהDataFrame
-    user_stats = df.groupby('משתמש').agg({
-        'עמודים': 'sum',
-        'צבע': 'sum',
-        'שם מלא': 'first'  # לוקח את השם המלא הראשון
-    }).reset_index()
-
-    user_stats['מסמכים'] = df.groupby('משתמש').size().values
-    user_stats['ש/ל'] = user_stats['עמודים'] - user_stats['צבע']
-
-    # מיון לפי עמודים והצגת Top 10
-    top_users_df = user_stats.nlargest(10, 'עמודים')[['שם מלא', 'משתמש', 'מסמכים', 'עמודים', 'צבע', 'ש/ל']]
-    top_users_df.columns = ['שם מלא', 'משתמש', 'מסמכים', 'עמודים', 'עמודי צבע', 'ש/ל']
-
-    # סידור עמודות RTL - מימין לשמאל
-    top_users_df = top_users_df[['ש/ל', 'עמודי צבע', 'עמודים', 'מסמכים', 'משתמש', 'שם מלא']]
-
-    st.dataframe(top_users_df, use_container_width=True, hide_index=True)
+    st.dataframe(stats['top_users'], use_container_width=True, hide_index=True)
 
     st.markdown("---")
 
     # TOP 10 מדפסות
     st.markdown("### 🖨️ מדפסות פעילות (Top 10)")
 
-    # חישוב סטטיסטיקות מדפסות מהDataFrame
-    port_stats = df[df['מדפסת'] != ''].groupby('מדפסת').agg({
-        'עמודים': 'sum'
-    }).reset_index()
-    port_stats['מסמכים'] = df[df['מדפסת'] != ''].groupby('מדפסת').size().values
-
-    # מיון לפי עמודים והצגת Top 10
-    if len(port_stats) > 0:
-        top_ports_df = port_stats.nlargest(10, 'עמודים')[['מדפסת', 'מסמכים', 'עמודים']]
-
-        # סידור עמודות RTL - מימין לשמאל
-        top_ports_df = top_ports_df[['עמודים', 'מסמכים', 'מדפסת']]
-
-        st.dataframe(top_ports_df, use_container_width=True, hide_index=True)
+    if stats['top_ports'] is not None:
+        st.dataframe(stats['top_ports'], use_container_width=True, hide_index=True)
     else:
         st.info("ℹ️ אין מידע על מדפסות בנתונים")
 
@@ -613,21 +903,8 @@ def show_dashboard_tab(api, status_filter_list):
     # פילוח לפי מחלקות
     st.markdown("### 🏢 פילוח לפי מחלקות")
 
-    # חישוב סטטיסטיקות מחלקות מהDataFrame
-    dept_stats = df[df['מחלקה'] != ''].groupby('מחלקה').agg({
-        'עמודים': 'sum'
-    }).reset_index()
-
-    if len(dept_stats) > 0:
-        dept_stats['מסמכים'] = df[df['מחלקה'] != ''].groupby('מחלקה').size().values
-
-        # מיון לפי עמודים
-        dept_df = dept_stats.sort_values('עמודים', ascending=False)[['מחלקה', 'מסמכים', 'עמודים']]
-
-        # סידור עמודות RTL - מימין לשמאל
-        dept_df = dept_df[['עמודים', 'מסמכים', 'מחלקה']]
-
-        st.dataframe(dept_df, use_container_width=True, hide_index=True)
+    if stats['departments'] is not None:
+        st.dataframe(stats['departments'], use_container_width=True, hide_index=True)
     else:
         st.info("ℹ️ אין מידע על מחלקות בנתונים")
 
@@ -640,54 +917,22 @@ def show_detailed_report_tab(api, status_filter_list):
         st.info("ℹ️ לחץ על 'הצג דוח' כדי לטעון נתונים")
         return
 
-    data = st.session_state.history_report_data
-    documents = data.get('documents', [])
-
-    if not documents:
+    frame = _report_frame(api, status_filter_list)
+    if frame is None:
         st.warning("⚠️ אין נתונים להצגה")
         return
 
     # סינון לפי הרשאות - school_manager רואה רק את בתי הספר שלו
-    allowed_departments = st.session_state.get('allowed_departments', ["ALL"])
-
-    if allowed_departments != ["ALL"]:
-        original_count_before_dept = len(documents)
-
-        # פונקציה עזר לבדיקה אם דוקומנט שייך למחלקה מורשית
-        def doc_has_allowed_department(doc):
-            tags = doc.get('tags', [])
-            for tag in tags:
-                if tag.get('tagType') == 0:  # Department tag
-                    dept_name = tag.get('name', '')
-                    if dept_name in allowed_departments:
-                        return True
-            return False
-
-        # סינון דוקומנטים לפי מחלקות מורשות
-        documents = [doc for doc in documents if doc_has_allowed_department(doc)]
-
-        if len(documents) < original_count_before_dept:
-            st.info(f"ℹ️ מציג נתונים עבור בתי הספר שלך בלבד ({len(documents)} מתוך {original_count_before_dept})")
-
-    # בניית cache של שמות משתמשים
-    if 'user_lookup_cache' not in st.session_state:
-        with st.spinner("טוען מידע משתמשים..."):
-            usernames = [doc.get('userName', '') for doc in documents if doc.get('userName')]
-            st.session_state.user_lookup_cache = build_user_lookup_cache(api, usernames)
+    if frame['in_scope'] < frame['total']:
+        st.info(f"ℹ️ מציג נתונים עבור בתי הספר שלך בלבד ({frame['in_scope']} מתוך {frame['total']})")
 
-    user_cache = st.session_state.user_lookup_cache
-
-    # סינון לפי סטטוס
-    filtered_documents = [doc for doc in documents if doc.get('status') in status_filter_list]
-
-    # המרת הנתונים ל-DataFrame
-    df = prepare_history_dataframe(filtered_documents, user_cache)
+    df = frame['df']
 
     # הצגת מספר תוצאות
     st.markdown(f"## 📋 נמצאו {len(df)} תוצאות")
 
-    if len(filtered_documents) < len(documents):
-        st.info(f"ℹ️ סוננו {len(documents) - len(filtered_documents)} רשומות לפי סטטוס")
+    if len(df) < frame['in_scope']:
+        st.info(f"ℹ️ סוננו {frame['in_scope'] - len(df)} רשומות לפי סטטוס")
 
     if len(df) == 0:
         st.warning("⚠️ אין תוצאות להצגה")
@@ -707,15 +952,7 @@ def show_detailed_report_tab(api, status_filter_list):
             st.info(f"📊 סה\"כ {len(filtered_df)} רשומות")
 
     with result_col2:
-        excel_data = export_to_excel(filtered_df, "history_report")
-        st.download_button(
-            label="📥 ייצא ל-Excel",
-            data=excel_data,
-            file_name=f"history_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            key="export_detail_btn",
-            use_container_width=True
-        )
+        excel_download_button(filtered_df, "history_report", "history_report", key="export_detail_btn")
 
     # הצגת הטבלה
     st.dataframe(
@@ -726,6 +963,7 @@ def show_detailed_report_tab(api, status_filter_list):
     )
 
 
+@timed()
 def build_user_lookup_cache(api, usernames: List[str]) -> Dict[str, str]:
     """
     בונה cache של username -> fullName
@@ -806,6 +1044,98 @@ def split_date_range_to_weeks(start_date, end_date):
     return weeks
 
 
+def _report_frame(api, status_filter_list) -> Optional[dict]:
+    """
+    DataFrame הדוח (prepare_history_dataframe) אחרי סינון הרשאות וסטטוס, עם מונים לתצוגה
+
+    נשמר ב-session_state ונבנה מחדש רק כשנתוני הדוח (אובייקט חדש), רשימת הסטטוסים
+    או היקף ההרשאות משתנים - שינוי סינון או לחיצה בטאב לא ממירים שוב את כל המסמכים.
+
+    Returns:
+        dict: {'df', 'total', 'in_scope', 'options', 'filtered'}, או None אם אין מסמכים
+    """
+    data = st.session_state.get('history_report_data') or {}
+    documents = data.get('documents', [])
+    if not documents:
+        return None
+
+    allowed_departments = st.session_state.get('allowed_departments', ["ALL"])
+    token = (tuple(status_filter_list), tuple(allowed_departments))
+    frame = st.session_state.get('report_frame')
+    if frame is not None and frame['source'] is data and frame['token'] == token:
+        return frame
+
+    # סינון לפי הרשאות - school_manager רואה רק את בתי הספר שלו
+    in_scope = filter_documents_by_departments(documents, allowed_departments)
+
+    # סינון לפי סטטוס
+    filtered_documents = [doc for doc in in_scope if doc.get('status') in status_filter_list]
+
+    # בניית cache של שמות משתמשים
+    if 'user_lookup_cache' not in st.session_state:
+        with st.spinner("טוען מידע משתמשים..."):
+            usernames = [doc.get('userName', '') for doc in filtered_documents if doc.get('userName')]
+            st.session_state.user_lookup_cache = build_user_lookup_cache(api, usernames)
+
+    frame = {
+        'source': data,
+        'token': token,
+        'df': prepare_history_dataframe(filtered_documents, st.session_state.user_lookup_cache),
+        'total': len(documents),
+        'in_scope': len(in_scope),
+        'options': None,
+        'filtered': None,
+    }
+    st.session_state.report_frame = frame
+    return frame
+
+
+def _dashboard_stats(df: pd.DataFrame) -> dict:
+    """נתוני הדשבורד ל-DataFrame המסונן הנוכחי - מחושבים פעם אחת לכל צירוף סינונים"""
+    filtered = (st.session_state.get('report_frame') or {}).get('filtered')
+    if filtered is None or filtered['df'] is not df:
+        return compute_dashboard_stats(df)
+    if filtered['stats'] is None:
+        filtered['stats'] = compute_dashboard_stats(df)
+    return filtered['stats']
+
+
+def show_report_results(api, status_filter_list):
+    """
+    סינון הנתונים, הדשבורד והדוח המפורט
+
+    רץ כ-fragment: שינוי בסינון (או ייצוא) מריץ מחדש רק את האזור הזה ולא את הגדרות
+    הדוח ובדיקת העבודות. הנתונים עצמם מגיעים מ-_report_frame ומהמטמון של הסינון.
+    """
+    frame = st.session_state.get('report_frame') if 'history_report_data' in st.session_state else None
+    if frame is not None:
+        # הצגת סינון משותף (בexpander)
+        filtered_df, filters_applied = apply_data_filters(frame['df'], frame)
+
+        # שמירת הנתונים המסוננים ב-session_state כדי שהטאבים יוכלו להשתמש בהם
+        st.session_state.filtered_df = filtered_df
+        st.session_state.original_df = frame['df']
+        st.session_state.filters_applied = filters_applied
+
+    # יצירת טאבים - רק 2 טאבים
+    tab1, tab2 = st.tabs([
+        "🏠 דשבורד מבט על",
+        "📜 דוח היסטוריה מפורט"
+    ])
+
+    # ========== טאב 1: דשבורד מבט על ==========
+    with tab1:
+        show_dashboard_tab(api, status_filter_list)
+
+    # ========== טאב 2: דוח היסטוריה מפורט ==========
+    with tab2:
+        show_detailed_report_tab(api, status_filter_list)
+
+
+if _fragment is not None:
+    show_report_results = _fragment(show_report_results)
+
+
 def show():
     """הצגת דף הדוחות"""
     check_authentication()
@@ -930,64 +1260,29 @@ def show():
 
     date_start, date_end, status_filter_list, max_records, search_clicked = settings_result
 
-    # ביצוע החיפוש
-    if search_clicked or 'history_report_data' in st.session_state:
-        if search_clicked:
-            # סגירת expander של הגדרות דוח ופתיחת expander של סינונים
-            st.session_state.report_settings_expanded = False
-            st.session_state.filters_expanded = True
-            # הגדרת דגל גלילה אוטומטית לאחר rerun
-            st.session_state.trigger_report_scroll = True
-            # קריאת נתונים מ-API
-            fetch_report_data(api, logger, username, date_start, date_end, status_filter_list, max_records)
-            # אילוץ rerun כדי לעדכן את מצב ה-expanders
-            st.rerun()
-
-        # טעינת הנתונים והכנת DataFrame מסונן משותף
-        if 'history_report_data' in st.session_state:
-            data = st.session_state.history_report_data
-            documents = data.get('documents', [])
-
-            if documents:
-                # סינון לפי הרשאות - school_manager רואה רק את בתי הספר שלו
-                allowed_departments = st.session_state.get('allowed_departments', ["ALL"])
-
-                if allowed_departments != ["ALL"]:
-                    def doc_has_allowed_department(doc):
-                        tags = doc.get('tags', [])
-                        for tag in tags:
-                            if tag.get('tagType') == 0:  # Department tag
-                                dept_name = tag.get('name', '')
-                                if dept_name in allowed_departments:
-                                    return True
-                        return False
-
-                    documents = [doc for doc in documents if doc_has_allowed_department(doc)]
-
-                # סינון לפי סטטוס
-                filtered_documents = [doc for doc in documents if doc.get('status') in status_filter_list]
-
-                # בניית cache של שמות משתמשים
-                if 'user_lookup_cache' not in st.session_state:
-                    with st.spinner("טוען מידע משתמשים..."):
-                        usernames = [doc.get('userName', '') for doc in filtered_documents if doc.get('userName')]
-                        st.session_state.user_lookup_cache = build_user_lookup_cache(api, usernames)
-
-                user_cache = st.session_state.user_lookup_cache
-
-                # המרת הנתונים ל-DataFrame
-                df = prepare_history_dataframe(filtered_documents, user_cache)
-
-                # הצגת סינון משותף (בexpander)
-                filtered_df, filters_applied = apply_data_filters(df)
+    if search_clicked:
+        # סגירת expander של הגדרות דוח ופתיחת expander של סינונים
+        st.session_state.report_settings_expanded = False
+        st.session_state.filters_expanded = True
+        # הגדרת דגל גלילה אוטומטית לאחר rerun
+        st.session_state.trigger_report_scroll = True
+        # מהמטמון, או הגשת עבודת רקע
+        fetch_report_data(api, logger, username, date_start, date_end, status_filter_list, max_records)
+        # אילוץ rerun כדי לעדכן את מצב ה-expanders
+        st.rerun()
+
+    # ייצוא מלא של הטווח שנבחר (CSV / Parquet) - זמין גם בזמן שהדוח נטען
+    show_full_history_export(api, logger, username, date_start, date_end, status_filter_list, {})
+
+    # עבודת טעינה שרצה ברקע - התוצאות יוצגו כשתסתיים
+    if show_report_job(logger, username, status_filter_list):
+        return
 
-                # שמירת הנתונים המסוננים ב-session_state כדי שהטאבים יוכלו להשתמש בהם
-                st.session_state.filtered_df = filtered_df
-                st.session_state.original_df = df
-                st.session_state.filters_applied = filters_applied
-            else:
-                st.warning("⚠️ אין נתונים להצגה")
-                return
+    # טעינת הנתונים והכנת DataFrame משותף (נבנה מחדש רק כשהנתונים, הסטטוסים או ההרשאות משתנים)
+    if 'history_report_data' in st.session_state:
+        if _report_frame(api, status_filter_list) is None:
+            st.warning("⚠️ אין נתונים להצגה")
+            return
 
     # גלילה אוטומטית לתוצאות הדוח אחרי rerun
     if st.session_state.get('trigger_report_scroll', False):
@@ -1021,19 +1316,7 @@ def show():
         # ניקוי דגל הגלילה
         st.session_state.trigger_report_scroll = False
 
-    # יצירת טאבים - רק 2 טאבים
-    tab1, tab2 = st.tabs([
-        "🏠 דשבורד מבט על",
-        "📜 דוח היסטוריה מפורט"
-    ])
-
-    # ========== טאב 1: דשבורד מבט על ==========
-    with tab1:
-        show_dashboard_tab(api, status_filter_list)
-
-    # ========== טאב 2: דוח היסטוריה מפורט ==========
-    with tab2:
-        show_detailed_report_tab(api, status_filter_list)
+    show_report_results(api, status_filter_list)
 
 
 def show_history_report(api, logger, role, username):
@@ -1374,15 +1657,7 @@ def show_history_report(api, logger, role, username):
                         st.info(f"📊 סה\"כ {len(df)} רשומות")
 
                 with result_col2:
-                    excel_data = export_to_excel(filtered_df, "history_report")
-                    st.download_button(
-                        label="📥 ייצא ל-Excel",
-                        data=excel_data,
-                        file_name=f"history_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        key="export_history_btn",
-                        use_container_width=True
-                    )
+                    excel_download_button(filtered_df, "history_report", "history_report", key="export_history_btn")
 
                 # הצגת הטבלה (עד 20 שורות)
                 st.dataframe(
@@ -1396,6 +1671,89 @@ def show_history_report(api, logger, role, username):
                 st.warning("⚠️ לא נמצאו תוצאות עבור הפרמטרים שנבחרו")
 
 
+def _discard_history_export():
+    """מחיקת קובץ הייצוא המלא הקודם של ה-session"""
+    prepared = st.session_state.pop('history_stream_export', None)
+    if prepared:
+        try:
+            os.remove(prepared['path'])
+        except OSError:
+            pass
+
+
+def show_full_history_export(api, logger, username, date_start, date_end, status_filter_list, server_filters):
+    """
+    ייצוא מלא של הטווח ל-CSV/Parquet - כל עמודי ה-API (ללא מגבלת "תוצאות לדף")
+
+    הנתונים נכתבים בזרימה לקובץ זמני, עמוד אחרי עמוד, ולא נשמרים ב-session_state.
+    """
+    with st.expander("📦 ייצוא מלא לניתוח (CSV / Parquet)"):
+        st.caption("כל המסמכים בטווח ובסינונים שנבחרו, ללא הגבלת תוצאות לדף - מתאים גם למיליוני שורות")
+
+        formats = [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or parquet_available()]
+        fmt = st.radio(
+            "פורמט",
+            formats,
+            format_func=lambda f: EXPORT_FORMATS[f]['label'],
+            horizontal=True,
+            key="history_stream_format"
+        )
+        export_format = EXPORT_FORMATS[fmt]
+
+        params = (fmt, date_start.isoformat(), date_end.isoformat(), tuple(status_filter_list),
+                  tuple(sorted((k, v) for k, v in server_filters.items() if v)))
+        prepared = st.session_state.get('history_stream_export')
+        if prepared and (prepared['params'] != params or not os.path.exists(prepared['path'])):
+            _discard_history_export()
+            prepared = None
+
+        if prepared is None:
+            if not st.button("📦 הכן קובץ", key="history_stream_prepare"):
+                return
+
+            progress_text = st.empty()
+            handle = tempfile.NamedTemporaryFile(prefix='safeq-history-', suffix=f".{export_format['extension']}",
+                                                 delete=False)
+            try:
+                with handle, st.spinner("⏳ מייצא..."):
+                    rows = export_history(
+                        api, fmt, handle, date_start, date_end,
+                        allowed_departments=st.session_state.get('allowed_departments', ["ALL"]),
+                        statuses=status_filter_list,
+                        progress=lambda count: progress_text.text(f"⏳ נכתבו {count:,} שורות..."),
+                        **server_filters
+                    )
+            except HistoryExportError:
+                os.remove(handle.name)
+                st.error("❌ הייצוא נכשל - לא הצלחנו לקבל את כל הנתונים מהשרת")
+                return
+            progress_text.empty()
+
+            prepared = {
+                'params': params,
+                'path': handle.name,
+                'rows': rows,
+                'file_name': f"history_{date_start:%Y%m%d}_{date_end:%Y%m%d}.{export_format['extension']}"
+            }
+            st.session_state.history_stream_export = prepared
+
+            logger.log_action(
+                username=username,
+                action="EXPORT_HISTORY",
+                details=f"Format: {fmt}, {rows} rows, {date_start} to {date_end}, filters={dict(params[4])}"
+            )
+
+        st.success(f"✅ {prepared['rows']:,} שורות מוכנות להורדה")
+        with open(prepared['path'], 'rb') as export_file:
+            st.download_button(
+                label=f"💾 הורד {export_format['label']}",
+                data=export_file,
+                file_name=prepared['file_name'],
+                mime=export_format['mime'],
+                key="history_stream_download"
+            )
+
+
 def show_user_documents_report(api, logger, role, username):
     """דוח מסמכים לפי משתמש ספציפי"""
 
@@ -1414,6 +1772,82 @@ def show_user_documents_report(api, logger, role, username):
     st.info("ℹ️ השתמש ב'דוח היסטוריה מפורט' לסינון לפי משתמש ספציפי")
 
 
+@timed()
+def compute_document_statistics(documents: List[Dict]) -> dict:
+    """
+    חישוב סטטיסטיקות ניהול מרשימת מסמכים (ללא UI)
+
+    Args:
+        documents: מסמכים שבוצעו בפועל
+
+    Returns:
+        dict: total_docs/total_pages/total_color_pages (הדפסה וצילום בלבד),
+              job_types ({סוג בעברית: {'count', 'pages'}}),
+              top_users / top_ports ([(שם, stats)] - 10 המובילים לפי עמודים),
+              departments ([(מחלקה, stats)] לפי עמודים בסדר יורד)
+    """
+    # רק הדפסה וצילום (לא סריקה!)
+    print_copy_docs = [doc for doc in documents if doc.get('jobType') in ['PRINT', 'COPY']]
+
+    # תרגום סוגי עבודה לעברית
+    job_type_translation = {
+        'PRINT': 'הדפסה',
+        'COPY': 'העתקה',
+        'SCAN': 'סריקה',
+        'FAX': 'פקס'
+    }
+
+    job_types_stats = {}
+    user_stats = {}
+    port_stats = {}
+    dept_stats = {}
+    for doc in documents:
+        pages = doc.get('totalPages', 0)
+
+        job_type = doc.get('jobType', 'UNKNOWN')
+        job_type_he = job_type_translation.get(job_type, job_type)
+        if job_type_he not in job_types_stats:
+            job_types_stats[job_type_he] = {'count': 0, 'pages': 0}
+        job_types_stats[job_type_he]['count'] += 1
+        job_types_stats[job_type_he]['pages'] += pages
+
+        user = doc.get('userName', 'Unknown')
+        if user not in user_stats:
+            user_stats[user] = {'docs': 0, 'pages': 0, 'color_pages': 0}
+        user_stats[user]['docs'] += 1
+        user_stats[user]['pages'] += pages
+        user_stats[user]['color_pages'] += doc.get('colorPages', 0)
+
+        port = doc.get('outputPortName', 'Unknown')
+        if port and port != '':
+            if port not in port_stats:
+                port_stats[port] = {'docs': 0, 'pages': 0}
+            port_stats[port]['docs'] += 1
+            port_stats[port]['pages'] += pages
+
+        for tag in doc.get('tags', []):
+            if tag.get('tagType') == 0:  # Department tag
+                dept_name = tag.get('name', 'Unknown')
+                if dept_name not in dept_stats:
+                    dept_stats[dept_name] = {'docs': 0, 'pages': 0}
+                dept_stats[dept_name]['docs'] += 1
+                dept_stats[dept_name]['pages'] += pages
+
+    # מיון לפי מספר עמודים (סדר יורד)
+    def by_pages(item):
+        return item[1]['pages']
+
+    return {
+        'total_docs': len(print_copy_docs),
+        'total_pages': sum(doc.get('totalPages', 0) for doc in print_copy_docs),
+        'total_color_pages': sum(doc.get('colorPages', 0) for doc in print_copy_docs),
+        'job_types': job_types_stats,
+        'top_users': sorted(user_stats.items(), key=by_pages, reverse=True)[:10],
+        'top_ports': sorted(port_stats.items(), key=by_pages, reverse=True)[:10],
+        'departments': sorted(dept_stats.items(), key=by_pages, reverse=True),
+    }
+
+
 def show_statistics_report(api, logger, role, username):
     """דוח סטטיסטיקות וסיכומים"""
 
@@ -1453,30 +1887,11 @@ def show_statistics_report(api, logger, role, username):
     if len(documents) < original_count:
         st.info(f"ℹ️ הסטטיסטיקות מציגות רק עבודות שבוצעו בפועל ({len(documents)} מתוך {original_count} תוצאות)")
 
-    # חישוב סטטיסטיקות - רק הדפסה וצילום (לא סריקה!)
-    print_copy_docs = [doc for doc in documents if doc.get('jobType') in ['PRINT', 'COPY']]
-
-    total_docs = len(print_copy_docs)
-    total_pages = sum(doc.get('totalPages', 0) for doc in print_copy_docs)
-    total_color_pages = sum(doc.get('colorPages', 0) for doc in print_copy_docs)
-
-    # תרגום סוגי עבודה לעברית
-    job_type_translation = {
-        'PRINT': 'הדפסה',
-        'COPY': 'העתקה',
-        'SCAN': 'סריקה',
-        'FAX': 'פקס'
-    }
-
-    # סטטיסטיקות לפי סוג עבודה
-    job_types_stats = {}
-    for doc in documents:
-        job_type = doc.get('jobType', 'UNKNOWN')
-        job_type_he = job_type_translation.get(job_type, job_type)
-        if job_type_he not in job_types_stats:
-            job_types_stats[job_type_he] = {'count': 0, 'pages': 0}
-        job_types_stats[job_type_he]['count'] += 1
-        job_types_stats[job_type_he]['pages'] += doc.get('totalPages', 0)
+    stats = compute_document_statistics(documents)
+    total_docs = stats['total_docs']
+    total_pages = stats['total_pages']
+    total_color_pages = stats['total_color_pages']
+    job_types_stats = stats['job_types']
 
     # הצגת כרטיסי סטטיסטיקה
     col1, col2, col3, col4 = st.columns(4)
@@ -1527,11 +1942,11 @@ def show_statistics_report(api, logger, role, username):
     }
 
     cols = st.columns(len(job_types_stats))
-    for idx, (job_type, stats) in enumerate(job_types_stats.items()):
+    for idx, (job_type, job_stats) in enumerate(job_types_stats.items()):
         with cols[idx]:
             display_name = job_type_names.get(job_type, job_type)
-            count = stats['count']
-            pages = stats['pages']
+            count = job_stats['count']
+            pages = job_stats['pages']
             # חישוב אחוזים לפי עמודים (ולא לפי מספר עבודות)
             percentage = (pages / total_pages * 100) if total_pages > 0 else 0
             st.markdown(f"""
@@ -1556,33 +1971,19 @@ def show_statistics_report(api, logger, role, username):
 
     user_cache = st.session_state.user_lookup_cache
 
-    user_stats = {}
-    for doc in documents:
-        user = doc.get('userName', 'Unknown')
-        if user not in user_stats:
-            user_stats[user] = {
-                'docs': 0,
-                'pages': 0,
-                'color_pages': 0
-            }
-        user_stats[user]['docs'] += 1
-        user_stats[user]['pages'] += doc.get('totalPages', 0)
-        user_stats[user]['color_pages'] += doc.get('colorPages', 0)
-
-    # מיון לפי מספר עמודים (סדר יורד)
-    top_users = sorted(user_stats.items(), key=lambda x: x[1]['pages'], reverse=True)[:10]
+    top_users = stats['top_users']
 
     # יצירת טבלה עם שם מלא
     user_df = pd.DataFrame([
         {
             'שם מלא': user_cache.get(user, user),
             'משתמש': user,
-            'מסמכים': stats['docs'],
-            'עמודים': stats['pages'],
-            'עמודי צבע': stats['color_pages'],
-            'ש/ל': stats['pages'] - stats['color_pages']
+            'מסמכים': user_stats['docs'],
+            'עמודים': user_stats['pages'],
+            'עמודי צבע': user_stats['color_pages'],
+            'ש/ל': user_stats['pages'] - user_stats['color_pages']
         }
-        for user, stats in top_users
+        for user, user_stats in top_users
     ])
 
     st.dataframe(user_df, use_container_width=True, hide_index=True)
@@ -1592,22 +1993,11 @@ def show_statistics_report(api, logger, role, username):
     # סטטיסטיקות לפי מדפסת (Top 10)
     st.markdown("### 🖨️ מדפסות פעילות (Top 10)")
 
-    port_stats = {}
-    for doc in documents:
-        port = doc.get('outputPortName', 'Unknown')
-        if port and port != '':
-            if port not in port_stats:
-                port_stats[port] = {'docs': 0, 'pages': 0}
-            port_stats[port]['docs'] += 1
-            port_stats[port]['pages'] += doc.get('totalPages', 0)
-
-    if port_stats:
-        # מיון לפי מספר עמודים (סדר יורד)
-        top_ports = sorted(port_stats.items(), key=lambda x: x[1]['pages'], reverse=True)[:10]
-
+    top_ports = stats['top_ports']
+    if top_ports:
         port_df = pd.DataFrame([
-            {'מדפסת': port, 'מסמכים': stats['docs'], 'עמודים': stats['pages']}
-            for port, stats in top_ports
+            {'מדפסת': port, 'מסמכים': port_stats['docs'], 'עמודים': port_stats['pages']}
+            for port, port_stats in top_ports
         ])
 
         st.dataframe(port_df, use_container_width=True, hide_index=True)
@@ -1619,29 +2009,15 @@ def show_statistics_report(api, logger, role, username):
     # סטטיסטיקות לפי מחלקה (Department tags)
     st.markdown("### 🏢 פילוח לפי מחלקות")
 
-    dept_stats = {}
-    for doc in documents:
-        tags = doc.get('tags', [])
-        for tag in tags:
-            if tag.get('tagType') == 0:  # Department tag
-                dept_name = tag.get('name', 'Unknown')
-                if dept_name not in dept_stats:
-                    dept_stats[dept_name] = {
-                        'docs': 0,
-                        'pages': 0
-                    }
-                dept_stats[dept_name]['docs'] += 1
-                dept_stats[dept_name]['pages'] += doc.get('totalPages', 0)
-
-    if dept_stats:
-        # מיון לפי מספר עמודים (סדר יורד)
+    departments = stats['departments']
+    if departments:
         dept_df = pd.DataFrame([
             {
                 'מחלקה': dept,
-                'מסמכים': stats['docs'],
-                'עמודים': stats['pages']
+                'מסמכים': dept_stats['docs'],
+                'עמודים': dept_stats['pages']
             }
-            for dept, stats in sorted(dept_stats.items(), key=lambda x: x[1]['pages'], reverse=True)
+            for dept, dept_stats in departments
         ])
 
         st.dataframe(dept_df, use_container_width=True, hide_index=True)
@@ -1649,6 +2025,7 @@ def show_statistics_report(api, logger, role, username):
         st.info("ℹ️ אין מידע על מחלקות בנתונים")
 
 
+@timed()
 def prepare_history_dataframe(documents: List[Dict], user_cache: Dict[str, str] = None) -> pd.DataFrame:
     """
     המרת נתוני היסטוריה ל-DataFrame
@@ -1754,34 +2131,3 @@ def prepare_history_dataframe(documents: List[Dict], user_cache: Dict[str, str]
         df = df[['גודל נייר', 'מדפסת', 'דופלקס', 'עותקים', 'צבע', 'עמודים', 'סטטוס', 'סוג', 'מחלקה', 'סוג משתמש', 'משתמש', 'שם מלא', 'תאריך']]
 
     return df
-
-
-def export_to_excel(df: pd.DataFrame, sheet_name: str) -> bytes:
-    """ייצוא DataFrame ל-Excel"""
-
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False, engine='openpyxl')
-
-        # עיצוב הגליון
-        workbook = writer.book
-        worksheet = writer.sheets[sheet_name]
-
-        # רוחב עמודות אוטומטי
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-
-    output.seek(0)
-    return output.getvalue()
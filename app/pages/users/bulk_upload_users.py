@@ -11,12 +11,13 @@ import pandas as pd
 import sys
 import os
 import re
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
 # הוספת תיקיית app ל-path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from shared import get_api_instance, get_logger_instance, check_authentication, CONFIG
+from utils.instrumentation import timed
 
 
 @st.dialog("📊 תוצאות העלאה", width="large")
@@ -56,7 +57,9 @@ def show_upload_results_dialog(stats):
         st.rerun()
 
 
-def validate_excel_data(df: pd.DataFrame, api) -> Tuple[pd.DataFrame, List[str]]:
+@timed()
+def validate_excel_data(df: pd.DataFrame, api,
+                        known: Optional[Dict[Tuple[str, str], Tuple[bool, str]]] = None) -> Tuple[pd.DataFrame, List[str]]:
     """
     בדיקת תקינות הנתונים מה-CSV
     פורמט: username, full_name, email, password, shortid, department
@@ -64,11 +67,14 @@ def validate_excel_data(df: pd.DataFrame, api) -> Tuple[pd.DataFrame, List[str]]
     Args:
         df: DataFrame עם הנתונים מה-CSV
         api: SafeQAPI instance
+        known: תוצאות בדיקות קיום שכבר בוצעו (למשל במקביל ב-CLI) -
+               {('username'|'pin', ערך): (קיים, פרטים)}; מה שחסר נבדק מול השרת
 
     Returns:
         Tuple של (DataFrame מעודכן עם סטטוס, רשימת שגיאות כלליות)
     """
     errors = []
+    known = known or {}
 
     # בדיקת עמודות נדרשות - בסדר מדויק
     required_columns = ['username', 'full_name']
@@ -133,7 +139,7 @@ def validate_excel_data(df: pd.DataFrame, api) -> Tuple[pd.DataFrame, List[str]]
                 row_errors.append("שם משתמש כפול בקובץ")
             else:
                 # רק אם לא כפול בקובץ, בדוק במערכת
-                username_exists, provider_name = api.check_username_exists(username)
+                username_exists, provider_name = known.get(('username', username)) or api.check_username_exists(username)
                 if username_exists:
                     row_errors.append(f"שם משתמש קיים במערכת ({provider_name})")
 
@@ -155,7 +161,7 @@ def validate_excel_data(df: pd.DataFrame, api) -> Tuple[pd.DataFrame, List[str]]
                 row_errors.append("PIN כפול בקובץ")
             else:
                 # רק אם לא כפול בקובץ, בדוק במערכת
-                pin_exists, existing_user = api.check_pin_exists(shortid)
+                pin_exists, existing_user = known.get(('pin', shortid)) or api.check_pin_exists(shortid)
                 if pin_exists:
                     row_errors.append(f"PIN כפול במערכת (קיים אצל {existing_user})")
 
@@ -170,6 +176,41 @@ def validate_excel_data(df: pd.DataFrame, api) -> Tuple[pd.DataFrame, List[str]]
     return df, errors
 
 
+USER_CSV_COLUMNS = ['username', 'full_name', 'email', 'password', 'shortid', 'department']
+DEFAULT_PASSWORD = 'Aa123456'
+
+
+def read_users_csv(source) -> pd.DataFrame:
+    """
+    קריאת קובץ המשתמשים (CSV ללא שורת כותרות, בסדר USER_CSV_COLUMNS)
+
+    כל העמודות נקראות כטקסט כדי לשמור 0 מובילים (ת.ז, PIN וכו')
+    """
+    return pd.read_csv(
+        source,
+        encoding='utf-8',
+        header=None,  # אין כותרות בקובץ
+        names=USER_CSV_COLUMNS,
+        dtype=str,  # קרא הכל כטקסט - חשוב לשמירת 0 מובילים!
+        keep_default_na=False  # אל תמיר ערכים ריקים ל-NaN
+    )
+
+
+def row_to_user_details(row) -> Tuple[str, Dict]:
+    """שורה תקינה מהקובץ -> (username, פרטי יצירה ל-create_user)"""
+    # הנתונים כבר string בגלל dtype=str, פשוט strip
+    username = str(row.get('username', '')).strip()
+    details = {
+        'fullname': str(row.get('full_name', '')).strip(),
+        'email': str(row.get('email', '')).strip(),
+        # ברירת מחדל לסיסמה אם ריקה
+        'password': str(row.get('password', '')).strip() or DEFAULT_PASSWORD,
+        'shortid': str(row.get('shortid', '')).strip(),
+        'department': str(row.get('department', '')).strip()
+    }
+    return username, details
+
+
 def upload_users_from_dataframe(df: pd.DataFrame, api, logger, current_username: str) -> Dict:
     """
     העלאת משתמשים מ-DataFrame
@@ -358,14 +399,7 @@ def show():
             # קריאת הקובץ CSV ללא כותרות (כמו בסקריפט המקורי)
             # העמודות בסדר: username, full_name, email, password, shortid, department
             # חשוב: קריאת כל העמודות כטקסט כדי לשמור 0 מובילים (ת.ז, PIN וכו')
-            df = pd.read_csv(
-                uploaded_file,
-                encoding='utf-8',
-                header=None,  # אין כותרות בקובץ
-                names=['username', 'full_name', 'email', 'password', 'shortid', 'department'],
-                dtype=str,  # קרא הכל כטקסט - חשוב לשמירת 0 מובילים!
-                keep_default_na=False  # אל תמיר ערכים ריקים ל-NaN
-            )
+            df = read_users_csv(uploaded_file)
 
             st.success(f"✅ הקובץ נטען בהצלחה! ({len(df)} שורות נתונים)")
             st.info(f"📊 הקובץ מכיל {len(df)} משתמשים (ללא שורת כותרות)")
@@ -473,25 +507,7 @@ def show():
                 valid_df = validated_df[validated_df['status'] == '✅ תקין']
 
                 for idx, row in valid_df.iterrows():
-                    # הנתונים כבר string בגלל dtype=str, פשוט strip
-                    username = str(row.get('username', '')).strip()
-                    full_name = str(row.get('full_name', '')).strip()
-                    email = str(row.get('email', '')).strip()
-                    password = str(row.get('password', '')).strip()
-                    shortid = str(row.get('shortid', '')).strip()
-                    department = str(row.get('department', '')).strip()
-
-                    # ברירת מחדל לסיסמה אם ריקה
-                    if not password:
-                        password = 'Aa123456'
-
-                    details = {
-                        'fullname': full_name,
-                        'email': email,
-                        'password': password,
-                        'shortid': shortid,
-                        'department': department
-                    }
+                    username, details = row_to_user_details(row)
 
                     try:
                         success = api.create_user(username, provider_id, details)
@@ -11,13 +11,14 @@ import pandas as pd
 import sys
 import os
 import re
-import io
+from typing import Dict, List
 
 # הוספת תיקיית app ל-path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from shared import get_api_instance, get_logger_instance, check_authentication, CONFIG
+from shared import get_api_instance, get_logger_instance, check_authentication, CONFIG, excel_download_button
 from permissions import filter_users_by_departments, filter_groups_by_departments
+from utils.instrumentation import timed
 
 @st.dialog("אישור הסרה מקבוצה", width="small")
 def confirm_remove_from_group_dialog(username, group_name, api, logger):
@@ -112,35 +113,6 @@ def user_updated_success_dialog(username, updates_count):
             del st.session_state.search_results
         st.rerun()
 
-def export_to_excel(df: pd.DataFrame, sheet_name: str) -> bytes:
-    """ייצוא DataFrame ל-Excel עם עיצוב"""
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False, engine='openpyxl')
-
-        # עיצוב הגליון
-        workbook = writer.book
-        worksheet = writer.sheets[sheet_name]
-
-        # רוחב עמודות אוטומטי
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-
-    output.seek(0)
-    return output.getvalue()
-
 def get_department_options(allowed_departments, local_groups):
     """מחזיר רשימת אפשרויות מחלקות לפי הרשאות"""
     # חילוץ כל המחלקות מקבוצות מקומיות
@@ -162,6 +134,88 @@ def get_department_options(allowed_departments, local_groups):
 
     return sorted(departments)
 
+def build_search_regex(search_term: str, partial_search: bool):
+    """
+    המרת תבנית wildcard (*) ל-regex
+
+    Returns:
+        re.Pattern או None אם אין * בתבנית
+
+    Raises:
+        re.error: תבנית לא תקינה
+    """
+    if '*' not in search_term:
+        return None
+    # Escape special regex chars except *
+    regex_pattern = re.escape(search_term.lower()).replace(r'\*', '.*')
+    # Add anchors for non-partial search
+    if not partial_search:
+        regex_pattern = '^' + regex_pattern + '$'
+    return re.compile(regex_pattern)
+
+
+def _search_field(user: Dict, search_type: str) -> str:
+    """הערך של המשתמש שעליו מתבצע החיפוש (lowercase)"""
+    if search_type == "Username":
+        return user.get('userName', user.get('username', '')).lower()
+    if search_type == "Full Name":
+        return user.get('fullName', '').lower()
+    if search_type == "Department":
+        user_field = user.get('department', '').lower()
+        if not user_field:
+            for detail in user.get('details', []):
+                if isinstance(detail, dict) and detail.get('detailType') == 11:
+                    return detail.get('detailData', '').lower()
+        return user_field
+    if search_type == "Email":
+        user_field = user.get('email', '').lower()
+        for detail in user.get('details', []):
+            if isinstance(detail, dict) and detail.get('detailType') == 1:
+                return detail.get('detailData', '').lower()
+        return user_field
+    return ""
+
+
+@timed()
+def match_users(users: List[Dict], search_type: str, search_term: str, partial_search: bool,
+                max_results: int, search_regex=None) -> List[Dict]:
+    """
+    חיפוש מתקדם: משתמשים שהשדה הנבחר שלהם תואם לערך החיפוש (ללא UI)
+
+    Args:
+        search_type: Username / Full Name / Department / Email
+        partial_search: התאמה חלקית (מכיל) במקום התאמה מלאה
+        max_results: עצירה אחרי מספר תוצאות
+        search_regex: תבנית מ-build_search_regex (None = ללא wildcard)
+    """
+    search_lower = search_term.lower()
+    matching_users = []
+
+    for user in users:
+        if not isinstance(user, dict):
+            continue
+
+        user_field = _search_field(user, search_type)
+
+        # Perform matching based on search mode
+        if search_regex is not None:
+            # Wildcard search using regex
+            match_found = bool(search_regex.search(user_field)) if user_field else False
+        elif partial_search:
+            # Partial match (contains)
+            match_found = search_lower in user_field if user_field else False
+        else:
+            # Exact match
+            match_found = search_lower == user_field
+
+        if match_found:
+            matching_users.append(user)
+            if len(matching_users) >= max_results:
+                break
+
+    return matching_users
+
+
 def show():
     """הצגת דף חיפוש ועריכת משתמשים"""
     check_authentication()
@@ -413,66 +467,15 @@ def show():
 
             with st.spinner("מחפש..."):
                 all_users = api.get_users(provider_id, 500)
-                matching_users = []
-                search_lower = search_term.lower()
-
-                # Check if wildcard is used
-                use_wildcard = '*' in search_term
-                if use_wildcard:
-                    # Convert wildcard pattern to regex
-                    # Escape special regex chars except *
-                    regex_pattern = re.escape(search_lower).replace(r'\*', '.*')
-                    # Add anchors for non-partial search
-                    if not partial_search:
-                        regex_pattern = '^' + regex_pattern + '$'
-                    try:
-                        search_regex = re.compile(regex_pattern)
-                    except re.error:
-                        st.error("תבנית חיפוש לא תקינה")
-                        search_regex = None
-                else:
-                    search_regex = None
 
-                for user in all_users:
-                    if not isinstance(user, dict):
-                        continue
-
-                    match_found = False
-                    user_field = ""
-
-                    if search_type == "Username":
-                        user_field = user.get('userName', user.get('username', '')).lower()
-                    elif search_type == "Full Name":
-                        user_field = user.get('fullName', '').lower()
-                    elif search_type == "Department":
-                        user_field = user.get('department', '').lower()
-                        if not user_field:
-                            for detail in user.get('details', []):
-                                if isinstance(detail, dict) and detail.get('detailType') == 11:
-                                    user_field = detail.get('detailData', '').lower()
-                                    break
-                    elif search_type == "Email":
-                        user_field = user.get('email', user.get('email', '')).lower()
-                        for detail in user.get('details', []):
-                            if isinstance(detail, dict) and detail.get('detailType') == 1:
-                                user_field = detail.get('detailData', '').lower()
-                                break
-
-                    # Perform matching based on search mode
-                    if use_wildcard and search_regex:
-                        # Wildcard search using regex
-                        match_found = bool(search_regex.search(user_field)) if user_field else False
-                    elif partial_search:
-                        # Partial match (contains)
-                        match_found = search_lower in user_field if user_field else False
-                    else:
-                        # Exact match
-                        match_found = search_lower == user_field
+                try:
+                    search_regex = build_search_regex(search_term, partial_search)
+                except re.error:
+                    st.error("תבנית חיפוש לא תקינה")
+                    search_regex = None
 
-                    if match_found:
-                        matching_users.append(user)
-                        if len(matching_users) >= max_results:
-                            break
+                matching_users = match_users(all_users, search_type, search_term, partial_search,
+                                             max_results, search_regex)
 
                 # סינון לפי מחלקות מורשות
                 allowed_departments = st.session_state.get('allowed_departments', [])
@@ -569,16 +572,8 @@ def show():
             # כפתורי פעולה - הורד Excel ונקה
             col_excel, col_clear = st.columns(2)
             with col_excel:
-                excel_data = export_to_excel(df, "search_results")
                 st.markdown('<div class="small-button">', unsafe_allow_html=True)
-                st.download_button(
-                    "📥 ייצא ל-Excel",
-                    excel_data,
-                    f"search_results_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    key="download_search_results",
-                    use_container_width=True
-                )
+                excel_download_button(df, "search_results", "search_results", key="download_search_results")
                 st.markdown('</div>', unsafe_allow_html=True)
 
             with col_clear:
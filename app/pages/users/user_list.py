@@ -9,43 +9,13 @@ import streamlit as st
 import pandas as pd
 import sys
 import os
-import io
 
 # הוספת תיקיית app ל-path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from shared import get_api_instance, get_logger_instance, check_authentication, CONFIG
+from shared import get_api_instance, get_logger_instance, check_authentication, CONFIG, excel_download_button
 from permissions import filter_users_by_departments
 
-def export_to_excel(df: pd.DataFrame, sheet_name: str) -> bytes:
-    """ייצוא DataFrame ל-Excel עם עיצוב"""
-    output = io.BytesIO()
-
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name=sheet_name, index=False, engine='openpyxl')
-
-        # עיצוב הגליון
-        workbook = writer.book
-        worksheet = writer.sheets[sheet_name]
-
-        # רוחב עמודות אוטומטי
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
-
-    output.seek(0)
-    return output.getvalue()
-
 def show():
     """הצגת דף רשימת משתמשים"""
     check_authentication()
@@ -211,16 +181,8 @@ def show():
         # כפתורים - הורד Excel ונקה בשורה אחת
         col_excel, col_clear = st.columns(2)
         with col_excel:
-            excel_data = export_to_excel(df, "users")
             st.markdown('<div class="small-button">', unsafe_allow_html=True)
-            st.download_button(
-                "📥 ייצא ל-Excel",
-                excel_data,
-                f"users_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                key="download_user_list",
-                use_container_width=True
-            )
+            excel_download_button(df, "users", "users", key="download_user_list")
             st.markdown('</div>', unsafe_allow_html=True)
 
         with col_clear:
@@ -3,10 +3,34 @@ SafeQ Manager - Hybrid Authentication & Permissions
 מיפוי בין משתמשי Entra ID למשתמשים לוקאליים ב-SafeQ
 """
 
+import copy
 import re
+import threading
 from typing import Dict, List, Optional
 import streamlit as st
 
+from utils.parallel import run_parallel
+from utils.metrics import register_cache
+from utils.ttl_cache import TTLCache
+
+# מטמון פרופילי הרשאות (role, קבוצות לוקאליות, מחלקות) - משותף לכל ה-sessions
+_permission_cache = None
+_permission_cache_lock = threading.Lock()
+
+
+def get_permission_cache(config: dict) -> TTLCache:
+    """קבלת מטמון ההרשאות (TTL לפי PERMISSION_CACHE_TTL)"""
+    global _permission_cache
+    if _permission_cache is None:
+        with _permission_cache_lock:
+            if _permission_cache is None:
+                _permission_cache = TTLCache(
+                    max_entries=config.get('PERMISSION_CACHE_MAX_ENTRIES', 1000),
+                    default_ttl=config.get('PERMISSION_CACHE_TTL', 300)
+                )
+                register_cache('permissions', _permission_cache)
+    return _permission_cache
+
 
 def get_entra_username(user_info: dict) -> str:
     """
@@ -122,9 +146,11 @@ def initialize_user_permissions(api, user_info: dict, entra_groups: list, config
     תהליך:
     1. חילוץ username מ-Entra
     2. קביעת role מקבוצות Entra
-    3. חיפוש local user ב-SafeQ
-    4. טעינת קבוצות לוקאליות
-    5. חילוץ departments מהקבוצות
+    3. חיפוש local user ב-SafeQ + טעינת קבוצות לוקאליות (במקביל)
+    4. חילוץ departments מהקבוצות
+
+    פרופיל שהצליח נשמר במטמון לפי username + קבוצות Entra (PERMISSION_CACHE_TTL),
+    כך ששינוי קבוצות ב-Entra משפיע מיד ושינוי קבוצות לוקאליות תוך זמן ה-TTL.
 
     Args:
         api: SafeQAPI instance
@@ -172,9 +198,21 @@ def initialize_user_permissions(api, user_info: dict, entra_groups: list, config
 
         result['role'] = role
 
+        cache = get_permission_cache(config)
+        cache_key = ('entra', entra_username.lower(), role,
+                     tuple(sorted(g.get('id', '') for g in entra_groups)))
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return copy.deepcopy(cached)
+
         # 3. חיפוש local user ב-SafeQ (Provider ID 12348)
+        # הקבוצות נשלפות במקביל לפי שם המשתמש מ-Entra (בדרך כלל זהה לשם הלוקאלי)
         local_provider_id = config['PROVIDERS']['LOCAL']
-        local_user = fetch_local_user(api, entra_username, local_provider_id)
+        lookups = run_parallel({
+            'user': lambda: fetch_local_user(api, entra_username, local_provider_id),
+            'groups': lambda: fetch_local_user_groups(api, entra_username)
+        })
+        local_user = lookups['user']
 
         if not local_user:
             result['error_message'] = (
@@ -185,11 +223,13 @@ def initialize_user_permissions(api, user_info: dict, entra_groups: list, config
 
         result['local_username'] = local_user.get('userName') or local_user.get('username')
 
-        # 4. טעינת קבוצות לוקאליות
-        local_groups = fetch_local_user_groups(api, result['local_username'])
+        local_groups = lookups['groups']
+        if result['local_username'] != entra_username:
+            # השם הלוקאלי שונה - השליפה המקבילה לא רלוונטית
+            local_groups = fetch_local_user_groups(api, result['local_username'])
         result['local_groups'] = local_groups
 
-        # 5. חילוץ departments
+        # 4. חילוץ departments
         if role == 'superadmin':
             # SuperAdmin מקבל גישה לכל המחלקות
             result['allowed_departments'] = ["ALL"]
@@ -208,6 +248,7 @@ def initialize_user_permissions(api, user_info: dict, entra_groups: list, config
             result['allowed_departments'] = departments
 
         result['success'] = True
+        cache.set(cache_key, copy.deepcopy(result))
         return result
 
     except Exception as e:
@@ -325,6 +366,9 @@ def authenticate_local_cloud_user(api, username: str, card_id: str, config: dict
     5. מפה קבוצות → departments
     6. החזר role + allowed_departments
 
+    שליפת המשתמש והקבוצות רצה במקביל. הקבוצות נשמרות במטמון לזמן קצר,
+    אבל מזהה הכרטיס נבדק תמיד מול נתונים עדכניים מהענן.
+
     Args:
         api: SafeQAPI instance
         username: שם משתמש מקומי
@@ -352,8 +396,17 @@ def authenticate_local_cloud_user(api, username: str, card_id: str, config: dict
         # קבלת provider_id עבור משתמשים מקומיים
         local_provider_id = config.get('PROVIDERS', {}).get('LOCAL', 12348)
 
-        # 1. בדוק אם המשתמש קיים בענן
-        cloud_user = api.get_single_user(username, provider_id=local_provider_id)
+        # 1. בדוק אם המשתמש קיים בענן (+ שליפת קבוצות במקביל אם אינן במטמון)
+        cache = get_permission_cache(config)
+        groups_key = ('local_cloud_groups', username.lower())
+        cached_groups = cache.get(groups_key)
+
+        tasks = {'user': lambda: api.get_single_user(username, provider_id=local_provider_id)}
+        if cached_groups is None:
+            tasks['groups'] = lambda: api.get_user_groups(username)
+        lookups = run_parallel(tasks)
+
+        cloud_user = lookups['user']
 
         if not cloud_user:
             result['error_message'] = (
@@ -381,8 +434,8 @@ def authenticate_local_cloud_user(api, username: str, card_id: str, config: dict
             )
             return result
 
-        # 3. שלוף קבוצות
-        user_groups = api.get_user_groups(username)
+        # 3. קבוצות (מהמטמון או מהשליפה המקבילה)
+        user_groups = copy.deepcopy(cached_groups) if cached_groups is not None else lookups['groups']
 
         if not user_groups:
             result['error_message'] = (
@@ -417,6 +470,8 @@ def authenticate_local_cloud_user(api, username: str, card_id: str, config: dict
             return result
 
         # 6. הצלחה!
+        if cached_groups is None:
+            cache.set(groups_key, copy.deepcopy(user_groups))
         result['success'] = True
         result['role'] = 'school_manager'
         result['allowed_departments'] = departments
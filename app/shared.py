@@ -6,14 +6,16 @@ Shared utilities and classes for SafeQ Cloud Manager
 """
 
 import streamlit as st
-import requests
-import pandas as pd
 import urllib3
 import json
 from typing import Dict, List, Optional
-import sqlite3
+import threading
+import weakref
 from datetime import datetime
 from config import config
+from utils.audit_writer import get_audit_writer
+from utils.audit_schema import ensure_audit_schema
+from utils.instrumentation import create_http_session, instrument_methods
 
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -28,63 +30,21 @@ class AuditLogger:
         self.log_file = CONFIG.get('AUDIT_LOG_PATH', 'safeq_audit.log')
         self.db_path = CONFIG.get('DATABASE_PATH', 'safeq_audit.db')
 
-        if self.log_to_db:
-            self._init_database()
-
-    def _init_database(self):
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS audit_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    username TEXT NOT NULL,
-                    user_email TEXT,
-                    user_groups TEXT,
-                    action TEXT NOT NULL,
-                    details TEXT,
-                    session_id TEXT,
-                    success BOOLEAN DEFAULT 1,
-                    access_level TEXT
-                )
-            ''')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON audit_logs(timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_username ON audit_logs(username)')
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            st.error(f"כשל באתחול מסד הנתונים: {str(e)}")
+        # מיגרציות המסד מוחלות פעם אחת לכל תהליך (ראה utils/audit_schema.py)
+        if self.log_to_db and not ensure_audit_schema(self.db_path):
+            st.error("כשל באתחול מסד הנתונים")
 
     def log_action(self, username, action, details="", user_email="", user_groups="", success=True, access_level="user"):
         timestamp = datetime.now().isoformat()
         session_id = st.session_state.get('session_id', '')
 
-        # File logging
-        if self.log_to_file:
-            try:
-                log_entry = f"{timestamp} | {username} | {user_email} | {action}"
-                if details: log_entry += f" | {details}"
-                if user_groups: log_entry += f" | Groups: {user_groups}"
-                if not success: log_entry += " | FAILED"
-
-                with open(self.log_file, "a", encoding="utf-8") as f:
-                    f.write(log_entry + "\n")
-            except: pass
-
-        # Database logging
-        if self.log_to_db:
-            try:
-                conn = sqlite3.connect(self.db_path)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO audit_logs
-                    (timestamp, username, user_email, user_groups, action, details, session_id, success, access_level)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (timestamp, username, user_email, user_groups, action, details, session_id, success, access_level))
-                conn.commit()
-                conn.close()
-            except: pass
+        # File + Database logging - נכתבים ברקע ב-batch (ראה utils/audit_writer.py)
+        if self.log_to_file or self.log_to_db:
+            get_audit_writer().submit({
+                'timestamp': timestamp, 'username': username, 'user_email': user_email,
+                'user_groups': user_groups, 'action': action, 'details': details,
+                'session_id': session_id, 'success': success, 'access_level': access_level
+            })
 
         # Session logging
         if 'audit_log' not in st.session_state:
@@ -96,6 +56,7 @@ class AuditLogger:
         if len(st.session_state.audit_log) > 50:
             st.session_state.audit_log = st.session_state.audit_log[-50:]
 
+@instrument_methods('api')
 class SafeQAPI:
     """מחלקה לתקשורת עם SafeQ Cloud API"""
     def __init__(self):
@@ -105,11 +66,12 @@ class SafeQAPI:
             'X-Api-Key': self.api_key,
             'Content-Type': 'application/x-www-form-urlencoded'
         }
+        self.session = create_http_session()
 
     def test_connection(self):
         try:
             url = f"{self.server_url}/api/v1/groups"
-            response = requests.get(url, headers=self.headers, verify=False, timeout=10)
+            response = self.session.get(url, headers=self.headers, verify=False, timeout=10)
             return response.status_code == 200
         except:
             return False
@@ -119,7 +81,7 @@ class SafeQAPI:
         try:
             url = f"{self.server_url}/api/v1/users/all"
             params = {'providerid': provider_id, 'maxrecords': max_records}
-            response = requests.get(url, headers=self.headers, params=params, verify=False, timeout=30)
+            response = self.session.get(url, headers=self.headers, params=params, verify=False, timeout=30)
 
             if response.status_code == 200:
                 try:
@@ -151,7 +113,7 @@ class SafeQAPI:
             if provider_id:
                 params['providerid'] = provider_id
 
-            response = requests.get(url, headers=self.headers, params=params, verify=False, timeout=10)
+            response = self.session.get(url, headers=self.headers, params=params, verify=False, timeout=10)
             if response.status_code == 200:
                 data = response.json()
 
@@ -170,7 +132,7 @@ class SafeQAPI:
         try:
             url = f"{self.server_url}/api/v1/groups"
             params = {'providerId': provider_id, 'maxRecords': max_records}
-            response = requests.get(url, headers=self.headers, params=params, verify=False, timeout=30)
+            response = self.session.get(url, headers=self.headers, params=params, verify=False, timeout=30)
 
             if response.status_code == 200:
                 try:
@@ -196,7 +158,7 @@ class SafeQAPI:
             if provider_id:
                 params['providerid'] = provider_id
 
-            response = requests.get(url, headers=self.headers, params=params, verify=False, timeout=10)
+            response = self.session.get(url, headers=self.headers, params=params, verify=False, timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 if isinstance(data, dict) and 'items' in data and data['items']:
@@ -227,7 +189,7 @@ class SafeQAPI:
             import urllib.parse
             encoded_data = urllib.parse.urlencode(data)
 
-            response = requests.post(url, headers=self.headers, data=encoded_data, verify=False, timeout=10)
+            response = self.session.post(url, headers=self.headers, data=encoded_data, verify=False, timeout=10)
 
             if response.status_code == 200:
                 return True
@@ -250,7 +212,7 @@ class SafeQAPI:
             url = f"{self.server_url}/api/v1/users/{username}"
             params = {'providerid': provider_id}
 
-            response = requests.delete(url, headers=self.headers, params=params, verify=False, timeout=10)
+            response = self.session.delete(url, headers=self.headers, params=params, verify=False, timeout=10)
 
             if response.status_code == 200:
                 return True
@@ -282,7 +244,7 @@ class SafeQAPI:
 
             import urllib.parse
             data = urllib.parse.urlencode(form_data)
-            response = requests.put(url, headers=self.headers, data=data, verify=False, timeout=10)
+            response = self.session.put(url, headers=self.headers, data=data, verify=False, timeout=10)
             return response.status_code == 200
         except Exception as e:
             st.error(f"שגיאה ביצירת משתמש: {str(e)}")
@@ -355,7 +317,7 @@ class SafeQAPI:
         """קבלת קבוצות של משתמש"""
         try:
             url = f"{self.server_url}/api/v1/users/{username}/groups"
-            response = requests.get(url, headers=self.headers, verify=False, timeout=10)
+            response = self.session.get(url, headers=self.headers, verify=False, timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 # אם התגובה היא dictionary עם 'items', קח את הפריטים
@@ -370,15 +332,25 @@ class SafeQAPI:
             st.error(f"שגיאה בקבלת קבוצות משתמש: {str(e)}")
             return []
 
-    def get_group_members(self, group_id):
-        """קבלת רשימת חברי קבוצה"""
+    def get_group_members(self, group_id, strict: bool = False):
+        """
+        קבלת רשימת חברי קבוצה
+
+        strict: כשל מחזיר None במקום רשימה ריקה (להבדיל מקבוצה ריקה)
+        """
         try:
             url = f"{self.server_url}/api/v1/groups/{group_id}/members"
-            response = requests.get(url, headers=self.headers, verify=False, timeout=10)
+            response = self.session.get(url, headers=self.headers, verify=False, timeout=10)
             if response.status_code == 200:
                 return response.json()
+            if strict:
+                print(f"[ERROR] Group members request for {group_id} failed: HTTP {response.status_code}")
+                return None
             return []
         except Exception as e:
+            if strict:
+                print(f"[ERROR] Group members request for {group_id} failed: {str(e)}")
+                return None
             st.error(f"שגיאת חברי קבוצה: {str(e)}")
             return []
 
@@ -394,7 +366,7 @@ class SafeQAPI:
             import urllib.parse
             encoded_data = urllib.parse.urlencode(data)
 
-            response = requests.put(url, headers=self.headers, data=encoded_data, verify=False, timeout=10)
+            response = self.session.put(url, headers=self.headers, data=encoded_data, verify=False, timeout=10)
 
             if response.status_code == 200:
                 return True
@@ -420,7 +392,7 @@ class SafeQAPI:
             # שליחת group_id כ-parameter
             params = {'groupid': group_id}
 
-            response = requests.delete(url, headers=self.headers, params=params, verify=False, timeout=10)
+            response = self.session.delete(url, headers=self.headers, params=params, verify=False, timeout=10)
 
             if response.status_code == 200:
                 return True
@@ -483,7 +455,7 @@ class SafeQAPI:
             if status and isinstance(status, list):
                 params['status'] = ','.join(map(str, status))
 
-            response = requests.get(url, headers=self.headers, params=params,
+            response = self.session.get(url, headers=self.headers, params=params,
                                   verify=False, timeout=300)  # 5 min timeout
 
             if response.status_code == 200:
@@ -528,7 +500,7 @@ class SafeQAPI:
             elif status is None:
                 params['status'] = '0'  # default READY
 
-            response = requests.get(url, headers=self.headers, params=params,
+            response = self.session.get(url, headers=self.headers, params=params,
                                   verify=False, timeout=30)
 
             if response.status_code == 200:
@@ -598,7 +570,7 @@ class SafeQAPI:
             import urllib.parse
             encoded_data = urllib.parse.urlencode(data)
 
-            response = requests.post(url, headers=self.headers, data=encoded_data,
+            response = self.session.post(url, headers=self.headers, data=encoded_data,
                                    verify=False, timeout=10)
 
             if response.status_code == 200:
@@ -644,7 +616,7 @@ class SafeQAPI:
             full_url = url + ('?' + urllib.parse.urlencode(params) if params else '')
             print(f"[DEBUG] Requesting: {full_url}")
 
-            response = requests.get(url, headers=self.headers, params=params, verify=False, timeout=30)
+            response = self.session.get(url, headers=self.headers, params=params, verify=False, timeout=30)
 
             print(f"[DEBUG] Response status: {response.status_code}")
             if response.status_code != 200:
@@ -679,11 +651,17 @@ def get_api_instance():
         st.session_state.api = SafeQAPI()
     return st.session_state.api
 
+_logger = None
+_logger_lock = threading.Lock()
+
 def get_logger_instance():
-    """קבלת instance של AuditLogger"""
-    if 'logger' not in st.session_state:
-        st.session_state.logger = AuditLogger()
-    return st.session_state.logger
+    """קבלת ה-AuditLogger המשותף (אחד לכל תהליך, לא לכל session)"""
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                _logger = AuditLogger()
+    return _logger
 
 def check_authentication():
     """בדיקת אימות משתמש"""
@@ -691,3 +669,54 @@ def check_authentication():
         st.error("❌ נדרש אימות")
         st.stop()
     return True
+
+def excel_download_button(df, sheet_name: str, file_prefix: str, key: str,
+                          label: str = "📥 ייצא ל-Excel", use_container_width: bool = True):
+    """
+    ייצוא ל-Excel לפי דרישה
+
+    הקובץ לא נוצר בכל ריצה: בהתחלה מוצג כפתור הכנה, ורק אחרי לחיצה עליו
+    הקובץ נבנה (או נשלף ממטמון משותף לפי hash של תוכן הטבלה) ומוצג כפתור הורדה.
+    שינוי בנתונים (פילטר אחר) מחזיר את כפתור ההכנה.
+
+    ריצה בלי לחיצה לא בונה קובץ: ה-hash מחושב מחדש רק כשהטבלה היא אובייקט אחר,
+    ואם הקובץ כבר יצא מהמטמון המשותף - חוזר כפתור ההכנה.
+    """
+    from utils.excel_export import dataframe_fingerprint, get_cached_export, peek_cached_export
+
+    state_key = f"_export_{key}"
+    prepared = st.session_state.get(state_key)
+    data = None
+    if prepared is not None:
+        if prepared['source']() is not df:
+            if prepared['fingerprint'] != dataframe_fingerprint(df, sheet_name):
+                prepared = None
+            else:
+                prepared['source'] = weakref.ref(df)
+        if prepared is not None:
+            data = peek_cached_export(prepared['fingerprint'])
+            if data is None:
+                prepared = None
+        if prepared is None:
+            del st.session_state[state_key]
+
+    if prepared is None:
+        if not st.button(label, key=f"{key}_prepare", use_container_width=use_container_width):
+            return
+        prepared = {
+            'fingerprint': dataframe_fingerprint(df, sheet_name),
+            'source': weakref.ref(df),
+            'file_name': f"{file_prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        }
+        st.session_state[state_key] = prepared
+        with st.spinner("מכין קובץ Excel..."):
+            data = get_cached_export(df, sheet_name, prepared['fingerprint'])
+
+    st.download_button(
+        label="💾 הורד Excel",
+        data=data,
+        file_name=prepared['file_name'],
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        key=key,
+        use_container_width=use_container_width
+    )
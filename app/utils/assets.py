@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Static Assets Cache
+מטמון ברמת התהליך ללוגואים (base64) ולבלוקי CSS מכווצים
+
+Streamlit מריץ את הסקריפט מחדש בכל אינטראקציה, וכל אלמנט שלא נשלח שוב
+נעלם מהעמוד - לכן בלוקי העיצוב חייבים להישלח בכל ריצה. מה שנחסך:
+קריאה מהדיסק, קידוד base64 ובניית/כיווץ ה-CSS, והמטען שנשלח קטן וזהה בין ריצות.
+"""
+
+import base64
+import hashlib
+import os
+import re
+import sys
+import threading
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional
+
+
+class Asset(NamedTuple):
+    """קובץ סטטי מקודד"""
+    data_uri: str
+    content_hash: str
+
+
+_assets: Dict[str, tuple] = {}
+_assets_lock = threading.Lock()
+
+_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.svg': 'image/svg+xml',
+    '.gif': 'image/gif',
+}
+
+
+def resource_path(relative_path: str) -> str:
+    """מחזיר נתיב תקין לקובץ (כולל הרצה מ-PyInstaller)"""
+    if hasattr(sys, "_MEIPASS"):
+        return os.path.join(sys._MEIPASS, relative_path)
+    return os.path.join(os.path.abspath("."), relative_path)
+
+
+def load_asset(relative_path: str) -> Optional[Asset]:
+    """
+    טעינת קובץ כ-data URI - פעם אחת לכל גרסה של הקובץ
+
+    הקובץ נקרא מחדש רק אם גודלו או זמן השינוי שלו השתנו.
+
+    Returns:
+        Asset או None אם הקובץ לא קיים
+    """
+    path = resource_path(relative_path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _assets.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with _assets_lock:
+        cached = _assets.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+
+        mime = _MIME_TYPES.get(os.path.splitext(path)[1].lower(), 'application/octet-stream')
+        asset = Asset(
+            data_uri=f"data:{mime};base64,{base64.b64encode(content).decode()}",
+            content_hash=hashlib.sha1(content).hexdigest()[:12]
+        )
+        _assets[path] = (signature, asset)
+        return asset
+
+
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+_CSS_WHITESPACE = re.compile(r'\s+')
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+_STYLE_BLOCK = re.compile(r'<style>(.*?)</style>', re.DOTALL)
+
+
+def minify_css(css: str) -> str:
+    """כיווץ CSS: הסרת הערות ורווחים מיותרים (ללא שינוי סלקטורים)"""
+    css = _CSS_COMMENT.sub('', css)
+    css = _CSS_WHITESPACE.sub(' ', css)
+    css = _CSS_PUNCTUATION.sub(r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+@lru_cache(maxsize=64)
+def cached_style(markup: str) -> str:
+    """
+    כיווץ בלוקי <style> בתוך markup - התוצאה נשמרת לפי התוכן
+
+    כל בלוק מקבל מזהה לפי hash התוכן, כך שבלוק זהה תמיד זהה ב-bytes.
+    """
+    def _minify(match):
+        css = minify_css(match.group(1))
+        digest = hashlib.sha1(css.encode('utf-8')).hexdigest()[:12]
+        return f'<style id="css-{digest}">{css}</style>'
+
+    return _STYLE_BLOCK.sub(_minify, markup).strip()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Audit Analytics
+אגרגציות על מסד הביקורת - מחושבות בתוך SQLite (GROUP BY), ללא טעינת רשומות גולמיות
+
+טבלאות סיכום (אופציונלי):
+    audit_daily_summary  - יום × פעולה × משתמש: סה"כ וכשלונות
+    audit_hourly_summary - יום × שעה: סה"כ
+מתעדכנות באופן אינקרמנטלי לפי id האחרון שסוכם, ונשמרות גם אחרי שרשומות
+גולמיות עוברות לארכיון החודשי - כך שמגמות רב-שנתיות נשארות זמינות.
+"""
+
+import sqlite3
+from datetime import date, timedelta
+from typing import Dict, List
+
+_FAILED = "CASE WHEN success THEN 0 ELSE 1 END"
+
+
+def ensure_summary_tables(conn: sqlite3.Connection):
+    """יצירת טבלאות הסיכום (אם חסרות)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS audit_daily_summary (
+            day TEXT NOT NULL,
+            action TEXT NOT NULL,
+            username TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, action, username)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS audit_hourly_summary (
+            day TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, hour)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS audit_summary_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+    ''')
+
+
+def refresh_summaries(conn: sqlite3.Connection) -> int:
+    """
+    עדכון אינקרמנטלי של טבלאות הסיכום עם רשומות שנוספו מאז העדכון הקודם
+
+    Returns:
+        int: מספר הרשומות שסוכמו
+    """
+    ensure_summary_tables(conn)
+    if conn.in_transaction:
+        conn.commit()
+
+    # קריאת הטווח, העדכון ושמירת המצב בטרנזקציה כותבת אחת - רענון מקביל (דף
+    # האנליטיקה ותחזוקת ההיסטוריה) ממתין ורואה את last_id המעודכן, ולא סוכם פעמיים
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute("SELECT last_id FROM audit_summary_state WHERE name = 'daily'").fetchone()
+        last_id = row[0] if row else 0
+
+        max_id = conn.execute("SELECT MAX(id) FROM audit_logs").fetchone()[0]
+        if max_id is None or max_id <= last_id:
+            return 0
+
+        conn.execute(f'''
+            INSERT INTO audit_daily_summary (day, action, username, total, failures)
+            SELECT substr(timestamp, 1, 10), action, username, COUNT(*), SUM({_FAILED})
+            FROM audit_logs WHERE id > ? AND id <= ?
+            GROUP BY 1, 2, 3
+            ON CONFLICT (day, action, username) DO UPDATE SET
+                total = total + excluded.total,
+                failures = failures + excluded.failures
+        ''', (last_id, max_id))
+        conn.execute('''
+            INSERT INTO audit_hourly_summary (day, hour, total)
+            SELECT substr(timestamp, 1, 10), CAST(substr(timestamp, 12, 2) AS INTEGER), COUNT(*)
+            FROM audit_logs WHERE id > ? AND id <= ?
+            GROUP BY 1, 2
+            ON CONFLICT (day, hour) DO UPDATE SET total = total + excluded.total
+        ''', (last_id, max_id))
+        conn.execute('''
+            INSERT INTO audit_summary_state (name, last_id) VALUES ('daily', ?)
+            ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id
+        ''', (max_id,))
+
+    return max_id - last_id
+
+
+class AuditAnalytics:
+    """
+    שאילתות אגרגציה לדשבורד האנליטיקה
+
+    Args:
+        db_path: נתיב מסד הביקורת
+        use_summary: קריאה מטבלאות הסיכום (כולל היסטוריה שעברה לארכיון)
+            במקום GROUP BY על הטבלה הגולמית
+    """
+
+    def __init__(self, db_path: str, use_summary: bool = True):
+        self.db_path = db_path
+        self.use_summary = use_summary
+
+    def _query(self, sql: str, params) -> List[Dict]:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+
+    def refresh(self) -> int:
+        """עדכון טבלאות הסיכום (אם בשימוש)"""
+        if not self.use_summary:
+            return 0
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            return refresh_summaries(conn)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _day_range(date_from: date, date_to: date):
+        """טווח חצי-פתוח [date_from, date_to + יום)"""
+        return date_from.isoformat(), (date_to + timedelta(days=1)).isoformat()
+
+    def daily_activity(self, date_from: date, date_to: date) -> List[Dict]:
+        """פעולות וכשלונות לכל יום: [{'day', 'total', 'failures'}]"""
+        start, end = self._day_range(date_from, date_to)
+        if self.use_summary:
+            sql = '''
+                SELECT day, SUM(total) AS total, SUM(failures) AS failures
+                FROM audit_daily_summary WHERE day >= ? AND day < ?
+                GROUP BY day ORDER BY day
+            '''
+        else:
+            sql = f'''
+                SELECT substr(timestamp, 1, 10) AS day, COUNT(*) AS total, SUM({_FAILED}) AS failures
+                FROM audit_logs WHERE timestamp >= ? AND timestamp < ?
+                GROUP BY day ORDER BY day
+            '''
+        return self._query(sql, (start, end))
+
+    def top_users(self, date_from: date, date_to: date, limit: int = 10) -> List[Dict]:
+        """המשתמשים הפעילים ביותר: [{'username', 'total', 'failures'}]"""
+        start, end = self._day_range(date_from, date_to)
+        if self.use_summary:
+            sql = '''
+                SELECT username, SUM(total) AS total, SUM(failures) AS failures
+                FROM audit_daily_summary WHERE day >= ? AND day < ?
+                GROUP BY username ORDER BY total DESC LIMIT ?
+            '''
+        else:
+            sql = f'''
+                SELECT username, COUNT(*) AS total, SUM({_FAILED}) AS failures
+                FROM audit_logs WHERE timestamp >= ? AND timestamp < ?
+                GROUP BY username ORDER BY total DESC LIMIT ?
+            '''
+        return self._query(sql, (start, end, limit))
+
+    def action_breakdown(self, date_from: date, date_to: date) -> List[Dict]:
+        """פילוח לפי פעולה: [{'action', 'total', 'failures'}]"""
+        start, end = self._day_range(date_from, date_to)
+        if self.use_summary:
+            sql = '''
+                SELECT action, SUM(total) AS total, SUM(failures) AS failures
+                FROM audit_daily_summary WHERE day >= ? AND day < ?
+                GROUP BY action ORDER BY total DESC
+            '''
+        else:
+            sql = f'''
+                SELECT action, COUNT(*) AS total, SUM({_FAILED}) AS failures
+                FROM audit_logs WHERE timestamp >= ? AND timestamp < ?
+                GROUP BY action ORDER BY total DESC
+            '''
+        return self._query(sql, (start, end))
+
+    def hourly_distribution(self, date_from: date, date_to: date) -> List[Dict]:
+        """פעולות לפי שעה ביום (0-23): [{'hour', 'total'}]"""
+        start, end = self._day_range(date_from, date_to)
+        if self.use_summary:
+            sql = '''
+                SELECT hour, SUM(total) AS total
+                FROM audit_hourly_summary WHERE day >= ? AND day < ?
+                GROUP BY hour ORDER BY hour
+            '''
+        else:
+            sql = '''
+                SELECT CAST(substr(timestamp, 12, 2) AS INTEGER) AS hour, COUNT(*) AS total
+                FROM audit_logs WHERE timestamp >= ? AND timestamp < ?
+                GROUP BY hour ORDER BY hour
+            '''
+        return self._query(sql, (start, end))
+
+    def totals(self, date_from: date, date_to: date) -> Dict:
+        """סיכום כללי לטווח: {'total', 'failures', 'users'}"""
+        start, end = self._day_range(date_from, date_to)
+        if self.use_summary:
+            sql = '''
+                SELECT SUM(total) AS total, SUM(failures) AS failures, COUNT(DISTINCT username) AS users
+                FROM audit_daily_summary WHERE day >= ? AND day < ?
+            '''
+        else:
+            sql = f'''
+                SELECT COUNT(*) AS total, SUM({_FAILED}) AS failures, COUNT(DISTINCT username) AS users
+                FROM audit_logs WHERE timestamp >= ? AND timestamp < ?
+            '''
+        rows = self._query(sql, (start, end))
+        result = rows[0] if rows else {}
+        return {key: result.get(key) or 0 for key in ('total', 'failures', 'users')}
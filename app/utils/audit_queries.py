@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Audit Query Engine
+שאילתות על מסד הביקורת: אינדקסים מורכבים, חיפוש FTS5 בפרטים ועימוד keyset
+
+עימוד keyset: כל עמוד מתחיל מה-(timestamp, id) האחרון של העמוד הקודם,
+כך שזמן טעינת עמוד קבוע ולא תלוי במספר הרשומות הכולל (בניגוד ל-OFFSET).
+"""
+
+import csv
+import io
+import sqlite3
+import tempfile
+import threading
+from datetime import timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+COLUMNS = ['id', 'timestamp', 'username', 'user_email', 'user_groups',
+           'action', 'details', 'session_id', 'success', 'access_level']
+
+_schema_lock = threading.Lock()
+_schema_ready = {}
+
+
+def ensure_query_schema(conn: sqlite3.Connection) -> bool:
+    """
+    יצירת אינדקסים מורכבים ואינדקס FTS5 על details (אם נתמך)
+
+    Returns:
+        bool: האם FTS5 זמין
+    """
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_username_timestamp ON audit_logs(username, timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_action_timestamp ON audit_logs(action, timestamp)')
+
+    try:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'audit_logs_fts'"
+        ).fetchone()
+
+        if not exists:
+            conn.execute('''
+                CREATE VIRTUAL TABLE audit_logs_fts
+                USING fts5(details, content='audit_logs', content_rowid='id')
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS audit_logs_fts_insert AFTER INSERT ON audit_logs BEGIN
+                    INSERT INTO audit_logs_fts(rowid, details) VALUES (new.id, new.details);
+                END
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS audit_logs_fts_delete AFTER DELETE ON audit_logs BEGIN
+                    INSERT INTO audit_logs_fts(audit_logs_fts, rowid, details) VALUES ('delete', old.id, old.details);
+                END
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS audit_logs_fts_update AFTER UPDATE ON audit_logs BEGIN
+                    INSERT INTO audit_logs_fts(audit_logs_fts, rowid, details) VALUES ('delete', old.id, old.details);
+                    INSERT INTO audit_logs_fts(rowid, details) VALUES (new.id, new.details);
+                END
+            ''')
+            # אינדוקס רשומות קיימות
+            conn.execute("INSERT INTO audit_logs_fts(audit_logs_fts) VALUES ('rebuild')")
+        return True
+    except sqlite3.OperationalError:
+        # SQLite שנבנה ללא FTS5 - החיפוש ייפול חזרה ל-LIKE
+        return False
+
+
+def forget_schema(db_path: str):
+    """שחרור מצב האינדקסים של מסד זמני (לדוגמה קובץ ארכיון שנפרס ונמחק)"""
+    with _schema_lock:
+        _schema_ready.pop(db_path, None)
+
+
+def _fts_phrase(text: str) -> str:
+    """המרת טקסט חופשי לביטוי FTS5 (מונע פירוש אופרטורים)"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _prefix_upper_bound(prefix: str) -> str:
+    """גבול עליון לחיפוש prefix בטווח - מאפשר שימוש באינדקס במקום LIKE '%x%'"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class AuditQuery:
+    """
+    שכבת שאילתות על טבלת audit_logs
+
+    פילטרים נתמכים (dict):
+        username: התאמה מדויקת
+        username_prefix: שם משתמש שמתחיל ב-
+        action: פעולה מדויקת
+        success: True/False
+        date_from: date - מתאריך (כולל)
+        date_to: date - עד תאריך (כולל)
+        text: חיפוש טקסט חופשי בפרטים (FTS5)
+    """
+
+    def __init__(self, db_path: str, table: str = 'audit_logs'):
+        self.db_path = db_path
+        self.table = table
+        self.fts_available = self._prepare()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _prepare(self) -> bool:
+        """וידוא אינדקסים פעם אחת לכל מסד נתונים בתהליך"""
+        with _schema_lock:
+            if self.db_path not in _schema_ready:
+                conn = sqlite3.connect(self.db_path, timeout=30)
+                try:
+                    with conn:
+                        _schema_ready[self.db_path] = ensure_query_schema(conn)
+                finally:
+                    conn.close()
+            return _schema_ready[self.db_path]
+
+    def _where(self, filters: Dict) -> Tuple[List[str], List]:
+        conditions = []
+        params = []
+
+        if filters.get('username'):
+            conditions.append("username = ?")
+            params.append(filters['username'])
+        elif filters.get('username_prefix'):
+            prefix = filters['username_prefix']
+            conditions.append("username >= ? AND username < ?")
+            params.extend([prefix, _prefix_upper_bound(prefix)])
+
+        if filters.get('action'):
+            conditions.append("action = ?")
+            params.append(filters['action'])
+
+        if filters.get('success') is not None:
+            conditions.append("success = ?")
+            params.append(1 if filters['success'] else 0)
+
+        # טווח חצי-פתוח על חותמות ISO: [date_from, date_to + יום)
+        if filters.get('date_from'):
+            conditions.append("timestamp >= ?")
+            params.append(filters['date_from'].isoformat())
+
+        if filters.get('date_to'):
+            conditions.append("timestamp < ?")
+            params.append((filters['date_to'] + timedelta(days=1)).isoformat())
+
+        if filters.get('text'):
+            if self.fts_available and self.table == 'audit_logs':
+                conditions.append("id IN (SELECT rowid FROM audit_logs_fts WHERE audit_logs_fts MATCH ?)")
+                params.append(_fts_phrase(filters['text']))
+            else:
+                conditions.append("details LIKE ?")
+                params.append(f"%{filters['text']}%")
+
+        return conditions, params
+
+    def fetch_page(self, filters: Dict, cursor: Optional[Tuple[str, int]] = None,
+                   page_size: int = 100) -> Tuple[List[Dict], Optional[Tuple[str, int]]]:
+        """
+        טעינת עמוד אחד (מהחדש לישן)
+
+        Args:
+            filters: פילטרים
+            cursor: (timestamp, id) של הרשומה האחרונה בעמוד הקודם, או None לעמוד ראשון
+            page_size: מספר רשומות בעמוד
+
+        Returns:
+            tuple: (רשימת רשומות, cursor לעמוד הבא או None אם אין עוד)
+        """
+        conditions, params = self._where(filters)
+
+        if cursor is not None:
+            conditions.append("(timestamp, id) < (?, ?)")
+            params.extend(cursor)
+
+        where = " AND ".join(conditions) if conditions else "1=1"
+        query = (
+            f"SELECT {', '.join(COLUMNS)} FROM {self.table} WHERE {where} "
+            f"ORDER BY timestamp DESC, id DESC LIMIT ?"
+        )
+        # רשומה אחת נוספת כדי לדעת אם יש עמוד הבא
+        params.append(page_size + 1)
+
+        conn = self._connect()
+        try:
+            rows = [dict(row) for row in conn.execute(query, params).fetchall()]
+        finally:
+            conn.close()
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_cursor = (rows[-1]['timestamp'], rows[-1]['id'])
+
+        return rows, next_cursor
+
+    def distinct_actions(self, filters: Dict) -> List[str]:
+        """סוגי הפעולות הקיימים עבור הפילטרים (לבחירה בממשק)"""
+        conditions, params = self._where(filters)
+        where = " AND ".join(conditions) if conditions else "1=1"
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT DISTINCT action FROM {self.table} WHERE {where} ORDER BY action", params
+            ).fetchall()
+        finally:
+            conn.close()
+
+        return [row[0] for row in rows]
+
+    def iter_rows(self, filters: Dict, chunk_size: int = 1000) -> Iterator[Dict]:
+        """מעבר על כל הרשומות התואמות ב-chunks (זיכרון קבוע)"""
+        cursor = None
+        while True:
+            rows, cursor = self.fetch_page(filters, cursor, chunk_size)
+            yield from rows
+            if cursor is None:
+                return
+
+    def export_csv(self, filters: Dict, chunk_size: int = 5000):
+        """
+        ייצוא CSV בזרימה מאותה שאילתה
+
+        Returns:
+            קובץ זמני (בזיכרון עד 8MB, אחר כך בדיסק) מוכן לקריאה מההתחלה
+        """
+        output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode='w+b')
+        text = io.TextIOWrapper(output, encoding='utf-8-sig', newline='')
+        writer = csv.DictWriter(text, fieldnames=COLUMNS)
+        writer.writeheader()
+
+        for row in self.iter_rows(filters, chunk_size):
+            writer.writerow(row)
+
+        text.flush()
+        text.detach()
+        output.seek(0)
+        return output
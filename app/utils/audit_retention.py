@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Audit Retention
+שמירת היסטוריית ביקורת: חלוקה לקבצי חודש, דחיסת חודשים ישנים וסבב קובץ הלוג
+
+- הטבלה הראשית (hot) מחזיקה רק את החודשים האחרונים, כך ששאילתות נשארות מהירות
+- חודשים ישנים יותר עוברים לקובץ SQLite נפרד לכל חודש: <archive>/audit_YYYY_MM.db
+- קבצי חודש מעבר לגיל מוגדר נדחסים ל-.db.gz וניתנים לשאילתה אחרי פריסה זמנית
+- קובץ הלוג השטוח מוחלף כשהוא עובר גודל מקסימלי, והעותקים הישנים נדחסים
+"""
+
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import date, datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+from utils.audit_queries import AuditQuery, ensure_query_schema, forget_schema
+
+PARTITION_PREFIX = 'audit_'
+
+
+def _month_start(year: int, month: int) -> date:
+    """נרמול (שנה, חודש) עם גלישה - חודש 0 הוא דצמבר של השנה הקודמת"""
+    year += (month - 1) // 12
+    month = (month - 1) % 12 + 1
+    return date(year, month, 1)
+
+
+def months_back(today: date, months: int) -> date:
+    """תחילת החודש שנמצא months חודשים לפני החודש הנוכחי"""
+    return _month_start(today.year, today.month - months)
+
+
+def month_bounds(month: str):
+    """
+    גבולות חודש כמחרוזות ISO (טווח חצי-פתוח)
+
+    Args:
+        month: 'YYYY-MM'
+    """
+    year, mon = int(month[:4]), int(month[5:7])
+    return _month_start(year, mon).isoformat(), _month_start(year, mon + 1).isoformat()
+
+
+class AuditRetention:
+    """
+    תחזוקת היסטוריית הביקורת
+
+    Args:
+        db_path: מסד הביקורת הראשי
+        log_file: קובץ הלוג השטוח
+        archive_dir: תיקיית קבצי החודשים
+        hot_months: מספר חודשים (כולל הנוכחי) שנשארים בטבלה הראשית
+        compress_after_months: גיל (בחודשים) שממנו קובץ חודש נדחס
+        log_max_bytes: גודל מקסימלי לקובץ הלוג לפני סבב (0 = ללא סבב)
+        log_backups: מספר עותקי לוג דחוסים לשמירה
+        log_lock: נעילה שמשותפת עם מי שכותב לקובץ הלוג (החלפת הקובץ לא באמצע כתיבה)
+    """
+
+    def __init__(self, db_path: str, log_file: str, archive_dir: str, hot_months: int = 6,
+                 compress_after_months: int = 12, log_max_bytes: int = 10 * 1024 * 1024,
+                 log_backups: int = 10, log_lock: Optional[threading.Lock] = None):
+        self.db_path = db_path
+        self.log_file = log_file
+        self.archive_dir = archive_dir
+        self.hot_months = max(hot_months, 1)
+        self.compress_after_months = compress_after_months
+        self.log_max_bytes = log_max_bytes
+        self.log_backups = log_backups
+        self.log_lock = log_lock
+
+        # פונקציות שרצות לפני העברת חודש לארכיון (לדוגמה: עדכון טבלאות סיכום)
+        self._before_partition: List[Callable[[sqlite3.Connection], None]] = []
+
+    def add_before_partition_hook(self, hook: Callable[[sqlite3.Connection], None]):
+        """רישום פונקציה שמקבלת את חיבור המסד הראשי לפני העברת רשומות"""
+        self._before_partition.append(hook)
+
+    # ---------- Paths ----------
+
+    def partition_path(self, month: str, compressed: bool = False) -> str:
+        """נתיב קובץ חודש ('YYYY-MM')"""
+        name = f"{PARTITION_PREFIX}{month.replace('-', '_')}.db"
+        if compressed:
+            name += '.gz'
+        return os.path.join(self.archive_dir, name)
+
+    def list_partitions(self) -> List[Dict]:
+        """
+        רשימת קבצי החודשים בארכיון (מהחדש לישן)
+
+        Returns:
+            list: [{'month': 'YYYY-MM', 'path': ..., 'compressed': bool, 'size': int}]
+        """
+        if not os.path.isdir(self.archive_dir):
+            return []
+
+        partitions = []
+        for name in os.listdir(self.archive_dir):
+            if not name.startswith(PARTITION_PREFIX):
+                continue
+            compressed = name.endswith('.db.gz')
+            if not (compressed or name.endswith('.db')):
+                continue
+            stem = name[len(PARTITION_PREFIX):].split('.', 1)[0]
+            path = os.path.join(self.archive_dir, name)
+            partitions.append({
+                'month': stem.replace('_', '-'),
+                'path': path,
+                'compressed': compressed,
+                'size': os.path.getsize(path)
+            })
+
+        partitions.sort(key=lambda p: p['month'], reverse=True)
+        return partitions
+
+    # ---------- Maintenance ----------
+
+    def run(self, today: Optional[date] = None) -> Dict:
+        """
+        הרצת כל שלבי התחזוקה
+
+        Returns:
+            dict: סיכום (חודשים שהועברו, רשומות, קבצים שנדחסו, האם הלוג הוחלף)
+        """
+        today = today or datetime.now().date()
+        moved = self.partition_old_rows(today)
+        compressed = self.compress_old_partitions(today)
+        rotated = self.rotate_log()
+        return {
+            'partitioned_months': list(moved.keys()),
+            'partitioned_rows': sum(moved.values()),
+            'compressed': compressed,
+            'log_rotated': rotated
+        }
+
+    def partition_old_rows(self, today: Optional[date] = None) -> Dict[str, int]:
+        """
+        העברת רשומות ישנות מהטבלה הראשית לקבצי חודש
+
+        ההעברה אידמפוטנטית: הרשומות מועתקות עם ה-id המקורי (INSERT OR IGNORE)
+        ונמחקות מהטבלה הראשית רק אחרי שההעתקה הושלמה.
+
+        Returns:
+            dict: {'YYYY-MM': מספר רשומות שהועברו}
+        """
+        today = today or datetime.now().date()
+        cutoff = months_back(today, self.hot_months - 1).isoformat()
+
+        if not os.path.exists(self.db_path):
+            return {}
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        moved = {}
+        try:
+            months = [row[0] for row in conn.execute(
+                "SELECT DISTINCT substr(timestamp, 1, 7) FROM audit_logs WHERE timestamp < ? ORDER BY 1",
+                (cutoff,)
+            )]
+            if not months:
+                return {}
+
+            for hook in self._before_partition:
+                try:
+                    hook(conn)
+                except Exception as e:
+                    print(f"[ERROR] Audit retention hook failed: {str(e)}")
+
+            os.makedirs(self.archive_dir, exist_ok=True)
+            table_sql = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'audit_logs'"
+            ).fetchone()[0]
+
+            for month in months:
+                moved[month] = self._move_month(conn, month, table_sql)
+                print(f"[DEBUG] Audit retention: moved {moved[month]} rows of {month} to archive")
+        finally:
+            conn.close()
+
+        return moved
+
+    def _move_month(self, conn: sqlite3.Connection, month: str, table_sql: str) -> int:
+        """העברת חודש אחד לקובץ שלו"""
+        start, end = month_bounds(month)
+        path = self.partition_path(month)
+        gz_path = self.partition_path(month, compressed=True)
+
+        # רשומות מאוחרות לחודש שכבר נדחס - פורסים, מוסיפים ודוחסים מחדש
+        recompress = os.path.exists(gz_path)
+        if recompress and not os.path.exists(path):
+            self._decompress(gz_path, path)
+
+        self._init_partition(path, table_sql)
+
+        conn.execute("ATTACH DATABASE ? AS part", (path,))
+        try:
+            part_columns = [row[1] for row in conn.execute("PRAGMA part.table_info(audit_logs)")]
+            main_columns = {row[1] for row in conn.execute("PRAGMA main.table_info(audit_logs)")}
+            columns = ', '.join(c for c in part_columns if c in main_columns)
+
+            with conn:
+                cursor = conn.execute(
+                    f"INSERT OR IGNORE INTO part.audit_logs ({columns}) "
+                    f"SELECT {columns} FROM main.audit_logs WHERE timestamp >= ? AND timestamp < ?",
+                    (start, end)
+                )
+                copied = cursor.rowcount
+                conn.execute(
+                    "DELETE FROM main.audit_logs WHERE timestamp >= ? AND timestamp < ?",
+                    (start, end)
+                )
+        finally:
+            conn.execute("DETACH DATABASE part")
+
+        if recompress:
+            self._compress(path, gz_path)
+
+        return copied
+
+    def _init_partition(self, path: str, table_sql: str):
+        """יצירת קובץ חודש עם אותו מבנה טבלה ואינדקסי שאילתה"""
+        part = sqlite3.connect(path, timeout=30)
+        try:
+            with part:
+                part.execute(table_sql.replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1))
+                part.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON audit_logs(timestamp)')
+                ensure_query_schema(part)
+        finally:
+            part.close()
+
+    def compress_old_partitions(self, today: Optional[date] = None) -> List[str]:
+        """
+        דחיסת קבצי חודש שעברו את הגיל המוגדר
+
+        Returns:
+            list: החודשים שנדחסו
+        """
+        if self.compress_after_months is None or self.compress_after_months < 0:
+            return []
+
+        today = today or datetime.now().date()
+        cutoff = months_back(today, self.compress_after_months).strftime('%Y-%m')
+
+        compressed = []
+        for partition in self.list_partitions():
+            if partition['compressed'] or partition['month'] >= cutoff:
+                continue
+            self._compress(partition['path'], self.partition_path(partition['month'], compressed=True))
+            compressed.append(partition['month'])
+            print(f"[DEBUG] Audit retention: compressed partition {partition['month']}")
+
+        return compressed
+
+    def rotate_log(self) -> bool:
+        """
+        סבב קובץ הלוג השטוח כשהוא עובר את הגודל המקסימלי
+
+        הקובץ הנוכחי מקבל חותמת זמן ונדחס, ועותקים מעבר ל-log_backups נמחקים.
+        """
+        if not self.log_max_bytes:
+            return False
+
+        with self.log_lock or nullcontext():
+            if not os.path.exists(self.log_file) or os.path.getsize(self.log_file) < self.log_max_bytes:
+                return False
+            rotated = f"{self.log_file}.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            os.replace(self.log_file, rotated)
+        self._compress(rotated, rotated + '.gz')
+
+        directory = os.path.dirname(os.path.abspath(self.log_file))
+        base = os.path.basename(self.log_file) + '.'
+        backups = sorted(
+            name for name in os.listdir(directory)
+            if name.startswith(base) and name.endswith('.gz')
+        )
+        for name in backups[:-self.log_backups] if self.log_backups > 0 else backups:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+        print(f"[DEBUG] Audit retention: rotated log file to {rotated}.gz")
+        return True
+
+    # ---------- Compression ----------
+
+    @staticmethod
+    def _compress(src: str, dst: str):
+        """דחיסה ל-gzip דרך קובץ זמני (החלפה אטומית) ומחיקת המקור"""
+        tmp = dst + '.tmp'
+        with open(src, 'rb') as f_in, gzip.open(tmp, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        os.replace(tmp, dst)
+        os.remove(src)
+
+    @staticmethod
+    def _decompress(src: str, dst: str):
+        with gzip.open(src, 'rb') as f_in, open(dst, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+
+    # ---------- Querying archives ----------
+
+    @contextmanager
+    def open_partition(self, month: str) -> Iterator[AuditQuery]:
+        """
+        פתיחת חודש מהארכיון לשאילתה (עם אותם פילטרים ועימוד כמו הטבלה הראשית)
+
+        קובץ דחוס נפרס לקובץ זמני שנמחק ביציאה מה-context.
+        """
+        path = self.partition_path(month)
+        if os.path.exists(path):
+            yield AuditQuery(path)
+            return
+
+        gz_path = self.partition_path(month, compressed=True)
+        if not os.path.exists(gz_path):
+            raise FileNotFoundError(f"Audit partition {month} not found")
+
+        fd, tmp_path = tempfile.mkstemp(suffix='.db', prefix=f'audit_{month}_')
+        os.close(fd)
+        try:
+            self._decompress(gz_path, tmp_path)
+            yield AuditQuery(tmp_path)
+        finally:
+            forget_schema(tmp_path)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+class RetentionScheduler:
+    """
+    הרצת תחזוקה מחזורית ב-thread משלה (חיבורים משלה, בלי לעכב את כותב הביקורת)
+
+    Args:
+        retention: מופע AuditRetention
+        interval: זמן מינימלי בשניות בין הרצות
+        initial_delay: השהיה בשניות לפני ההרצה הראשונה
+    """
+
+    def __init__(self, retention: AuditRetention, interval: float = 3600, initial_delay: float = 0):
+        self.retention = retention
+        self.interval = interval
+        self._next_run = time.monotonic() + initial_delay
+        self.last_result: Optional[Dict] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def maybe_run(self) -> Optional[Dict]:
+        """הרצת תחזוקה אם הגיע הזמן"""
+        if time.monotonic() < self._next_run:
+            return None
+        self._next_run = time.monotonic() + self.interval
+        try:
+            self.last_result = self.retention.run()
+        except Exception as e:
+            print(f"[ERROR] Audit retention failed: {str(e)}")
+            self.last_result = None
+        return self.last_result
+
+    def start(self) -> threading.Thread:
+        """הפעלת thread התחזוקה (daemon)"""
+        if self._thread is None:
+            def loop():
+                while True:
+                    time.sleep(max(self._next_run - time.monotonic(), 1))
+                    self.maybe_run()
+
+            self._thread = threading.Thread(target=loop, name='audit-retention', daemon=True)
+            self._thread.start()
+        return self._thread
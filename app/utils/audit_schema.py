@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Audit Database Schema
+מיגרציות ממוספרות למסד הביקורת - מוחלות פעם אחת לכל תהליך
+
+הגרסה הנוכחית של המסד נשמרת ב-PRAGMA user_version.
+מיגרציה חדשה = פונקציה חדשה בסוף MIGRATIONS (לעולם לא לשנות מיגרציה קיימת).
+"""
+
+import sqlite3
+import threading
+from typing import Callable, List, Tuple
+
+from utils.audit_analytics import ensure_summary_tables
+from utils.audit_queries import ensure_query_schema
+
+
+def _create_audit_logs(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS audit_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            username TEXT NOT NULL,
+            user_email TEXT,
+            user_groups TEXT,
+            action TEXT NOT NULL,
+            details TEXT,
+            session_id TEXT,
+            success BOOLEAN DEFAULT 1,
+            access_level TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON audit_logs(timestamp)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_username ON audit_logs(username)')
+
+
+def _add_query_indexes(conn: sqlite3.Connection):
+    # אינדקסים מורכבים + FTS5 לשאילתות הדשבורד (ראה utils/audit_queries.py)
+    ensure_query_schema(conn)
+
+
+def _add_summary_tables(conn: sqlite3.Connection):
+    # טבלאות סיכום יומיות לדשבורד האנליטיקה (ראה utils/audit_analytics.py)
+    ensure_summary_tables(conn)
+
+
+# (גרסה, תיאור, פונקציה)
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, 'audit_logs table', _create_audit_logs),
+    (2, 'composite indexes and full-text search', _add_query_indexes),
+    (3, 'daily and hourly summary tables', _add_summary_tables),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+_applied = set()
+_lock = threading.Lock()
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    החלת מיגרציות חסרות על חיבור פתוח
+
+    Returns:
+        int: גרסת המסד אחרי ההחלה
+    """
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+    for target, description, apply in MIGRATIONS:
+        if target <= version:
+            continue
+        with conn:
+            apply(conn)
+            conn.execute(f'PRAGMA user_version = {target}')
+        print(f"[DEBUG] Audit schema migrated to v{target}: {description}")
+        version = target
+
+    return version
+
+
+def ensure_audit_schema(db_path: str) -> bool:
+    """
+    וידוא שמסד הביקורת בגרסה העדכנית - פעם אחת לכל נתיב בתהליך
+
+    Returns:
+        bool: True אם המסד מוכן
+    """
+    if db_path in _applied:
+        return True
+
+    with _lock:
+        if db_path in _applied:
+            return True
+
+        try:
+            conn = sqlite3.connect(db_path, timeout=30)
+            try:
+                migrate(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"[ERROR] Audit schema migration failed: {str(e)}")
+            return False
+
+        _applied.add(db_path)
+        return True
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Audit Writer
+כתיבת רשומות ביקורת ברקע - תור חסום, כתיבה ב-batch על חיבור SQLite יחיד במצב WAL
+"""
+
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config import config
+from utils.audit_analytics import refresh_summaries
+from utils.audit_retention import AuditRetention, RetentionScheduler
+from utils.metrics import register_audit_writer
+
+CONFIG = config.get()
+
+INSERT_SQL = '''
+    INSERT INTO audit_logs
+    (timestamp, username, user_email, user_groups, action, details, session_id, success, access_level)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+_STOP = object()
+
+
+def format_log_line(entry: Dict) -> str:
+    """שורת לוג לקובץ השטוח (אותו פורמט כמו קודם)"""
+    log_entry = f"{entry['timestamp']} | {entry['username']} | {entry['user_email']} | {entry['action']}"
+    if entry['details']: log_entry += f" | {entry['details']}"
+    if entry['user_groups']: log_entry += f" | Groups: {entry['user_groups']}"
+    if not entry['success']: log_entry += " | FAILED"
+    return log_entry
+
+
+class AuditWriter:
+    """
+    כותב רשומות ביקורת ב-thread רקע
+
+    Args:
+        db_path: נתיב מסד הנתונים
+        log_file: נתיב קובץ הלוג השטוח
+        log_to_db: האם לכתוב למסד הנתונים
+        log_to_file: האם לכתוב לקובץ
+        max_queue: גודל תור מקסימלי
+        batch_size: מספר רשומות מקסימלי בטרנזקציה
+        flush_interval: זמן המתנה מקסימלי (שניות) לפני כתיבת batch חלקי
+        synchronous: כתיבה מיידית ב-thread הקורא (לבדיקות)
+    """
+
+    def __init__(self, db_path: str, log_file: str, log_to_db: bool = True, log_to_file: bool = True,
+                 max_queue: int = 10000, batch_size: int = 200, flush_interval: float = 1.0,
+                 synchronous: bool = False):
+        self.db_path = db_path
+        self.log_file = log_file
+        self.log_to_db = log_to_db
+        self.log_to_file = log_to_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+
+        self.written = 0
+        self.failed = 0
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        # משותפת עם סבב הלוג של תחזוקת ההיסטוריה
+        self.file_lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+        if not synchronous:
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+        atexit.register(self.close)
+
+    def _connection(self) -> sqlite3.Connection:
+        """חיבור יחיד וארוך-חיים במצב WAL (נפתח בשימוש הראשון)"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+        return self._conn
+
+    def qsize(self) -> int:
+        """מספר רשומות שממתינות בתור"""
+        return self._queue.qsize()
+
+    def submit(self, entry: Dict):
+        """
+        הוספת רשומה לכתיבה
+
+        במצב סינכרוני, אחרי סגירה, או כשהתור מלא מעבר לזמן ההמתנה -
+        הרשומה נכתבת מיד ב-thread הקורא כדי לא לאבד ביקורת.
+        """
+        if self.synchronous or self._closed:
+            self._write_batch([entry])
+            return
+
+        try:
+            self._queue.put(entry, timeout=2)
+        except queue.Full:
+            self._write_batch([entry])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        המתנה עד שכל הרשומות שנשלחו עד עכשיו נכתבו
+
+        Returns:
+            bool: False אם לא הסתיים בזמן (כולל תור מלא שאין בו מקום לסמן)
+        """
+        if self.synchronous or self._thread is None or not self._thread.is_alive():
+            return True
+
+        marker = threading.Event()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.wait(timeout)
+
+    def close(self, timeout: float = 10.0):
+        """כתיבת כל מה שנשאר בתור וסגירת החיבור"""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+        with self._write_lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+                self._conn = None
+
+    def _run(self):
+        """לולאת ה-thread: איסוף batch מהתור וכתיבתו בטרנזקציה אחת"""
+        while True:
+            batch: List[Dict] = []
+            markers: List[threading.Event] = []
+            stop = False
+
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+
+                if stop or len(batch) >= self.batch_size:
+                    break
+
+                # ממשיכים לאסוף כל עוד יש רשומות זמינות מיד
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    if markers or time.monotonic() >= deadline:
+                        break
+                    try:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+
+            if batch:
+                self._write_batch(batch)
+
+            for marker in markers:
+                marker.set()
+
+            if stop:
+                # ריקון שארית התור (רשומות שהגיעו אחרי בקשת הסגירה)
+                remaining = []
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        item.set()
+                    elif item is not _STOP:
+                        remaining.append(item)
+                if remaining:
+                    self._write_batch(remaining)
+                return
+
+    def _write_batch(self, batch: List[Dict]):
+        """כתיבת batch לקובץ ולמסד הנתונים"""
+        with self._write_lock:
+            # File logging - פתיחה אחת לכל batch
+            if self.log_to_file:
+                try:
+                    with self.file_lock, open(self.log_file, "a", encoding="utf-8") as f:
+                        f.write(''.join(format_log_line(entry) + "\n" for entry in batch))
+                except Exception as e:
+                    print(f"[ERROR] Audit file write failed: {str(e)}")
+
+            # Database logging - טרנזקציה אחת לכל batch
+            if self.log_to_db:
+                try:
+                    conn = self._connection()
+                    with conn:
+                        conn.executemany(INSERT_SQL, [
+                            (entry['timestamp'], entry['username'], entry['user_email'], entry['user_groups'],
+                             entry['action'], entry['details'], entry['session_id'], entry['success'],
+                             entry['access_level'])
+                            for entry in batch
+                        ])
+                    self.written += len(batch)
+                except Exception as e:
+                    self.failed += len(batch)
+                    print(f"[ERROR] Audit database write failed ({len(batch)} entries): {str(e)}")
+
+
+def get_audit_retention(log_lock: Optional[threading.Lock] = None) -> AuditRetention:
+    """מופע תחזוקת ההיסטוריה לפי ההגדרות (גם לצפייה בארכיון)"""
+    retention = AuditRetention(
+        db_path=CONFIG.get('DATABASE_PATH', 'safeq_audit.db'),
+        log_file=CONFIG.get('AUDIT_LOG_PATH', 'safeq_audit.log'),
+        archive_dir=CONFIG.get('AUDIT_ARCHIVE_DIR', 'audit_archive'),
+        hot_months=CONFIG.get('AUDIT_HOT_MONTHS', 6),
+        compress_after_months=CONFIG.get('AUDIT_COMPRESS_AFTER_MONTHS', 12),
+        log_max_bytes=CONFIG.get('AUDIT_LOG_MAX_BYTES', 10 * 1024 * 1024),
+        log_backups=CONFIG.get('AUDIT_LOG_BACKUPS', 10),
+        log_lock=log_lock
+    )
+    # הסיכומים היומיים מתעדכנים לפני שרשומות עוברות לארכיון, כדי שהמגמות יישמרו
+    if CONFIG.get('AUDIT_ANALYTICS_USE_SUMMARY', True):
+        retention.add_before_partition_hook(refresh_summaries)
+    return retention
+
+
+def _start_retention_scheduler(writer: AuditWriter) -> Optional[RetentionScheduler]:
+    """הפעלת תחזוקת ההיסטוריה ב-thread נפרד לפי ההגדרות (None אם מושבת או במצב sync)"""
+    # במצב sync (בדיקות) אין threads ברקע - גם לא תחזוקה
+    if writer.synchronous or not CONFIG.get('AUDIT_RETENTION_ENABLED', True):
+        return None
+    scheduler = RetentionScheduler(
+        get_audit_retention(log_lock=writer.file_lock),
+        interval=CONFIG.get('AUDIT_MAINTENANCE_INTERVAL', 3600),
+        initial_delay=CONFIG.get('AUDIT_MAINTENANCE_DELAY', 600)
+    )
+    scheduler.start()
+    return scheduler
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer() -> AuditWriter:
+    """קבלת כותב הביקורת המשותף (אחד לכל תהליך)"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditWriter(
+                    db_path=CONFIG.get('DATABASE_PATH', 'safeq_audit.db'),
+                    log_file=CONFIG.get('AUDIT_LOG_PATH', 'safeq_audit.log'),
+                    log_to_db=CONFIG.get('LOG_TO_DATABASE', True),
+                    log_to_file=CONFIG.get('LOG_TO_FILE', True),
+                    max_queue=CONFIG.get('AUDIT_QUEUE_SIZE', 10000),
+                    batch_size=CONFIG.get('AUDIT_BATCH_SIZE', 200),
+                    flush_interval=CONFIG.get('AUDIT_FLUSH_INTERVAL', 1.0),
+                    synchronous=CONFIG.get('AUDIT_WRITER_MODE', 'async') == 'sync'
+                )
+                _start_retention_scheduler(_writer)
+                register_audit_writer(_writer)
+    return _writer
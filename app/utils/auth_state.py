@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - OAuth State Store
+אחסון קצר-מועד של נתוני PKCE (state → code_verifier) בין ההפניה ל-Entra לחזרה ממנו
+
+memory - מפה בזיכרון התהליך עם תפוגה (ברירת מחדל)
+sqlite - טבלה במסד משותף, לפריסה עם כמה replicas על אותו volume
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from config import config
+
+CONFIG = config.get()
+
+
+class MemoryAuthStateStore:
+    """
+    מפת state בזיכרון עם תפוגה
+
+    ה-TTL קבוע, ולכן סדר ההכנסה הוא גם סדר התפוגה - רשומות שפג תוקפן
+    מוסרות מתחילת התור בלבד, ללא סריקה של כל המפה.
+    """
+
+    def __init__(self, ttl: float = 600, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: Dict[str, tuple] = {}
+        self._expiry: deque = deque()
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float):
+        while self._expiry:
+            expires_at, state = self._expiry[0]
+            if expires_at > now and len(self._data) <= self.max_entries:
+                break
+            self._expiry.popleft()
+            entry = self._data.get(state)
+            # הרשומה אולי כבר נשלפה או נכתבה מחדש עם תפוגה אחרת
+            if entry is not None and entry[1] == expires_at:
+                del self._data[state]
+
+    def put(self, state: str, data: Dict):
+        now = time.monotonic()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._data[state] = (data, expires_at)
+            self._expiry.append((expires_at, state))
+            self._purge(now)
+
+    def pop(self, state: str) -> Optional[Dict]:
+        """שליפה חד-פעמית (None אם לא קיים או פג תוקף)"""
+        now = time.monotonic()
+        with self._lock:
+            self._purge(now)
+            entry = self._data.pop(state, None)
+        if entry is None or entry[1] <= now:
+            return None
+        return entry[0]
+
+
+class SQLiteAuthStateStore:
+    """
+    טבלת state במסד SQLite משותף
+
+    רשומות שפג תוקפן נמחקות בטווח על האינדקס של expires_at.
+    """
+
+    def __init__(self, db_path: str, ttl: float = 600):
+        self.db_path = db_path
+        self.ttl = ttl
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS auth_state (
+                        state TEXT PRIMARY KEY,
+                        data TEXT NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                ''')
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_auth_state_expires ON auth_state(expires_at)')
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def put(self, state: str, data: Dict):
+        # זמן קיר (ולא monotonic) - משותף לכל התהליכים
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM auth_state WHERE expires_at <= ?", (now,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO auth_state (state, data, expires_at) VALUES (?, ?, ?)",
+                    (state, json.dumps(data), now + self.ttl)
+                )
+        finally:
+            conn.close()
+
+    def pop(self, state: str) -> Optional[Dict]:
+        """שליפה חד-פעמית (None אם לא קיים או פג תוקף)"""
+        conn = self._connect()
+        try:
+            conn.isolation_level = None
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    "SELECT data, expires_at FROM auth_state WHERE state = ?", (state,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM auth_state WHERE state = ?", (state,))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_auth_state_store():
+    """קבלת מאגר ה-state לפי AUTH_STATE_BACKEND"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                ttl = CONFIG.get('AUTH_STATE_TTL', 600)
+                if CONFIG.get('AUTH_STATE_BACKEND', 'memory') == 'sqlite':
+                    _store = SQLiteAuthStateStore(
+                        CONFIG.get('AUTH_STATE_DB_PATH', 'safeq_auth_state.db'), ttl=ttl
+                    )
+                else:
+                    _store = MemoryAuthStateStore(ttl=ttl)
+    return _store
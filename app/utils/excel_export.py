@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Excel Export
+ייצוא DataFrame ל-Excel בזיכרון קבוע (openpyxl write-only)
+
+במצב write-only השורות נכתבות ישירות לקובץ ואינן נשמרות כאובייקטי תא, כך שזמן
+הייצוא וצריכת הזיכרון לינאריים במספר השורות. רוחב העמודות מחושב מראש באופן
+וקטורי על דגימת שורות (במקום מעבר כפול על כל התאים אחרי הכתיבה).
+
+    data = export_to_excel(df, "users")                 # bytes להורדה
+
+    with ExcelStreamWriter(path, "history_report") as writer:
+        for chunk in chunks:                            # כתיבה הדרגתית מזרם ההיסטוריה
+            writer.write(chunk)
+
+    data = get_cached_export(df, "users")               # לפי hash של התוכן, משותף לכל ה-sessions
+"""
+
+import hashlib
+import io
+import threading
+from typing import IO, Iterable, List, Optional, Union
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+from config import config
+from utils.instrumentation import timed
+from utils.metrics import register_cache
+from utils.ttl_cache import TTLCache
+
+CONFIG = config.get()
+
+MAX_COLUMN_WIDTH = 50
+WIDTH_SAMPLE_ROWS = 2000
+EXCEL_MAX_ROWS = 1048576
+
+
+def column_widths(df: pd.DataFrame, sample_rows: int = WIDTH_SAMPLE_ROWS,
+                  max_width: int = MAX_COLUMN_WIDTH) -> List[int]:
+    """רוחב לכל עמודה: האורך המקסימלי (כותרת או ערך) בדגימת השורות + 2, עד max_width"""
+    sample = df.head(sample_rows)
+    widths = []
+    for column in df.columns:
+        longest = len(str(column))
+        if not sample.empty:
+            lengths = sample[column].astype(str).str.len()
+            longest = max(longest, int(lengths.max()))
+        widths.append(min(longest + 2, max_width))
+    return widths
+
+
+class ExcelStreamWriter:
+    """
+    כתיבת גליון Excel בחלקים (DataFrame לכל חלק) במצב write-only
+
+    target: נתיב או קובץ פתוח; None = כתיבה לזיכרון, close() מחזיר bytes.
+    הכותרות ורוחב העמודות נקבעים לפי החלק הראשון.
+    """
+
+    def __init__(self, target: Union[str, IO, None] = None, sheet_name: str = 'Sheet1',
+                 sample_rows: int = WIDTH_SAMPLE_ROWS):
+        self.target = target
+        self.sample_rows = sample_rows
+        self.rows_written = 0
+        self._workbook = Workbook(write_only=True)
+        # שמות גליון ב-Excel מוגבלים ל-31 תווים
+        self._sheet = self._workbook.create_sheet(title=sheet_name[:31])
+        self._columns: Optional[List[str]] = None
+        self._closed = False
+
+    def _write_header(self, df: pd.DataFrame):
+        self._columns = list(df.columns)
+        # ב-write-only רוחב העמודות חייב להיקבע לפני השורה הראשונה
+        for index, width in enumerate(column_widths(df, self.sample_rows), start=1):
+            self._sheet.column_dimensions[get_column_letter(index)].width = width
+
+        bold = Font(bold=True)
+        header = []
+        for column in self._columns:
+            cell = WriteOnlyCell(self._sheet, value=str(column))
+            cell.font = bold
+            header.append(cell)
+        self._sheet.append(header)
+
+    def write(self, df: pd.DataFrame):
+        """הוספת שורות (העמודות חייבות להיות זהות לחלק הראשון)"""
+        if self._columns is None:
+            self._write_header(df)
+        elif list(df.columns) != self._columns:
+            df = df.reindex(columns=self._columns)
+
+        if df.empty:
+            return
+        if self.rows_written + len(df) > EXCEL_MAX_ROWS - 1:
+            raise ValueError(f"Excel sheet limit is {EXCEL_MAX_ROWS - 1} data rows")
+
+        # Excel לא תומך ב-timezone - נשמרת השעה המקומית של העמודה
+        tz_columns = [column for column in df.columns if isinstance(df[column].dtype, pd.DatetimeTZDtype)]
+        if tz_columns:
+            df = df.assign(**{column: df[column].dt.tz_localize(None) for column in tz_columns})
+
+        # NaN/NaT -> תא ריק
+        values = df.astype(object).where(df.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            self._sheet.append(row)
+        self.rows_written += len(df)
+
+    def close(self) -> Optional[bytes]:
+        """סגירת הקובץ; מחזיר bytes כשהיעד הוא זיכרון"""
+        if self._closed:
+            return None
+        self._closed = True
+        if self._columns is None:
+            self._sheet.append([])
+
+        if self.target is None:
+            output = io.BytesIO()
+            self._workbook.save(output)
+            return output.getvalue()
+        self._workbook.save(self.target)
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
+
+@timed()
+def export_to_excel(df: pd.DataFrame, sheet_name: str) -> bytes:
+    """ייצוא DataFrame ל-Excel (bytes להורדה)"""
+    writer = ExcelStreamWriter(sheet_name=sheet_name)
+    writer.write(df)
+    return writer.close()
+
+
+def export_chunks_to_excel(chunks: Iterable[pd.DataFrame], sheet_name: str,
+                           target: Union[str, IO, None] = None) -> Optional[bytes]:
+    """ייצוא רצף DataFrames לגליון אחד; target=None מחזיר bytes"""
+    writer = ExcelStreamWriter(target, sheet_name)
+    for chunk in chunks:
+        writer.write(chunk)
+    return writer.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_export_cache() -> TTLCache:
+    """מטמון קבצי הייצוא המשותף (משקל = גודל הקובץ בבתים)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTLCache(
+                    max_entries=256,
+                    max_weight=CONFIG.get('EXPORT_CACHE_MAX_MB', 256) * 1024 * 1024,
+                    default_ttl=CONFIG.get('EXPORT_CACHE_TTL', 900),
+                    weigher=len
+                )
+                register_cache('excel_export', _cache)
+    return _cache
+
+
+@timed()
+def dataframe_fingerprint(df: pd.DataFrame, sheet_name: str) -> str:
+    """hash של תוכן הטבלה (ערכים, עמודות וסדר שורות) + שם הגליון"""
+    digest = hashlib.sha1(sheet_name.encode('utf-8'))
+    digest.update('\x1f'.join(map(str, df.columns)).encode('utf-8'))
+    digest.update(str(df.shape).encode('ascii'))
+    if not df.empty:
+        try:
+            hashed = pd.util.hash_pandas_object(df, index=False)
+        except TypeError:
+            # ערכים שאינם hashable (רשימות/מילונים בעמודה) - לפי הייצוג הטקסטואלי
+            hashed = pd.util.hash_pandas_object(df.astype(str), index=False)
+        digest.update(hashed.values.tobytes())
+    return digest.hexdigest()
+
+
+def peek_cached_export(fingerprint: str) -> Optional[bytes]:
+    """קובץ שכבר הוכן לפי ה-hash, בלי לבנות אותו (None אם לא במטמון או שפג תוקפו)"""
+    return get_export_cache().peek(('xlsx', fingerprint))
+
+
+def get_cached_export(df: pd.DataFrame, sheet_name: str, fingerprint: Optional[str] = None) -> bytes:
+    """קובץ Excel לטבלה - מהמטמון אם כבר הוכן (גם ב-session אחר), אחרת נוצר פעם אחת"""
+    fingerprint = fingerprint or dataframe_fingerprint(df, sheet_name)
+    return get_export_cache().get_or_set(('xlsx', fingerprint), lambda: export_to_excel(df, sheet_name))
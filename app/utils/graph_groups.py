@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Microsoft Graph Group Resolution
+שליפת כל קבוצות המשתמש מ-Graph: מעבר על כל העמודים (@odata.nextLink),
+קבוצות עקיפות (transitiveMemberOf) לפי הגדרה, ומטמון לפי object id
+"""
+
+import base64
+import json
+import threading
+from typing import Dict, List, Optional
+
+import requests
+
+from config import config
+from utils.metrics import register_cache
+from utils.ttl_cache import TTLCache
+
+CONFIG = config.get()
+
+GRAPH_BASE_URL = 'https://graph.microsoft.com/v1.0'
+GROUP_TYPE = '#microsoft.graph.group'
+
+
+class GraphGroupsError(Exception):
+    """כשל בשליפת קבוצות מ-Graph"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def get_token_object_id(access_token: str) -> Optional[str]:
+    """
+    חילוץ object id (oid) של המשתמש מתוך ה-access token
+
+    ללא אימות חתימה - משמש רק כמפתח מטמון לטוקן שכבר התקבל מ-Entra.
+    """
+    try:
+        payload = access_token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return claims.get('oid')
+    except Exception:
+        return None
+
+
+class GraphGroupResolver:
+    """
+    פותר חברות בקבוצות של המשתמש המחובר
+
+    Args:
+        transitive: כולל קבוצות מקוננות (transitiveMemberOf)
+        cache_ttl: זמן שמירה במטמון בשניות (0 = ללא מטמון)
+        page_size: גודל עמוד מבוקש מ-Graph ($top)
+    """
+
+    def __init__(self, transitive: bool = False, cache_ttl: int = 600, page_size: int = 999):
+        self.transitive = transitive
+        self.page_size = page_size
+        self.cache_ttl = cache_ttl
+        self._cache = TTLCache(max_entries=5000, default_ttl=cache_ttl)
+        self._session = requests.Session()
+
+    def resolve(self, access_token: str) -> List[Dict]:
+        """
+        כל הקבוצות של המשתמש: [{'displayName', 'id'}]
+
+        Raises:
+            GraphGroupsError: אם אחד העמודים נכשל (תוצאה חלקית לא מוחזרת ולא נשמרת)
+        """
+        object_id = get_token_object_id(access_token) if self.cache_ttl else None
+        if object_id:
+            cached = self._cache.get(object_id)
+            if cached is not None:
+                return [dict(group) for group in cached]
+
+        groups = self._fetch_all(access_token)
+
+        if object_id:
+            self._cache.set(object_id, tuple(groups))
+        return groups
+
+    def invalidate(self, access_token: str):
+        """הסרת המשתמש מהמטמון"""
+        object_id = get_token_object_id(access_token)
+        if object_id:
+            self._cache.pop(object_id)
+
+    def _fetch_all(self, access_token: str) -> List[Dict]:
+        endpoint = 'transitiveMemberOf' if self.transitive else 'memberOf'
+        url = f"{GRAPH_BASE_URL}/me/{endpoint}"
+        params = {'$select': 'displayName,id', '$top': self.page_size}
+        headers = {'Authorization': f'Bearer {access_token}'}
+
+        groups = []
+        seen = set()
+        while url:
+            response = self._session.get(url, headers=headers, params=params, timeout=15)
+            if response.status_code != 200:
+                raise GraphGroupsError(f"HTTP {response.status_code}", response.status_code)
+
+            data = response.json()
+            for item in data.get('value', []):
+                if item.get('@odata.type') != GROUP_TYPE:
+                    continue
+                group_id = item.get('id', '')
+                if group_id in seen:
+                    continue
+                seen.add(group_id)
+                groups.append({'displayName': item.get('displayName', ''), 'id': group_id})
+
+            # nextLink כבר מכיל את כל הפרמטרים
+            url = data.get('@odata.nextLink')
+            params = None
+
+        return groups
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_group_resolver() -> GraphGroupResolver:
+    """קבלת הפותר המשותף (מטמון אחד לכל התהליך)"""
+    global _resolver
+    if _resolver is None:
+        with _resolver_lock:
+            if _resolver is None:
+                _resolver = GraphGroupResolver(
+                    transitive=CONFIG.get('GRAPH_TRANSITIVE_GROUPS', False),
+                    cache_ttl=CONFIG.get('GRAPH_GROUPS_CACHE_TTL', 600)
+                )
+                register_cache('graph_groups', _resolver._cache)
+    return _resolver
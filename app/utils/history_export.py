@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - History Export
+ייצוא היסטוריית מסמכים מלאה ל-CSV או Parquet בזרימה (chunk לכל עמוד API)
+
+הדפים נשלפים לפי nextPageToken (עד 2000 מסמכים לעמוד), כל עמוד מומר ל-DataFrame
+עם סכמה קבועה ונכתב מיד לקובץ - הזיכרון תלוי בגודל העמוד ולא בגודל הטווח.
+העמוד הבא נשלף ברקע בזמן שהעמוד הנוכחי נכתב.
+
+    rows = export_history(api, 'parquet', 'history.parquet', date_start, date_end,
+                          allowed_departments=["ALL"], statuses=[1, 5])
+
+pyarrow נדרש רק לייצוא Parquet ונטען רק כשמשתמשים בו. גם pandas נטען רק בהמרת העמוד
+הראשון - המודול מיובא בעליית האפליקציה (דרך החישוב הלילי) ולא מעמיס את מסך ההתחברות.
+"""
+
+import importlib.util
+import io
+from datetime import date, datetime
+from typing import IO, TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+from utils.instrumentation import timed
+from utils.parallel import submit
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+HISTORY_PAGE_SIZE = 2000
+
+# סכמת הייצוא: שם עמודה -> סוג (string/int/bool/timestamp)
+EXPORT_COLUMNS = {
+    'document_id': 'string',
+    'date_time': 'timestamp',
+    'user_name': 'string',
+    'full_name': 'string',
+    'user_source': 'string',
+    'department': 'string',
+    'job_type': 'string',
+    'status': 'int',
+    'document_name': 'string',
+    'total_pages': 'int',
+    'color_pages': 'int',
+    'copies': 'int',
+    'duplex': 'bool',
+    'paper_size': 'string',
+    'printer': 'string',
+}
+
+EXPORT_FORMATS = {
+    'csv': {'label': 'CSV', 'extension': 'csv', 'mime': 'text/csv'},
+    'parquet': {'label': 'Parquet', 'extension': 'parquet', 'mime': 'application/vnd.apache.parquet'},
+}
+
+
+class HistoryExportError(Exception):
+    """כשל בשליפת עמוד היסטוריה - הייצוא נעצר כדי לא להחזיר קובץ חלקי"""
+
+
+def parquet_available() -> bool:
+    """האם pyarrow מותקן (בלי לייבא אותו)"""
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def history_range_iso(date_start: date, date_end: date) -> tuple:
+    """טווח תאריכים ל-API: מתחילת היום הראשון עד סוף היום האחרון (או עכשיו, אם הטווח כולל את היום)"""
+    start_iso = datetime.combine(date_start, datetime.min.time()).isoformat() + "Z"
+    if date_end >= datetime.now().date():
+        end_iso = datetime.now().isoformat() + "Z"
+    else:
+        end_iso = datetime.combine(date_end, datetime.max.time()).isoformat() + "Z"
+    return start_iso, end_iso
+
+
+def filter_documents_by_departments(documents: List[Dict], allowed_departments: list) -> List[Dict]:
+    """
+    סינון מסמכים לפי מחלקות מורשות (תגית מחלקה - tagType 0)
+
+    Args:
+        documents: רשימת מסמכים מה-API
+        allowed_departments: רשימת מחלקות מורשות או ["ALL"]
+
+    Returns:
+        list: מסמכים ששייכים לאחת המחלקות המורשות
+    """
+    if allowed_departments == ["ALL"]:
+        return documents
+
+    allowed = set(allowed_departments or [])
+
+    def doc_has_allowed_department(doc):
+        for tag in doc.get('tags', []):
+            if tag.get('tagType') == 0 and tag.get('name', '') in allowed:  # Department tag
+                return True
+        return False
+
+    return [doc for doc in documents if doc_has_allowed_department(doc)]
+
+
+def iter_history_pages(api, date_start: date, date_end: date, page_size: int = HISTORY_PAGE_SIZE,
+                       **filters) -> Iterator[List[Dict]]:
+    """
+    מעבר על כל עמודי ההיסטוריה בטווח (nextPageToken), עם שליפה מוקדמת של העמוד הבא
+
+    filters: username / portname / jobtype / status - כמו ב-get_documents_history
+    """
+    start_iso, end_iso = history_range_iso(date_start, date_end)
+
+    def fetch(token):
+        result = api.get_documents_history(datestart=start_iso, dateend=end_iso, maxrecords=page_size,
+                                           pagetoken=token, **filters)
+        if result is None:
+            raise HistoryExportError(f"History page request failed ({start_iso} - {end_iso})")
+        return result
+
+    pending = submit(lambda: fetch(None))
+    while pending is not None:
+        result = pending.result()
+        token = result.get('nextPageToken')
+        pending = submit(lambda next_token=token: fetch(next_token)) if token else None
+        documents = result.get('documents') or []
+        if documents:
+            yield documents
+
+
+def documents_to_frame(documents: List[Dict]) -> 'pd.DataFrame':
+    """המרת עמוד מסמכים ל-DataFrame בסכמת הייצוא (סוגים קבועים בכל העמודים)"""
+    import pandas as pd
+
+    frame = pd.DataFrame({
+        'document_id': [str(doc.get('documentId', doc.get('id', '')) or '') for doc in documents],
+        'date_time': pd.to_datetime([doc.get('dateTime') or 0 for doc in documents], unit='ms', utc=True),
+        'user_name': [doc.get('userName') or '' for doc in documents],
+        'full_name': [doc.get('fullName') or doc.get('userFullName') or doc.get('displayName') or ''
+                      for doc in documents],
+        'user_source': ['entra' if '@' in (doc.get('userName') or '') else 'local' for doc in documents],
+        'department': [', '.join(tag.get('name', '') for tag in doc.get('tags', []) if tag.get('tagType') == 0)
+                       for doc in documents],
+        'job_type': [doc.get('jobType') or '' for doc in documents],
+        'status': [doc.get('status') if doc.get('status') is not None else -1 for doc in documents],
+        'document_name': [doc.get('documentName') or '' for doc in documents],
+        'total_pages': [doc.get('totalPages') or 0 for doc in documents],
+        'color_pages': [doc.get('colorPages') or 0 for doc in documents],
+        'copies': [doc.get('copies') or 1 for doc in documents],
+        'duplex': [bool(doc.get('duplex')) for doc in documents],
+        'paper_size': [doc.get('paperSize') or '' for doc in documents],
+        'printer': [doc.get('outputPortName') or '' for doc in documents],
+    }, columns=list(EXPORT_COLUMNS))
+    return frame.astype({name: 'int64' for name, kind in EXPORT_COLUMNS.items() if kind == 'int'})
+
+
+def iter_history_frames(pages: Iterable[List[Dict]], allowed_departments: list,
+                        statuses: Optional[List[int]] = None) -> Iterator['pd.DataFrame']:
+    """
+    עמודי מסמכים -> DataFrames מסוננים לפי הרשאות מחלקה וסטטוס (בצד לקוח)
+
+    allowed_departments עובר כמו שהוא: ["ALL"] = הכל, רשימה ריקה = כלום
+    """
+    wanted = set(statuses) if statuses else None
+    for documents in pages:
+        documents = filter_documents_by_departments(documents, allowed_departments)
+        if wanted is not None:
+            documents = [doc for doc in documents if doc.get('status') in wanted]
+        if documents:
+            yield documents_to_frame(documents)
+
+
+def _open_target(target: Union[str, IO]):
+    """נתיב -> קובץ בינארי חדש (נסגר בסוף); קובץ פתוח מוחזר כמו שהוא"""
+    if isinstance(target, str):
+        return open(target, 'wb'), True
+    return target, False
+
+
+def write_csv(frames: Iterable['pd.DataFrame'], target: Union[str, IO],
+              progress: Optional[Callable[[int], None]] = None) -> int:
+    """כתיבת CSV (UTF-8 עם BOM, כדי ש-Excel יציג עברית) chunk אחרי chunk; מחזיר מספר שורות"""
+    output, owned = _open_target(target)
+    rows = 0
+    try:
+        output.write('\ufeff'.encode('utf-8'))
+        header = True
+        for frame in frames:
+            buffer = io.StringIO()
+            frame.to_csv(buffer, index=False, header=header, date_format='%Y-%m-%dT%H:%M:%SZ')
+            output.write(buffer.getvalue().encode('utf-8'))
+            header = False
+            rows += len(frame)
+            if progress:
+                progress(rows)
+        if header:
+            output.write((','.join(EXPORT_COLUMNS) + '\n').encode('utf-8'))
+    finally:
+        if owned:
+            output.close()
+    return rows
+
+
+def _arrow_schema(pa):
+    types = {
+        'string': pa.string(),
+        'int': pa.int64(),
+        'bool': pa.bool_(),
+        'timestamp': pa.timestamp('ms', tz='UTC'),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in EXPORT_COLUMNS.items()])
+
+
+def write_parquet(frames: Iterable['pd.DataFrame'], target: Union[str, IO],
+                  progress: Optional[Callable[[int], None]] = None, compression: str = 'zstd') -> int:
+    """כתיבת Parquet - row group לכל chunk; מחזיר מספר שורות"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(pa)
+    rows = 0
+    with pq.ParquetWriter(target, schema, compression=compression) as writer:
+        for frame in frames:
+            writer.write_table(pa.Table.from_pandas(frame, schema=schema, preserve_index=False))
+            rows += len(frame)
+            if progress:
+                progress(rows)
+    return rows
+
+
+WRITERS = {'csv': write_csv, 'parquet': write_parquet}
+
+
+@timed()
+def export_history(api, fmt: str, target: Union[str, IO], date_start: date, date_end: date,
+                   allowed_departments: list, statuses: Optional[List[int]] = None,
+                   page_size: int = HISTORY_PAGE_SIZE, progress: Optional[Callable[[int], None]] = None,
+                   pages: Optional[Iterable[List[Dict]]] = None, **filters) -> int:
+    """
+    ייצוא היסטוריה לטווח תאריכים בפורמט fmt ('csv' / 'parquet')
+
+    Args:
+        target: נתיב או קובץ בינארי פתוח
+        allowed_departments: היקף ההרשאות של המשתמש (["ALL"] = הכל, [] = כלום) - חובה
+        statuses: סינון סטטוסים בצד לקוח (None = הכל)
+        progress: נקרא עם מספר השורות שנכתבו אחרי כל chunk
+        pages: מקור עמודים חלופי (למשל מאגר מקומי); ברירת מחדל - ה-API
+        **filters: username / portname / jobtype לשרת
+
+    Returns:
+        int: מספר השורות שנכתבו
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if pages is None:
+        pages = iter_history_pages(api, date_start, date_end, page_size,
+                                   **{k: v for k, v in filters.items() if v})
+    frames = iter_history_frames(pages, allowed_departments, statuses)
+    return WRITERS[fmt](frames, target, progress)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Instrumentation
+מדידת זמנים לכל ריצה (rerun): קריאות API, הצגת דפים ופונקציות חמות
+
+מופעל רק עם INSTRUMENTATION_ENABLED=true. כשמושבת, הדקורטורים מחזירים את
+הפונקציה המקורית ואין שום תקורה.
+
+- trace לכל ריצה - נשמר ב-ContextVar, ולכן גם קריאות מ-run_parallel נרשמות בו
+- סטטיסטיקה מתגלגלת לכל שם (p50/p95/p99) ברמת התהליך
+- פאנל דיבאג ל-superadmin: פירוט הריצה האחרונה + אחוזונים
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+import streamlit as st
+
+from config import config
+from utils.metrics import create_api_adapter
+
+CONFIG = config.get()
+
+ENABLED = bool(CONFIG.get('INSTRUMENTATION_ENABLED', False))
+WINDOW = CONFIG.get('INSTRUMENTATION_WINDOW', 500)
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('instrumentation_trace', default=None)
+
+_samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=WINDOW))
+_samples_lock = threading.Lock()
+
+
+class Trace:
+    """רשימת המדידות של ריצה אחת"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Dict):
+        with self._lock:
+            self.spans.append(span)
+
+
+def record(name: str, category: str, duration: float, **extra):
+    """רישום מדידה ב-trace הנוכחי ובסטטיסטיקה המתגלגלת"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add({
+            'name': name, 'category': category,
+            'offset_ms': round((time.perf_counter() - duration - trace.started) * 1000, 1),
+            'ms': round(duration * 1000, 1), **extra
+        })
+    with _samples_lock:
+        _samples[f"{category}:{name}"].append(duration)
+
+
+@contextmanager
+def span(name: str, category: str = 'code', **extra):
+    """מדידת בלוק קוד"""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, category, time.perf_counter() - start, **extra)
+
+
+def timed(name: Optional[str] = None, category: str = 'code') -> Callable:
+    """דקורטור למדידת פונקציה (ללא תקורה כשהמדידה מושבתת)"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(label, category, time.perf_counter() - start)
+
+        return wrapper
+    return decorator
+
+
+def instrument_methods(category: str = 'api') -> Callable:
+    """דקורטור מחלקה - מדידת כל המתודות הציבוריות"""
+    def decorator(cls):
+        if not ENABLED:
+            return cls
+        for attr, value in list(vars(cls).items()):
+            if callable(value) and not attr.startswith('_'):
+                setattr(cls, attr, timed(f"{cls.__name__}.{attr}", category)(value))
+        return cls
+    return decorator
+
+
+def _record_response(response, *args, **kwargs):
+    """hook של requests - endpoint, סטטוס, גודל וזמן תגובה"""
+    request = response.request
+    record(
+        f"{request.method} {urlparse(request.url).path}", 'http',
+        response.elapsed.total_seconds(),
+        status=response.status_code,
+        bytes=len(response.content or b'')
+    )
+    return response
+
+
+def create_http_session() -> requests.Session:
+    """Session עם keep-alive, retries ומדדים (ו-hook מדידה כשהמדידה מופעלת)"""
+    session = requests.Session()
+    adapter = create_api_adapter()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if ENABLED:
+        session.hooks['response'].append(_record_response)
+    return session
+
+
+@contextmanager
+def rerun_trace(name: str = 'rerun'):
+    """trace לריצה אחת של הסקריפט - נשמר ב-session בסיום (גם ב-st.rerun/st.stop)"""
+    if not ENABLED:
+        yield None
+        return
+
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        trace.duration = time.perf_counter() - trace.started
+        _current_trace.reset(token)
+        with _samples_lock:
+            _samples[f"rerun:{name}"].append(trace.duration)
+        try:
+            history = st.session_state.setdefault('_instrumentation_traces', deque(maxlen=20))
+            history.append(trace)
+        except Exception:
+            pass
+
+
+def percentiles() -> List[Dict]:
+    """אחוזונים מתגלגלים לכל שם מדידה (מהאיטי למהיר לפי p95)"""
+    with _samples_lock:
+        snapshot = {key: sorted(values) for key, values in _samples.items() if values}
+
+    rows = []
+    for key, values in snapshot.items():
+        count = len(values)
+
+        def pct(p):
+            return round(values[min(int(p * count), count - 1)] * 1000, 1)
+
+        rows.append({'name': key, 'count': count, 'p50_ms': pct(0.50), 'p95_ms': pct(0.95), 'p99_ms': pct(0.99)})
+
+    rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+    return rows
+
+
+def show_debug_panel():
+    """פאנל דיבאג (ב-sidebar) - הריצה האחרונה שהסתיימה + אחוזונים"""
+    if not ENABLED:
+        return
+
+    with st.expander("🩺 מדידת ביצועים", expanded=False):
+        history = st.session_state.get('_instrumentation_traces')
+        if history:
+            last = history[-1]
+            st.write(f"**ריצה אחרונה:** {last.duration * 1000:.0f}ms ({len(last.spans)} מדידות)")
+            if last.spans:
+                st.dataframe(sorted(last.spans, key=lambda s: s['offset_ms']), hide_index=True)
+        else:
+            st.caption("אין עדיין ריצות שנמדדו")
+
+        st.write("**אחוזונים (כל ה-sessions):**")
+        rows = percentiles()
+        if rows:
+            st.dataframe(rows, hide_index=True)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Background Jobs
+הרצת עבודות ארוכות (שליפת דוחות) ב-threads רקע, מנותקות מריצת הסקריפט של Streamlit
+
+לכל עבודה מזהה, התקדמות, אפשרות ביטול ותוצאה שנשמרת לדיסק (JSON דחוס).
+הדף שומר רק את מזהה העבודה (session_state + query params) ובודק את מצבה,
+כך שמעבר לדף אחר או חיבור websocket מחדש לא מאבדים את העבודה.
+שליחה חוזרת עם אותו מפתח (dedupe key) מצטרפת לעבודה שכבר רצה.
+
+    manager = get_job_manager()
+    job = manager.submit('report', key, lambda ctx: fetch(..., progress=ctx.progress, publish=ctx.publish),
+                         owner=username)
+    ...
+    job = manager.get(job_id)
+    manager.cancel(job_id, owner=username)            # מבוטלת רק כשאף משתמש לא נשאר עליה
+    chunks = manager.partial(job_id, start)           # חלקים שהגיעו בזמן שהעבודה רצה
+    if job.status == 'done' and job.can_view(username):
+        data = manager.result(job_id)
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from config import config
+from utils.metrics import register_job_manager
+
+CONFIG = config.get()
+
+ACTIVE_STATES = ('queued', 'running')
+
+
+class JobCancelled(Exception):
+    """נזרקת מתוך העבודה כשהמשתמש ביטל אותה"""
+
+
+class Job:
+    """מצב עבודה אחת (ללא התוצאה עצמה - היא נשמרת לדיסק)"""
+
+    def __init__(self, job_id: str, kind: str, key: Hashable = None, owner: Optional[str] = None,
+                 description: str = ''):
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        # כל מי שהגיש את העבודה (כולל מי שהצטרף לעבודה קיימת) רשאי לצפות בה
+        self.owners = {owner} if owner else set()
+        self.description = description
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = ''
+        self.error = ''
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.cancel_event = threading.Event()
+        # חלקי תוצאה שפורסמו בזמן הריצה (בזיכרון בלבד, נמחקים בסיום)
+        self.partial: List[Any] = []
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE_STATES
+
+    def can_view(self, user: Optional[str]) -> bool:
+        return not self.owners or user in self.owners
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id, 'kind': self.kind, 'owners': sorted(self.owners), 'description': self.description,
+            'status': self.status, 'progress': self.progress, 'message': self.message, 'error': self.error,
+            'created': self.created, 'started': self.started, 'finished': self.finished,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Job':
+        job = cls(data['id'], data.get('kind', ''), description=data.get('description', ''))
+        job.owners = set(data.get('owners', []))
+        for field in ('status', 'progress', 'message', 'error', 'created', 'started', 'finished'):
+            if field in data:
+                setattr(job, field, data[field])
+        return job
+
+
+class JobContext:
+    """מה שהעבודה מקבלת: דיווח התקדמות ובדיקת ביטול"""
+
+    def __init__(self, job: Job):
+        self._job = job
+
+    @property
+    def cancelled(self) -> bool:
+        return self._job.cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def progress(self, fraction: float, message: str = ''):
+        """עדכון התקדמות (0-1); זורק JobCancelled אם העבודה בוטלה"""
+        self._job.progress = max(0.0, min(float(fraction), 1.0))
+        if message:
+            self._job.message = message
+        self.check_cancelled()
+
+    def publish(self, chunk: Any):
+        """פרסום חלק תוצאה שהושלם - הדף יכול להציג אותו לפני שהעבודה מסתיימת"""
+        self._job.partial.append(chunk)
+
+
+class JobManager:
+    """
+    ניהול עבודות רקע לתהליך (thread pool ייעודי, נפרד מה-pool של הקריאות המקבילות)
+
+    Args:
+        max_workers: מספר עבודות שרצות במקביל (השאר ממתינות בתור)
+        results_dir: תיקיית התוצאות (JSON דחוס + מטא-דאטה לכל עבודה)
+        result_ttl: זמן שמירת עבודה שהסתיימה ותוצאתה (שניות)
+    """
+
+    def __init__(self, max_workers: int = 4, results_dir: str = 'report_jobs', result_ttl: float = 3600):
+        self.results_dir = results_dir
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: Dict[str, Job] = {}
+        self._by_key: Dict[Hashable, str] = {}
+        self._lock = threading.Lock()
+        os.makedirs(results_dir, exist_ok=True)
+
+    # ---------- קבצים ----------
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.results_dir, f"{job_id}{suffix}")
+
+    def _write_meta(self, job: Job):
+        tmp_path = self._path(job.id, '.meta.json.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(job.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(job.id, '.meta.json'))
+
+    def _write_result(self, job: Job, result: Any):
+        tmp_path = self._path(job.id, '.json.gz.tmp')
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=5) as f:
+            json.dump(result, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, self._path(job.id, '.json.gz'))
+
+    def _remove_files(self, job_id: str):
+        for suffix in ('.json.gz', '.meta.json'):
+            try:
+                os.remove(self._path(job_id, suffix))
+            except OSError:
+                pass
+
+    # ---------- ריצה ----------
+
+    def _run(self, job: Job, func: Callable[[JobContext], Any]):
+        if job.cancel_event.is_set():
+            self._finish(job, 'cancelled')
+            return
+
+        job.status = 'running'
+        job.started = time.time()
+        try:
+            result = func(JobContext(job))
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+            if result is not None:
+                self._write_result(job, result)
+            job.progress = 1.0
+            self._finish(job, 'done')
+        except JobCancelled:
+            self._finish(job, 'cancelled')
+        except Exception as e:
+            print(f"[ERROR] Job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            self._finish(job, 'failed')
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished = time.time()
+        job.partial = []
+        with self._lock:
+            if self._by_key.get(job.key) == job.id:
+                del self._by_key[job.key]
+        try:
+            self._write_meta(job)
+        except OSError as e:
+            print(f"[ERROR] Could not persist job {job.id}: {e}")
+
+    def _prune(self):
+        """מחיקת עבודות שהסתיימו לפני יותר מ-result_ttl (בזיכרון ובדיסק)"""
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if not job.active and job.finished and job.finished < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        for job_id in expired:
+            self._remove_files(job_id)
+
+        # קבצים של עבודות מהפעלות קודמות של התהליך (לא בזיכרון)
+        try:
+            names = os.listdir(self.results_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.results_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    # ---------- API ----------
+
+    def submit(self, kind: str, key: Hashable, func: Callable[[JobContext], Any],
+               owner: Optional[str] = None, description: str = '') -> Job:
+        """
+        הגשת עבודה; אם עבודה עם אותו key כבר ממתינה/רצה - מוחזרת העבודה הקיימת
+
+        func מקבלת JobContext ומחזירה תוצאה שניתנת ל-JSON (None = ללא תוצאה)
+        """
+        self._prune()
+        with self._lock:
+            existing_id = self._by_key.get(key) if key is not None else None
+            if existing_id and self._jobs[existing_id].active:
+                existing = self._jobs[existing_id]
+                if owner:
+                    existing.owners.add(owner)
+                return existing
+
+            job = Job(uuid.uuid4().hex, kind, key, owner, description)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._by_key[key] = job.id
+
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """מצב עבודה - מהזיכרון, או מהדיסק אם התהליך הופעל מחדש מאז"""
+        if not job_id:
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        try:
+            with open(self._path(job_id, '.meta.json'), encoding='utf-8') as f:
+                return Job.from_dict(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def result(self, job_id: str) -> Any:
+        """התוצאה השמורה של עבודה שהסתיימה (None אם אין)"""
+        try:
+            with gzip.open(self._path(job_id, '.json.gz'), 'rt', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def partial(self, job_id: str, start: int = 0) -> List[Any]:
+        """החלקים שעבודה פעילה פרסמה, מהאינדקס start (ריק אם הסתיימה או לא בזיכרון)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return []
+        return job.partial[start:]
+
+    def cancel(self, job_id: str, owner: Optional[str] = None) -> bool:
+        """
+        בקשת ביטול - העבודה נעצרת בדיווח ההתקדמות הבא שלה
+
+        עם owner: רק המשתמש הזה מוסר מהעבודה המשותפת, והיא מבוטלת בפועל רק
+        כשלא נשארו לה בעלים (משתמשים אחרים שהצטרפו ממשיכים לקבל את התוצאה).
+        """
+        job = self.get(job_id)
+        if job is None or not job.active:
+            return False
+        with self._lock:
+            if owner is not None:
+                job.owners.discard(owner)
+                if job.owners:
+                    return True
+            job.cancel_event.set()
+        job.message = 'מבטל...'
+        return True
+
+    def jobs(self, owner: Optional[str] = None) -> List[Job]:
+        """העבודות בזיכרון (החדשות ראשונות), אופציונלית רק של משתמש אחד"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if owner is not None:
+            jobs = [job for job in jobs if owner in job.owners]
+        return sorted(jobs, key=lambda job: job.created, reverse=True)
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.active)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """מנהל העבודות המשותף (אחד לכל תהליך)"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager(
+                    max_workers=CONFIG.get('JOBS_MAX_WORKERS', 4),
+                    results_dir=CONFIG.get('JOBS_DIR', 'report_jobs'),
+                    result_ttl=CONFIG.get('JOBS_RESULT_TTL', 3600)
+                )
+                register_job_manager(_manager)
+    return _manager
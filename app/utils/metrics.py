@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Metrics
+רישום מדדים ברמת התהליך וחשיפה בפורמט Prometheus (text exposition) בפורט צדדי
+
+- safeq_api_*      - זמן תגובה, בקשות לפי סטטוס ו-retries לכל endpoint של SafeQ
+- safeq_cache_*    - hits/misses/evictions ויחס פגיעה לכל מטמון משותף
+- safeq_sessions   - sessions פעילים (לפי ריצה אחרונה)
+- safeq_audit_*    - עומק תור כותב הביקורת
+
+מופעל עם METRICS_ENABLED=true; השרת מאזין ב-METRICS_HOST:METRICS_PORT (/metrics).
+"""
+
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import config
+
+CONFIG = config.get()
+
+ENABLED = bool(CONFIG.get('METRICS_ENABLED', False))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """מונה מצטבר"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """ערך נוכחי - נקבע ידנית או מחושב בזמן ה-scrape (callback)"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        if self.callback is not None:
+            try:
+                return self.header() + [f'{self.name} {_format_value(self.callback())}']
+            except Exception as e:
+                print(f"[ERROR] Metric callback {self.name} failed: {e}")
+                return []
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """התפלגות ערכים בדליים מצטברים (זמני תגובה)"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [מונה לכל דלי, סכום, כמות]
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+
+        lines = self.header()
+        names = self.labelnames + ('le',)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(names, key + (_format_value(bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            base = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{base} {_format_value(total)}')
+            lines.append(f'{self.name}_count{base} {count}')
+        return lines
+
+
+class Registry:
+    """אוסף המדדים של התהליך ומקורות נוספים שנקראים בזמן ה-scrape"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], List[str]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], List[str]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                print(f"[ERROR] Metrics collector failed: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+API_REQUESTS = REGISTRY.register(Counter(
+    'safeq_api_requests_total', 'SafeQ API requests by endpoint and status (status="error" on connection failure)',
+    ('method', 'endpoint', 'status')
+))
+API_LATENCY = REGISTRY.register(Histogram(
+    'safeq_api_request_duration_seconds', 'SafeQ API request latency including retries',
+    ('method', 'endpoint')
+))
+API_RETRIES = REGISTRY.register(Counter(
+    'safeq_api_retries_total', 'SafeQ API retry attempts', ('method', 'endpoint')
+))
+
+
+# ==================== SafeQ API ====================
+
+# נתיבים עם מזהים מנורמלים לתבנית, כדי שמספר הסדרות לא יגדל עם מספר המשתמשים
+_ENDPOINT_TEMPLATES = [
+    (re.compile(r'^/api/v1/users/[^/]+/groups$'), '/api/v1/users/{username}/groups'),
+    (re.compile(r'^/api/v1/groups/[^/]+/members$'), '/api/v1/groups/{group_id}/members'),
+    (re.compile(r'^/api/v1/users/(?!all$)[^/]+$'), '/api/v1/users/{username}'),
+]
+
+
+def normalize_endpoint(url: str) -> str:
+    """נתיב ה-endpoint ללא host, query ומזהים"""
+    path = urlparse(url).path or '/'
+    for pattern, template in _ENDPOINT_TEMPLATES:
+        if pattern.match(path):
+            return template
+    return path
+
+
+class CountingRetry(Retry):
+    """Retry של urllib3 שסופר כל ניסיון חוזר"""
+
+    def increment(self, method=None, url=None, *args, **kwargs):
+        if ENABLED:
+            API_RETRIES.inc(method=method or '', endpoint=normalize_endpoint(url or ''))
+        return super().increment(method, url, *args, **kwargs)
+
+
+class MetricsAdapter(HTTPAdapter):
+    """HTTPAdapter שמודד כל בקשה (כולל ה-retries שבתוכה) ורושם את הסטטוס הסופי"""
+
+    def send(self, request, **kwargs):
+        if not ENABLED:
+            return super().send(request, **kwargs)
+
+        endpoint = normalize_endpoint(request.url)
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = super().send(request, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            API_LATENCY.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint)
+            API_REQUESTS.inc(method=request.method, endpoint=endpoint, status=status)
+
+
+def create_api_adapter() -> MetricsAdapter:
+    """
+    Adapter לחיבור ל-SafeQ: retries לפי SAFEQ_API_RETRIES (ברירת מחדל 0 - כבוי)
+
+    רק בקשות GET, ורק כשל חיבור או 502-504. timeout בקריאה לא נשלח שוב - שליפת
+    היסטוריה עם timeout ארוך הייתה נחסמת פי כמה. בקשות שמשנות נתונים לא נשלחות שוב.
+    """
+    total = CONFIG.get('SAFEQ_API_RETRIES', 0)
+    if not total:
+        return MetricsAdapter()
+    retries = CountingRetry(
+        total=total,
+        read=0,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        raise_on_status=False
+    )
+    return MetricsAdapter(max_retries=retries)
+
+
+# ==================== Caches ====================
+
+_caches: Dict[str, object] = {}
+_caches_lock = threading.Lock()
+
+
+def register_cache(name: str, cache):
+    """רישום מטמון (עם stats()) לחשיפה במדדים"""
+    with _caches_lock:
+        _caches[name] = cache
+
+
+def _collect_caches() -> List[str]:
+    with _caches_lock:
+        caches = sorted(_caches.items())
+
+    series = {
+        'safeq_cache_hits_total': ('counter', 'Cache hits', 'hits'),
+        'safeq_cache_misses_total': ('counter', 'Cache misses', 'misses'),
+        'safeq_cache_evictions_total': ('counter', 'Cache evictions', 'evictions'),
+        'safeq_cache_entries': ('gauge', 'Entries currently cached', 'entries'),
+        'safeq_cache_hit_ratio': ('gauge', 'Hit ratio since process start', 'hit_ratio'),
+    }
+    stats = {name: cache.stats() for name, cache in caches}
+
+    lines = []
+    for metric, (kind, documentation, field) in series.items():
+        lines += [f'# HELP {metric} {documentation}', f'# TYPE {metric} {kind}']
+        for name, values in stats.items():
+            lines.append(f'{metric}{_format_labels(("cache",), (name,))} {_format_value(values[field])}')
+    return lines
+
+
+REGISTRY.register_collector(_collect_caches)
+
+
+# ==================== Sessions ====================
+
+_sessions: Dict[str, Tuple[float, bool]] = {}
+_sessions_lock = threading.Lock()
+
+
+def touch_session(session_id: str, logged_in: bool):
+    """עדכון זמן הריצה האחרונה של session (נקרא בכל ריצה של הסקריפט)"""
+    if not ENABLED or not session_id:
+        return
+    with _sessions_lock:
+        _sessions[session_id] = (time.monotonic(), logged_in)
+
+
+def _collect_sessions() -> List[str]:
+    idle = CONFIG.get('METRICS_SESSION_IDLE', 900)
+    cutoff = time.monotonic() - idle
+    with _sessions_lock:
+        for session_id in [sid for sid, (seen, _) in _sessions.items() if seen < cutoff]:
+            del _sessions[session_id]
+        total = len(_sessions)
+        logged_in = sum(1 for _, is_logged_in in _sessions.values() if is_logged_in)
+
+    metric = 'safeq_sessions'
+    return [
+        f'# HELP {metric} Browser sessions active in the last {idle} seconds',
+        f'# TYPE {metric} gauge',
+        f'{metric}{{state="logged_in"}} {logged_in}',
+        f'{metric}{{state="anonymous"}} {total - logged_in}',
+    ]
+
+
+REGISTRY.register_collector(_collect_sessions)
+
+
+# ==================== Audit ====================
+
+def register_audit_writer(writer):
+    """חשיפת עומק התור של כותב הביקורת"""
+    REGISTRY.register(Gauge(
+        'safeq_audit_queue_depth', 'Audit entries waiting to be written', callback=writer.qsize
+    ))
+
+
+def register_job_manager(manager):
+    """חשיפת מספר עבודות הרקע שממתינות או רצות"""
+    REGISTRY.register(Gauge(
+        'safeq_jobs_active', 'Background jobs queued or running', callback=manager.active_count
+    ))
+
+
+# ==================== HTTP endpoint ====================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_failed = False
+_server_lock = threading.Lock()
+
+
+def start_metrics_server() -> Optional[ThreadingHTTPServer]:
+    """הפעלת שרת המדדים (פעם אחת לכל תהליך; בטוח לקריאה בכל ריצה)"""
+    global _server, _server_failed
+    if not ENABLED or _server_failed:
+        return None
+    if _server is None:
+        with _server_lock:
+            if _server is None and not _server_failed:
+                host = CONFIG.get('METRICS_HOST', '0.0.0.0')
+                port = CONFIG.get('METRICS_PORT', 9108)
+                try:
+                    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+                except OSError as e:
+                    print(f"[ERROR] Metrics server failed to bind {host}:{port}: {e}")
+                    # לא לנסות שוב בכל ריצה
+                    _server_failed = True
+                    return None
+                server.daemon_threads = True
+                threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+                _server = server
+                print(f"[DEBUG] Metrics server listening on {host}:{port}")
+    return _server
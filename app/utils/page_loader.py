@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Lazy Page Loading
+רישום דפים לפי שם מודול וייבוא המודול רק בכניסה הראשונה לדף
+
+מסך ההתחברות לא טוען את pandas/openpyxl/pytz של דפי הדוחות והמשתמשים.
+זמן הייבוא של כל דף נמדד ונשמר לדוח (page_load_report).
+
+דוח עלות ייבוא מתהליך נקי (python -X importtime):
+    cd app && python -m utils.page_loader
+"""
+
+import importlib
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, List
+
+from utils.instrumentation import span
+
+# מודולי הדפים שנרשמים בניווט (לדוח ה-CLI)
+PAGE_MODULES = [
+    'pages.my_activity',
+    'pages.audit_analytics',
+    'pages.users.user_list',
+    'pages.users.search_edit',
+    'pages.users.add_user',
+    'pages.users.bulk_upload_users',
+    'pages.groups.groups',
+    'pages.printers',
+    'pages.print_queues',
+    'pages.pending_prints',
+    'pages.scanning',
+    'pages.reports',
+]
+
+_IMPORTTIME_LINE = re.compile(r'import time:\s*(\d+)\s*\|\s*(\d+)\s*\|( *)(.+)$')
+
+_load_times: Dict[str, float] = {}
+_load_lock = threading.Lock()
+# מודולים שהייבוא שלהם הסתיים - sys.modules מכיל מודול כבר בתחילת הייבוא שלו,
+# ו-session אחר שנכנס לאותו דף באותו זמן היה מקבל מודול חלקי
+_loaded: Dict[str, object] = {}
+
+
+def load_page(module_name: str, attr: str = 'show') -> Callable:
+    """ייבוא מודול דף (פעם אחת) והחזרת פונקציית ההצגה שלו"""
+    module = _loaded.get(module_name)
+    if module is None:
+        with _load_lock:
+            module = _loaded.get(module_name)
+            if module is None:
+                start = time.perf_counter()
+                module = importlib.import_module(module_name)
+                if module_name not in _load_times:
+                    _load_times[module_name] = time.perf_counter() - start
+                    print(f"[DEBUG] Loaded page module {module_name} in {_load_times[module_name] * 1000:.0f}ms")
+                _loaded[module_name] = module
+    return getattr(module, attr)
+
+
+def lazy_show(module_name: str, attr: str = 'show') -> Callable[[], None]:
+    """פונקציה ל-st.Page שמייבאת את הדף רק כשהוא מוצג"""
+    def show():
+        with span(module_name, 'page'):
+            return load_page(module_name, attr)()
+
+    show.__name__ = module_name.rsplit('.', 1)[-1]
+    return show
+
+
+def page_load_report() -> List[Dict]:
+    """זמני ייבוא של הדפים שנטענו בתהליך הנוכחי (מהאיטי למהיר)"""
+    return [
+        {'module': name, 'ms': round(seconds * 1000, 1)}
+        for name, seconds in sorted(_load_times.items(), key=lambda item: item[1], reverse=True)
+    ]
+
+
+def measure_import_cost(module_name: str, top: int = 10) -> Dict:
+    """
+    מדידת עלות ייבוא מודול בתהליך נקי (python -X importtime)
+
+    Returns:
+        dict: {'module', 'total_ms', 'heaviest': [(מודול, ms מצטבר), ...]}
+    """
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        cwd=app_dir, capture_output=True, text=True
+    )
+
+    # פורמט: "import time: self [us] | cumulative | imported package"
+    # ההזחה של שם המודול היא עומק בעץ הייבוא - שורה ללא הזחה היא ייבוא ישיר
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            depth = len(match.group(3)) // 2
+            entries.append((match.group(4).strip(), int(match.group(2)) / 1000, depth))
+
+    total = next((ms for name, ms, _ in entries if name == module_name), None)
+    top_level = sorted(((name, ms) for name, ms, depth in entries if depth <= 1), key=lambda e: e[1], reverse=True)
+    return {
+        'module': module_name,
+        'total_ms': total if total is not None else 0.0,
+        'error': result.stderr.strip().splitlines()[-1] if result.returncode != 0 else None,
+        'heaviest': top_level[:top],
+    }
+
+
+if __name__ == '__main__':
+    modules = sys.argv[1:] or ['main_utils'] + PAGE_MODULES
+    for name in modules:
+        report = measure_import_cost(name)
+        if report['error']:
+            print(f"{name}: FAILED ({report['error']})")
+            continue
+        print(f"{name}: {report['total_ms']:.0f}ms")
+        for dep, ms in report['heaviest'][:5]:
+            print(f"    {dep:<40} {ms:8.1f}ms")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Parallel Calls
+הרצת קריאות רשת בלתי תלויות במקביל (Graph, SafeQ API)
+
+ה-threads מקבלים את ה-ScriptRunContext של ה-session הנוכחי, כך ש-st.warning/st.error
+מתוך הפונקציות ממשיכים לעבוד כרגיל.
+"""
+
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from config import config
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # גרסת Streamlit ללא ה-API הזה - ה-threads ירוצו ללא context
+    add_script_run_ctx = None
+    get_script_run_ctx = None
+
+CONFIG = config.get()
+
+# שם התכונה שבה Streamlit שומר את ה-ScriptRunContext על ה-thread (get_script_run_ctx קורא ממנה)
+_SCRIPT_CTX_ATTR = 'streamlit_script_run_ctx'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Thread pool משותף לכל ה-sessions (גודל לפי PARALLEL_MAX_WORKERS)"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=CONFIG.get('PARALLEL_MAX_WORKERS', 16),
+                    thread_name_prefix="parallel"
+                )
+    return _executor
+
+
+def _bind(func: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    עטיפת פונקציה כך שתרוץ עם ה-context של ה-thread הקורא
+
+    ה-threads של ה-pool משותפים לכל ה-sessions: ה-context מוצב תמיד (גם None - קורא ללא
+    session, כמו עבודת רקע או CLI) ומוחזר למצבו הקודם בסיום, כדי ש-st.error מקריאה אחת
+    לא יוצג ב-session של משתמש אחר שהשתמש ב-thread קודם.
+    """
+    script_ctx = get_script_run_ctx() if get_script_run_ctx else None
+    var_ctx = contextvars.copy_context()
+
+    def run():
+        if get_script_run_ctx is None:
+            return var_ctx.run(func)
+        thread = threading.current_thread()
+        saved = getattr(thread, _SCRIPT_CTX_ATTR, None)
+        if script_ctx is not None:
+            add_script_run_ctx(thread, script_ctx)
+        else:
+            setattr(thread, _SCRIPT_CTX_ATTR, None)
+        try:
+            return var_ctx.run(func)
+        finally:
+            setattr(thread, _SCRIPT_CTX_ATTR, saved)
+
+    return run
+
+
+def run_parallel(tasks: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+    """
+    הרצת מספר פונקציות במקביל והמתנה לכולן
+
+    Args:
+        tasks: {שם: פונקציה ללא פרמטרים}
+
+    Returns:
+        dict: {שם: תוצאה}. חריגה באחת הפונקציות נזרקת לקורא (אחרי שכולן הסתיימו).
+    """
+    if len(tasks) <= 1:
+        return {name: func() for name, func in tasks.items()}
+
+    executor = get_executor()
+    futures = {name: executor.submit(_bind(func)) for name, func in tasks.items()}
+
+    # המתנה לכל ה-futures לפני זריקת חריגה, כדי שלא יישארו קריאות תלויות ברקע
+    for future in futures.values():
+        future.exception()
+
+    return {name: future.result() for name, future in futures.items()}
+
+
+def submit(func: Callable[[], Any]) -> Future:
+    """הרצת פונקציה אחת ברקע (עם ה-context של ה-session) - לקריאה מוקדמת של הנתונים הבאים"""
+    return get_executor().submit(_bind(func))
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Report Result Cache
+מטמון תוצאות דוחות משותף לכל המשתמשים
+
+מפתח המטמון: טווח תאריכים מנורמל + פילטרים שנשלחים לשרת + היקף הרשאות (מחלקות).
+טווח שכולל את היום מקבל TTL (הנתונים עדיין מתעדכנים), טווח היסטורי נשמר עד פינוי LRU.
+"""
+
+import threading
+from datetime import date, datetime
+from typing import Optional
+
+from config import config
+from utils.metrics import register_cache
+from utils.ttl_cache import TTLCache
+
+CONFIG = config.get()
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _count_documents(report_data) -> int:
+    """משקל רשומה במטמון = מספר המסמכים שבה"""
+    if isinstance(report_data, dict):
+        return max(len(report_data.get('documents', [])), 1)
+    return 1
+
+
+def get_report_cache() -> TTLCache:
+    """קבלת מטמון הדוחות המשותף (נוצר פעם אחת לכל תהליך)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTLCache(
+                    max_entries=CONFIG.get('REPORT_CACHE_MAX_ENTRIES', 64),
+                    max_weight=CONFIG.get('REPORT_CACHE_MAX_DOCUMENTS', 2000000),
+                    weigher=_count_documents
+                )
+                register_cache('report', _cache)
+    return _cache
+
+
+def normalize_scope(allowed_departments) -> tuple:
+    """נרמול היקף הרשאות למפתח - סדר המחלקות לא משנה"""
+    if allowed_departments == ["ALL"]:
+        return ("ALL",)
+    return tuple(sorted(set(allowed_departments or [])))
+
+
+def make_report_key(date_start: date, date_end: date, allowed_departments, **server_filters) -> tuple:
+    """
+    בניית מפתח מטמון לדוח
+
+    Args:
+        date_start: תאריך התחלה
+        date_end: תאריך סיום
+        allowed_departments: מחלקות מורשות של המשתמש (או ["ALL"])
+        **server_filters: פילטרים שנשלחים ל-API (maxrecords, username, portname...)
+
+    Returns:
+        tuple: מפתח hashable
+    """
+    filters = tuple(sorted((k, v) for k, v in server_filters.items() if v is not None))
+    return (
+        'history',
+        date_start.isoformat(),
+        date_end.isoformat(),
+        filters,
+        normalize_scope(allowed_departments)
+    )
+
+
+def report_ttl(date_end: date) -> Optional[float]:
+    """
+    זמן תפוגה לדוח לפי טווח התאריכים
+
+    טווח שמסתיים לפני היום הוא היסטוריה סגורה - ללא תפוגה.
+    טווח שכולל את היום מתעדכן כל הזמן - TTL קצר.
+    """
+    if date_end < datetime.now().date():
+        return None
+    return CONFIG.get('REPORT_CACHE_TTL', 300)
@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Monthly Report Precomputation
+חישוב מוקדם של דוחות החודש הקודם לכל מחלקה, בלילה, לתוך מאגר מקומי (SQLite)
+
+בתחילת כל חודש כל מנהלי המחלקות מפעילים את אותו דוח "חודש קודם" באותו בוקר,
+וכל אחד מהם מפצל אותו לשבועות מול ה-API. במקום זה החודש נשלף פעם אחת (עמודים
+לפי nextPageToken), המסמכים מחולקים לפי מחלקה ונשמרים דחוסים יחד עם סיכומים.
+דוח שהטווח שלו הוא בדיוק חודש שחושב מראש נקרא מהמאגר ולא מה-API.
+
+כל עמוד נכתב מיד לטבלת staging (שורה לכל מחלקה בעמוד) והסיכומים נצברים תוך כדי,
+כך שבזיכרון נמצא עמוד אחד בלבד ולא כל החודש. בסוף הריצה הנתונים מוחלפים בטרנזקציה אחת.
+
+    store = get_report_store()
+    documents = store.load_month('2026-09', allowed_departments)   # None = לא חושב
+    pages = store.iter_month_pages('2026-09', allowed_departments)  # עמוד אחרי עמוד (ייצוא)
+    precompute_month(api, store, '2026-09')
+
+    start_precompute_scheduler(SafeQAPI)                            # פעם אחת לכל תהליך
+"""
+
+import gzip
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+
+from config import config
+from utils.audit_retention import month_bounds, months_back
+from utils.history_export import iter_history_pages
+
+CONFIG = config.get()
+
+EXECUTED_STATUSES = (1, 5)  # הודפס, התקבל
+DEPARTMENT_SEPARATOR = '\x1f'
+
+
+def document_departments(doc: Dict) -> List[str]:
+    """תגיות המחלקה של מסמך (tagType 0)"""
+    return sorted({tag.get('name', '') for tag in doc.get('tags', []) if tag.get('tagType') == 0})
+
+
+def full_month_of_range(date_start: date, date_end: date, today: Optional[date] = None) -> Optional[str]:
+    """'YYYY-MM' אם הטווח הוא בדיוק חודש קלנדרי שלם שכבר הסתיים, אחרת None"""
+    today = today or datetime.now().date()
+    if date_start.day != 1:
+        return None
+    month = date_start.strftime('%Y-%m')
+    next_month = date.fromisoformat(month_bounds(month)[1])
+    if date_end != next_month - timedelta(days=1) or next_month > today:
+        return None
+    return month
+
+
+def department_key(doc: Dict) -> str:
+    """מפתח השורה של מסמך במאגר - צירוף תגיות המחלקה שלו"""
+    return DEPARTMENT_SEPARATOR.join(document_departments(doc))
+
+
+class RollupAccumulator:
+    """סיכום מסמכים שנצבר עמוד אחרי עמוד (נשמרים רק מונים ושמות המשתמשים)"""
+
+    def __init__(self):
+        self.documents = 0
+        self.executed = 0
+        self.pages = 0
+        self.color_pages = 0
+        self.users = set()
+
+    def add(self, documents: List[Dict]) -> 'RollupAccumulator':
+        for doc in documents:
+            self.documents += 1
+            self.users.add(doc.get('userName'))
+            if doc.get('status') in EXECUTED_STATUSES and doc.get('jobType') in ('PRINT', 'COPY'):
+                self.executed += 1
+                self.pages += doc.get('totalPages') or 0
+                self.color_pages += doc.get('colorPages') or 0
+        return self
+
+    def result(self) -> Dict:
+        return {
+            'documents': self.documents,
+            'executed': self.executed,
+            'pages': self.pages,
+            'color_pages': self.color_pages,
+            'users': len(self.users),
+        }
+
+
+def compute_rollup(documents: List[Dict]) -> Dict:
+    """סיכום מסמכים: כמויות, ועמודים של הדפסה/צילום שבוצעו בפועל"""
+    return RollupAccumulator().add(documents).result()
+
+
+def _pack(documents: List[Dict]) -> bytes:
+    return gzip.compress(json.dumps(documents, ensure_ascii=False, default=str).encode('utf-8'), compresslevel=5)
+
+
+class ReportStore:
+    """
+    מאגר הדוחות החודשיים שחושבו מראש
+
+    שורה לכל (חודש, מחלקות המסמך, עמוד API): המסמכים כ-JSON דחוס, וסיכום אחד לכל
+    (חודש, מחלקות). מסמך עם כמה תגיות מחלקה נשמר פעם אחת, תחת הצירוף שלהן.
+
+    כתיבה: begin_month -> stage_page לכל עמוד -> commit_month (החלפה אטומית).
+
+    Args:
+        db_path: קובץ SQLite (ברירת מחדל - מסד הביקורת)
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_schema(self):
+        with closing(self._connect()) as conn, conn:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(precomputed_reports)")}
+            if columns and 'part' not in columns:
+                # מבנה קודם (שורה אחת לכל מחלקה) - החודשים יחושבו מחדש בהרצה הבאה
+                conn.execute("DROP TABLE precomputed_reports")
+                conn.execute("DROP TABLE IF EXISTS precomputed_months")
+                print("[DEBUG] Report store: dropped old precomputed layout")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS precomputed_reports (
+                    month TEXT NOT NULL,
+                    departments TEXT NOT NULL,
+                    part INTEGER NOT NULL,
+                    documents BLOB NOT NULL,
+                    PRIMARY KEY (month, departments, part)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS precomputed_staging (
+                    month TEXT NOT NULL,
+                    run TEXT NOT NULL,
+                    departments TEXT NOT NULL,
+                    part INTEGER NOT NULL,
+                    documents BLOB NOT NULL,
+                    PRIMARY KEY (month, run, departments, part)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS precomputed_rollups (
+                    month TEXT NOT NULL,
+                    departments TEXT NOT NULL,
+                    rollup TEXT NOT NULL,
+                    PRIMARY KEY (month, departments)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS precomputed_months (
+                    month TEXT PRIMARY KEY,
+                    computed_at TEXT NOT NULL,
+                    duration REAL NOT NULL,
+                    rollup TEXT NOT NULL
+                )
+            ''')
+
+    @staticmethod
+    def begin_month(month: str) -> str:
+        """
+        מזהה ריצה חדש לכתיבת חודש - ריצות מקבילות (שרת ו-CLI) לא מתערבבות ב-staging
+
+        ריצה שנכשלה מוחקת את ה-staging שלה (abort_month); שאריות של תהליך שנהרג נמחקות ב-prune.
+        """
+        return uuid.uuid4().hex
+
+    def stage_page(self, month: str, run: str, part: int, groups: Dict[str, List[Dict]]):
+        """כתיבת עמוד אחד, מחולק לפי מחלקות ({מפתח מחלקות: מסמכים}), ל-staging"""
+        with closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT INTO precomputed_staging (month, run, departments, part, documents) VALUES (?, ?, ?, ?, ?)",
+                [(month, run, key, part, _pack(docs)) for key, docs in groups.items()]
+            )
+
+    def commit_month(self, month: str, run: str, rollups: Dict[str, Dict], month_rollup: Dict,
+                     duration: float = 0.0):
+        """החלפת נתוני החודש בנתוני הריצה (טרנזקציה אחת - קוראים רואים את הישן או את החדש)"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM precomputed_reports WHERE month = ?", (month,))
+            conn.execute(
+                "INSERT INTO precomputed_reports (month, departments, part, documents) "
+                "SELECT month, departments, part, documents FROM precomputed_staging WHERE month = ? AND run = ?",
+                (month, run)
+            )
+            conn.execute("DELETE FROM precomputed_staging WHERE month = ? AND run = ?", (month, run))
+            conn.execute("DELETE FROM precomputed_rollups WHERE month = ?", (month,))
+            conn.executemany(
+                "INSERT INTO precomputed_rollups VALUES (?, ?, ?)",
+                [(month, key, json.dumps(rollup, ensure_ascii=False)) for key, rollup in rollups.items()]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO precomputed_months VALUES (?, ?, ?, ?)",
+                (month, datetime.now().isoformat(timespec='seconds'), duration,
+                 json.dumps(month_rollup, ensure_ascii=False))
+            )
+
+    def abort_month(self, month: str, run: str):
+        """מחיקת ה-staging של ריצה שנכשלה"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM precomputed_staging WHERE month = ? AND run = ?", (month, run))
+
+    def save_month(self, month: str, documents: List[Dict], duration: float = 0.0):
+        """החלפת כל נתוני החודש מרשימת מסמכים אחת (לחודשים קטנים; החישוב הלילי כותב עמוד-עמוד)"""
+        groups: Dict[str, List[Dict]] = {}
+        for doc in documents:
+            groups.setdefault(department_key(doc), []).append(doc)
+        run = self.begin_month(month)
+        self.stage_page(month, run, 0, groups)
+        self.commit_month(month, run, {key: compute_rollup(docs) for key, docs in groups.items()},
+                          compute_rollup(documents), duration)
+
+    def has_month(self, month: str) -> bool:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT 1 FROM precomputed_months WHERE month = ?", (month,)).fetchone() is not None
+
+    def months(self) -> List[Dict]:
+        """החודשים שחושבו (מהחדש לישן) עם זמן החישוב והסיכום הכולל"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT month, computed_at, duration, rollup FROM precomputed_months ORDER BY month DESC"
+            ).fetchall()
+        return [{'month': month, 'computed_at': computed_at, 'duration': duration, **json.loads(rollup)}
+                for month, computed_at, duration, rollup in rows]
+
+    @staticmethod
+    def _in_scope(key: str, allowed_departments: list) -> bool:
+        if allowed_departments == ["ALL"]:
+            return True
+        return bool(key) and not set(key.split(DEPARTMENT_SEPARATOR)).isdisjoint(allowed_departments or [])
+
+    def load_month(self, month: str, allowed_departments: list) -> Optional[List[Dict]]:
+        """
+        מסמכי החודש בהיקף ההרשאות (כמו filter_documents_by_departments)
+
+        Returns:
+            list: המסמכים, או None אם החודש לא חושב מראש
+        """
+        pages = self.iter_month_pages(month, allowed_departments)
+        if pages is None:
+            return None
+
+        documents = [doc for page in pages for doc in page]
+        documents.sort(key=lambda doc: doc.get('dateTime') or 0, reverse=True)
+        return documents
+
+    def iter_month_pages(self, month: str, allowed_departments: list) -> Optional[Iterator[List[Dict]]]:
+        """
+        מסמכי החודש בהיקף ההרשאות, עמוד אחרי עמוד (part) - לייצוא בלי לפרוס את כל החודש בזיכרון
+
+        Returns:
+            iterator של רשימות מסמכים (לפי סדר השליפה), או None אם החודש לא חושב מראש
+        """
+        with closing(self._connect()) as conn:
+            if conn.execute("SELECT 1 FROM precomputed_months WHERE month = ?", (month,)).fetchone() is None:
+                return None
+            parts = [row[0] for row in conn.execute(
+                "SELECT DISTINCT part FROM precomputed_reports WHERE month = ? ORDER BY part", (month,)
+            )]
+
+        def pages() -> Iterator[List[Dict]]:
+            with closing(self._connect()) as conn:
+                for part in parts:
+                    page = []
+                    for key, blob in conn.execute(
+                        "SELECT departments, documents FROM precomputed_reports WHERE month = ? AND part = ?",
+                        (month, part)
+                    ):
+                        if self._in_scope(key, allowed_departments):
+                            page.extend(json.loads(gzip.decompress(blob).decode('utf-8')))
+                    if page:
+                        page.sort(key=lambda doc: doc.get('dateTime') or 0, reverse=True)
+                        yield page
+
+        return pages()
+
+    def rollups(self, month: str, allowed_departments: list) -> Dict[str, Dict]:
+        """סיכומי החודש לפי מחלקה ({מחלקה: סיכום}); מסמך רב-מחלקתי נספר בכל אחת מהן"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT departments, rollup FROM precomputed_rollups WHERE month = ?", (month,)
+            ).fetchall()
+
+        totals: Dict[str, Dict] = {}
+        for key, rollup in rows:
+            for department in key.split(DEPARTMENT_SEPARATOR) if key else ['']:
+                if allowed_departments != ["ALL"] and department not in allowed_departments:
+                    continue
+                target = totals.setdefault(department, {})
+                for field, value in json.loads(rollup).items():
+                    target[field] = target.get(field, 0) + value
+        return totals
+
+    def prune(self, keep_months: int, today: Optional[date] = None):
+        """מחיקת חודשים ישנים מ-keep_months חודשים אחורה"""
+        cutoff = months_back(today or datetime.now().date(), keep_months).strftime('%Y-%m')
+        with closing(self._connect()) as conn, conn:
+            for table in ('precomputed_reports', 'precomputed_staging', 'precomputed_rollups', 'precomputed_months'):
+                conn.execute(f"DELETE FROM {table} WHERE month < ?", (cutoff,))
+
+
+def precompute_month(api, store: ReportStore, month: str,
+                     progress: Optional[Callable[[int], None]] = None) -> Dict:
+    """
+    שליפת כל מסמכי החודש (כל הסטטוסים והמחלקות) ושמירתם במאגר
+
+    Args:
+        month: 'YYYY-MM' - חודש שהסתיים
+        progress: נקרא עם מספר המסמכים שנשלפו אחרי כל עמוד
+
+    Returns:
+        dict: סיכום החודש (compute_rollup) + duration
+    """
+    start, end = month_bounds(month)
+    date_start = date.fromisoformat(start)
+    date_end = date.fromisoformat(end) - timedelta(days=1)
+
+    started = time.monotonic()
+    run = store.begin_month(month)
+    total = RollupAccumulator()
+    by_department: Dict[str, RollupAccumulator] = {}
+    try:
+        for part, page in enumerate(iter_history_pages(api, date_start, date_end)):
+            groups: Dict[str, List[Dict]] = {}
+            for doc in page:
+                groups.setdefault(department_key(doc), []).append(doc)
+            for key, docs in groups.items():
+                by_department.setdefault(key, RollupAccumulator()).add(docs)
+            total.add(page)
+            store.stage_page(month, run, part, groups)
+            if progress:
+                progress(total.documents)
+
+        duration = time.monotonic() - started
+        store.commit_month(month, run, {key: acc.result() for key, acc in by_department.items()},
+                           total.result(), duration)
+    except BaseException:
+        store.abort_month(month, run)
+        raise
+
+    print(f"[DEBUG] Precomputed report {month}: {total.documents} documents in {duration:.1f}s")
+    return dict(total.result(), duration=duration)
+
+
+class PrecomputeScheduler:
+    """
+    חישוב החודש הקודם פעם אחת, אחרי השעה המוגדרת (ברירת מחדל - הלילה שאחרי סוף החודש)
+
+    Args:
+        store: מאגר הדוחות
+        api_factory: יוצר API חדש לכל הרצה (לא תלוי ב-session)
+        hour: השעה המקומית שממנה מותר לחשב
+        keep_months: כמה חודשים לשמור במאגר
+        retry_interval: המתנה בשניות אחרי כשל לפני ניסיון נוסף
+    """
+
+    def __init__(self, store: ReportStore, api_factory: Callable[[], object], hour: int = 2,
+                 keep_months: int = 13, retry_interval: float = 1800):
+        self.store = store
+        self.api_factory = api_factory
+        self.hour = hour
+        self.keep_months = keep_months
+        self.retry_interval = retry_interval
+        self._next_attempt = 0.0
+        self.last_result: Optional[Dict] = None
+
+    def due_month(self, now: Optional[datetime] = None) -> Optional[str]:
+        """החודש שצריך לחשב עכשיו, או None"""
+        now = now or datetime.now()
+        if now.hour < self.hour or time.monotonic() < self._next_attempt:
+            return None
+        month = months_back(now.date(), 1).strftime('%Y-%m')
+        return None if self.store.has_month(month) else month
+
+    def maybe_run(self, now: Optional[datetime] = None) -> Optional[Dict]:
+        """חישוב החודש הקודם אם הגיע הזמן ועוד לא חושב"""
+        month = self.due_month(now)
+        if month is None:
+            return None
+        try:
+            self.last_result = precompute_month(self.api_factory(), self.store, month)
+            self.store.prune(self.keep_months)
+        except Exception as e:
+            print(f"[ERROR] Report precomputation for {month} failed: {str(e)}")
+            self._next_attempt = time.monotonic() + self.retry_interval
+            self.last_result = None
+        return self.last_result
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_report_store() -> ReportStore:
+    """המאגר המשותף (אחד לכל תהליך)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReportStore(CONFIG.get('REPORT_STORE_PATH') or CONFIG.get('DATABASE_PATH', 'safeq_audit.db'))
+    return _store
+
+
+_scheduler_thread = None
+_scheduler_lock = threading.Lock()
+
+
+def start_precompute_scheduler(api_factory: Callable[[], object]) -> Optional[threading.Thread]:
+    """הפעלת thread החישוב הלילי (פעם אחת לכל תהליך; בטוח לקריאה בכל ריצה)"""
+    global _scheduler_thread
+    if not CONFIG.get('REPORT_PRECOMPUTE_ENABLED', True):
+        return None
+    if _scheduler_thread is None:
+        with _scheduler_lock:
+            if _scheduler_thread is None:
+                scheduler = PrecomputeScheduler(
+                    get_report_store(),
+                    api_factory,
+                    hour=CONFIG.get('REPORT_PRECOMPUTE_HOUR', 2),
+                    keep_months=CONFIG.get('REPORT_PRECOMPUTE_KEEP_MONTHS', 13)
+                )
+                interval = CONFIG.get('REPORT_PRECOMPUTE_CHECK_INTERVAL', 300)
+
+                def loop():
+                    while True:
+                        scheduler.maybe_run()
+                        time.sleep(interval)
+
+                _scheduler_thread = threading.Thread(target=loop, name='report-precompute', daemon=True)
+                _scheduler_thread.start()
+                print(f"[DEBUG] Report precompute scheduler started (after {scheduler.hour:02d}:00)")
+    return _scheduler_thread
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - TTL / LRU Cache
+מטמון ברמת התהליך (משותף לכל ה-sessions) עם פינוי LRU ותפוגה לפי זמן
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+_DEFAULT_TTL = object()
+
+
+class TTLCache:
+    """
+    מטמון thread-safe עם הגבלת גודל ותפוגה אופציונלית לכל רשומה
+
+    Args:
+        max_entries: מספר רשומות מקסימלי (LRU)
+        max_weight: משקל כולל מקסימלי (אופציונלי, לפי weigher)
+        default_ttl: זמן תפוגה ברירת מחדל בשניות (None = ללא תפוגה)
+        weigher: פונקציה שמחזירה משקל של ערך (ברירת מחדל: 1)
+    """
+
+    def __init__(self, max_entries: int = 128, max_weight: Optional[int] = None,
+                 default_ttl: Optional[float] = None,
+                 weigher: Optional[Callable[[Any], int]] = None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.default_ttl = default_ttl
+        self._weigher = weigher or (lambda value: 1)
+
+        # key -> (value, expires_at or None, weight)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._weight = 0
+        self._lock = threading.RLock()
+        self._inflight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def _remove(self, key):
+        _, _, weight = self._data.pop(key)
+        self._weight -= weight
+
+    def _lookup(self, key):
+        """שליפה ללא עדכון מונים - מחזיר _MISSING אם לא קיים או פג תוקף"""
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+
+        value, expires_at, _ = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            return _MISSING
+
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """קבלת ערך מהמטמון (מעדכן סדר LRU)"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """קבלת ערך בלי לעדכן את מוני hit/miss (למי שכבר נספר בקריאה קודמת)"""
+        with self._lock:
+            value = self._lookup(key)
+            return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: Any = _DEFAULT_TTL) -> bool:
+        """
+        שמירת ערך במטמון
+
+        Returns:
+            bool: False אם הערך כבד מדי ולא נשמר
+        """
+        if ttl is _DEFAULT_TTL:
+            ttl = self.default_ttl
+
+        weight = self._weigher(value)
+        if self.max_weight is not None and weight > self.max_weight:
+            return False
+
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+            self._data[key] = (value, expires_at, weight)
+            self._weight += weight
+
+            # פינוי LRU עד שחוזרים לגבולות
+            while self._data and (
+                len(self._data) > self.max_entries or
+                (self.max_weight is not None and self._weight > self.max_weight)
+            ):
+                oldest_key = next(iter(self._data))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+        return True
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """הסרת ערך מהמטמון והחזרתו"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                return default
+            self._remove(key)
+            return value
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any], ttl: Any = _DEFAULT_TTL) -> Any:
+        """
+        קבלת ערך מהמטמון או חישובו פעם אחת בלבד
+
+        בקשות מקבילות לאותו מפתח ממתינות לחישוב הראשון במקום לחשב שוב.
+        ערך None לא נשמר (נחשב כשלון).
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # ייתכן שבקשה מקבילה כבר חישבה את הערך בזמן שהמתנו
+            with self._lock:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self.hits += 1
+                    return value
+                self.misses += 1
+
+            try:
+                value = factory()
+                if value is not None:
+                    self.set(key, value, ttl)
+                return value
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+    def clear(self):
+        """ניקוי כל המטמון"""
+        with self._lock:
+            self._data.clear()
+            self._weight = 0
+
+    def stats(self) -> dict:
+        """סטטיסטיקות שימוש במטמון"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'weight': self._weight,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': (self.hits / total) if total else 0.0
+            }
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Benchmarks
+מדידת זמן וזיכרון שיא של פונקציות עיבוד הנתונים החמות, על נתונים סינתטיים
+דטרמיניסטיים (tools/safeq_simulator.py) בכמה גדלים.
+
+פונקציות שקוראות ל-API (validate_excel_data) רצות מול הסימולטור המקומי.
+
+הרצה (מתיקיית הפרויקט, עם requirements.txt מותקן):
+    python benchmarks/run_benchmarks.py                          # small + medium
+    python benchmarks/run_benchmarks.py --sizes small,medium,large --repeat 7
+    python benchmarks/run_benchmarks.py --only dashboard,excel
+
+שמירת baseline והשוואה אליו (יציאה עם קוד 1 אם יש רגרסיה):
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json --threshold 0.25
+
+ה-baseline תלוי מכונה - יש ליצור אותו על המכונה שמריצה את ההשוואה.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'app'))
+sys.path.insert(0, str(ROOT / 'tools'))
+
+from safeq_simulator import Tenant, start_simulator  # noqa: E402
+
+SIZE_LEVELS = ('small', 'medium', 'large')
+
+
+class Case(NamedTuple):
+    """
+    מקרה מדידה
+
+    sizes: גודל הנתונים לכל רמה
+    setup: size -> factory; ה-factory מחזיר args טריים לכל הרצה (לפונקציות שמשנות את הקלט)
+    """
+    name: str
+    sizes: Dict[str, int]
+    setup: Callable[[int], Callable[[], tuple]]
+    func: Callable
+
+
+def _tenant(size: int, seed: int) -> Tenant:
+    return Tenant(users=max(size // 10, 100), groups=max(size // 100, 20), documents=size,
+                  departments=50, days=30, seed=seed)
+
+
+def build_cases(seed: int, api_factory: Callable) -> List[Case]:
+    """כל מקרי המדידה (ייבוא מודולי האפליקציה נעשה כאן, אחרי הגדרת הסביבה)"""
+    import pandas as pd
+    from permissions import extract_departments_from_groups, filter_users_by_departments
+    from pages.reports.reports import (
+        prepare_history_dataframe, filter_history_dataframe, compute_dashboard_stats,
+        compute_document_statistics, filter_documents_by_departments
+    )
+    from utils.excel_export import dataframe_fingerprint, export_to_excel
+    from pages.users.search_edit import build_search_regex, match_users
+    from pages.users.bulk_upload_users import validate_excel_data
+
+    def documents(size):
+        tenant = _tenant(size, seed)
+        return [tenant.document(i) for i in range(size)]
+
+    def users(size):
+        tenant = Tenant(users=size, departments=50, seed=seed)
+        return [tenant.get_user(tenant.username(i)) for i in range(size)]
+
+    def allowed_departments(count=10):
+        tenant = Tenant(departments=50, seed=seed)
+        return [tenant.department_name(i) for i in range(count)]
+
+    def history_df(size):
+        return prepare_history_dataframe(documents(size))
+
+    def setup_prepare(size):
+        docs = documents(size)
+        return lambda: (docs,)
+
+    def setup_filter_df(size):
+        df = history_df(size)
+        dept = allowed_departments(1)[0]
+        filters = {'search': 'PRN-001', 'source': 'הכל', 'jobtype': 'הדפסה', 'status': 'הכל', 'dept': dept}
+        return lambda: (df, filters)
+
+    def setup_dashboard(size):
+        df = history_df(size)
+        return lambda: (df,)
+
+    def setup_statistics(size):
+        docs = [doc for doc in documents(size) if doc.get('status') in [1, 5]]
+        return lambda: (docs,)
+
+    def setup_filter_documents(size):
+        docs = documents(size)
+        allowed = allowed_departments()
+        return lambda: (docs, allowed)
+
+    def setup_excel(size):
+        df = history_df(size)
+        return lambda: (df, 'דוח')
+
+    def setup_filter_users(size):
+        all_users = users(size)
+        allowed = allowed_departments()
+        return lambda: (all_users, allowed)
+
+    def setup_extract_departments(size):
+        tenant = Tenant(groups=size, departments=size, seed=seed)
+        # חצי קבוצות בפורמט מחלקה, חצי קבוצות אחרות
+        groups = [{'groupName': tenant.department_name(i) if i % 2 else tenant.group_name(i)} for i in range(size)]
+        return lambda: (groups,)
+
+    def setup_search(size):
+        all_users = users(size)
+        regex = build_search_regex('*00*@school*', partial_search=True)
+        return lambda: (all_users, 'Email', '*00*@school*', True, size, regex)
+
+    def setup_validate(size):
+        tenant = Tenant(users=size, seed=seed + 1)
+        rows = [{
+            'username': f"bench{i:05d}",
+            'full_name': f"משתמש בדיקה {i}",
+            'email': f"bench{i:05d}@school.example",
+            'password': 'Aa123456!',
+            'shortid': f"{900000 + i}",
+            'department': tenant.department_name(i % 50),
+        } for i in range(size)]
+        api = api_factory()
+        return lambda: (pd.DataFrame(rows, dtype=str), api)
+
+    return [
+        Case('prepare_history_dataframe', {'small': 1000, 'medium': 10000, 'large': 100000},
+             setup_prepare, prepare_history_dataframe),
+        Case('filter_history_dataframe', {'small': 1000, 'medium': 10000, 'large': 100000},
+             setup_filter_df, filter_history_dataframe),
+        Case('compute_dashboard_stats', {'small': 1000, 'medium': 10000, 'large': 100000},
+             setup_dashboard, compute_dashboard_stats),
+        Case('compute_document_statistics', {'small': 1000, 'medium': 10000, 'large': 100000},
+             setup_statistics, compute_document_statistics),
+        Case('filter_documents_by_departments', {'small': 1000, 'medium': 10000, 'large': 100000},
+             setup_filter_documents, filter_documents_by_departments),
+        Case('export_to_excel', {'small': 1000, 'medium': 10000, 'large': 50000},
+             setup_excel, export_to_excel),
+        Case('dataframe_fingerprint', {'small': 1000, 'medium': 10000, 'large': 100000},
+             setup_excel, dataframe_fingerprint),
+        Case('filter_users_by_departments', {'small': 1000, 'medium': 10000, 'large': 50000},
+             setup_filter_users, filter_users_by_departments),
+        Case('extract_departments_from_groups', {'small': 100, 'medium': 1000, 'large': 5000},
+             setup_extract_departments, extract_departments_from_groups),
+        Case('match_users', {'small': 500, 'medium': 5000, 'large': 50000},
+             setup_search, match_users),
+        Case('validate_excel_data', {'small': 10, 'medium': 50, 'large': 200},
+             setup_validate, validate_excel_data),
+    ]
+
+
+def measure(case: Case, size: int, repeat: int) -> Dict:
+    """זמן (חציון/מינימום על repeat הרצות) וזיכרון שיא (הרצה נפרדת תחת tracemalloc)"""
+    factory = case.setup(size)
+
+    times = []
+    for _ in range(repeat):
+        args = factory()
+        gc.collect()
+        start = time.perf_counter()
+        case.func(*args)
+        times.append(time.perf_counter() - start)
+
+    # הקלט נוצר לפני tracemalloc - נמדדות רק ההקצאות של הפונקציה עצמה
+    args = factory()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case.func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'size': size,
+        'median_s': statistics.median(times),
+        'min_s': min(times),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(results: Dict, baseline: Dict, threshold: float, min_delta_s: float = 0.002) -> List[str]:
+    """רגרסיות מול baseline: זמן חציוני או זיכרון שיא גבוהים ביותר מ-threshold"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        slower = current['median_s'] / previous['median_s'] if previous['median_s'] else 1.0
+        if slower > 1 + threshold and current['median_s'] - previous['median_s'] > min_delta_s:
+            regressions.append(f"{key}: time {previous['median_s'] * 1000:.1f}ms -> "
+                               f"{current['median_s'] * 1000:.1f}ms (x{slower:.2f})")
+        heavier = current['peak_kib'] / previous['peak_kib'] if previous['peak_kib'] else 1.0
+        if heavier > 1 + threshold and current['peak_kib'] - previous['peak_kib'] > 64:
+            regressions.append(f"{key}: peak memory {previous['peak_kib']:.0f}KiB -> "
+                               f"{current['peak_kib']:.0f}KiB (x{heavier:.2f})")
+    return regressions
+
+
+def _environment() -> Dict:
+    import pandas as pd
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='SafeQ Cloud Manager benchmarks')
+    parser.add_argument('--sizes', default='small,medium', help=f"רמות גודל מתוך {','.join(SIZE_LEVELS)}")
+    parser.add_argument('--only', default='', help='הרצת מקרים ששמם מכיל אחד מהערכים (מופרדים בפסיקים)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='שמירת התוצאות ל-JSON')
+    parser.add_argument('--save-baseline', help='שמירת התוצאות כ-baseline')
+    parser.add_argument('--compare', help='השוואה ל-baseline קיים')
+    parser.add_argument('--threshold', type=float, default=0.25, help='האטה/גידול מותרים (0.25 = 25%%)')
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    levels = [level.strip() for level in args.sizes.split(',') if level.strip()]
+    unknown = [level for level in levels if level not in SIZE_LEVELS]
+    if unknown:
+        print(f"Unknown size level: {', '.join(unknown)}")
+        return 2
+
+    # הסימולטור עולה לפני ייבוא האפליקציה, כי config נטען פעם אחת בייבוא
+    simulator = start_simulator(Tenant(users=4000, seed=args.seed), api_key='benchmark')
+    os.environ['SERVER_URL'] = simulator.url
+    os.environ['API_KEY'] = 'benchmark'
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+
+    from shared import SafeQAPI
+
+    only = [name.strip() for name in args.only.split(',') if name.strip()]
+    cases = [case for case in build_cases(args.seed, SafeQAPI)
+             if not only or any(name in case.name for name in only)]
+
+    results = {}
+    print(f"{'case':<48} {'size':>8} {'median':>10} {'min':>10} {'peak':>12}")
+    try:
+        for case in cases:
+            for level in levels:
+                size = case.sizes[level]
+                result = measure(case, size, args.repeat)
+                key = f"{case.name}[{level}]"
+                results[key] = result
+                print(f"{key:<48} {size:>8} {result['median_s'] * 1000:>8.1f}ms "
+                      f"{result['min_s'] * 1000:>8.1f}ms {result['peak_kib']:>9.0f}KiB")
+    finally:
+        simulator.shutdown()
+
+    report = {'environment': _environment(), 'repeat': args.repeat, 'results': results}
+    for path in (args.output, args.save_baseline):
+        if path:
+            Path(path).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+            print(f"Saved {path}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding='utf-8'))
+        regressions = compare(results, baseline.get('results', {}), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.compare}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions against {args.compare} (threshold {args.threshold:.0%})")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
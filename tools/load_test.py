@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud Manager - Load Test
+סימולציה של N סשנים מקבילים של Streamlit מול סימולטור SafeQ מקומי
+(tools/safeq_simulator.py), בתרחישים מציאותיים:
+
+    מנהל בית ספר: התחברות (משתמש ענן) -> דוח 30 יום -> ייצוא
+    מנהל מערכת:   התחברות (משתמש חירום) -> רשימת משתמשים -> חיפוש
+
+כל סשן הוא AppTest נפרד (session_state נפרד), וכל הסשנים רצים באותו תהליך -
+כמו בשרת Streamlit אמיתי - כך שהמטמונים המשותפים (דוחות, הרשאות) נמדדים כמו בייצור.
+
+הפלט: throughput, אחוזוני זמן rerun לכל שלב, זיכרון לסשן וספירת קריאות ל-API.
+
+הרצה (מתיקיית הפרויקט, עם requirements.txt מותקן):
+    python tools/load_test.py --sessions 20
+    python tools/load_test.py --sessions 50 --iterations 3 --ramp-up 10 --latency-ms 40
+    python tools/load_test.py --sessions 10 --json results.json
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import pickle
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT / 'app'
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(ROOT / 'tools'))
+
+from safeq_simulator import Faults, Tenant, start_simulator  # noqa: E402
+
+ADMIN_USER = 'loadadmin'
+ADMIN_PASSWORD = 'load-test-password'
+API_KEY = 'load-test'
+
+PAGE_KEY = '_load_test_page'
+
+
+def _driver(app_dir: str):
+    """
+    סקריפט ה-AppTest: אותה זרימה של main.py (init -> login -> page), אבל הדף
+    נבחר לפי session_state ולא דרך st.navigation - AppTest לא יכול לעבור בין
+    st.Page שמוגדרים כפונקציות.
+    """
+    import sys
+    if app_dir not in sys.path:
+        sys.path.insert(0, app_dir)
+
+    import streamlit as st
+    from main_utils import init_session_state, is_session_valid, show_login_page
+    from utils.instrumentation import rerun_trace
+    from utils.page_loader import load_page
+
+    with rerun_trace('load_test'):
+        init_session_state()
+        if not (st.session_state.logged_in and is_session_valid()):
+            show_login_page()
+        else:
+            # בלי דף נבחר (מיד אחרי ההתחברות) לא מוצג דף - כמו מסך הפתיחה
+            page = st.session_state.get('_load_test_page')
+            if page:
+                load_page(page)()
+
+
+def _share_runtime():
+    """
+    AppTest מציב Runtime מדומה גלובלי בתחילת כל ריצה ומאפס אותו בסופה, כך שסשן
+    אחד שמסיים מאפס את ה-Runtime של סשן שעדיין רץ ("Runtime hasn't been created").
+    כאן Runtime.instance נופל בחזרה ל-Runtime המדומה האחרון שהוצב.
+    """
+    from streamlit.runtime import Runtime
+
+    if getattr(Runtime, '_load_test_shared', False):
+        return
+    original_instance = Runtime.instance.__func__
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last['runtime'] = cls._instance
+            return cls._instance
+        if 'runtime' in last:
+            return last['runtime']
+        return original_instance(cls)
+
+    def exists(cls):
+        return cls._instance is not None or 'runtime' in last
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(exists)
+    Runtime._load_test_shared = True
+
+
+class SessionResult:
+    """תוצאות סשן אחד: זמני rerun לכל שלב, שגיאות וגודל ה-session_state"""
+
+    def __init__(self, index: int, persona: str):
+        self.index = index
+        self.persona = persona
+        self.steps: Dict[str, List[float]] = {}
+        self.errors: List[str] = []
+        self.state_bytes = 0
+        self.app = None
+
+    def add(self, step: str, seconds: float):
+        self.steps.setdefault(step, []).append(seconds)
+
+
+class LoadSession:
+    """סשן Streamlit בודד שמריץ תרחיש לפי persona"""
+
+    def __init__(self, index: int, persona: str, username: str, password: str, timeout: float):
+        from streamlit.testing.v1 import AppTest
+
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.poll_interval = 0.2
+        self.result = SessionResult(index, persona)
+        self.app = AppTest.from_function(_driver, args=(str(APP_DIR),), default_timeout=timeout)
+        self.result.app = self.app
+
+    # --- עזרי AppTest ---
+
+    def _timed(self, step: str, action):
+        start = time.perf_counter()
+        try:
+            action()
+        except Exception as e:
+            self.result.errors.append(f"{step}: {type(e).__name__}: {e}")
+            return
+        self.result.add(step, time.perf_counter() - start)
+        if self.app.exception:
+            self.result.errors.append(f"{step}: {self.app.exception[0].message}")
+
+    def _button(self, label: str = None, key: str = None):
+        # כפתורי submit של טפסים נכללים ב-app.button
+        for button in self.app.button:
+            if key and getattr(button, 'key', None) == key:
+                return button
+            if label and label in (button.label or ''):
+                return button
+        return None
+
+    def _open(self, step: str, page: str):
+        self.app.session_state[PAGE_KEY] = page
+        self._timed(step, self.app.run)
+
+    def _click(self, step: str, label: str = None, key: str = None) -> bool:
+        button = self._button(label, key)
+        if button is None:
+            return False
+        self._timed(step, lambda: button.click().run())
+        return True
+
+    # --- שלבי התרחיש ---
+
+    def login(self):
+        self._timed('open', self.app.run)
+        if len(self.app.text_input) < 2:
+            self.result.errors.append('login: login form not rendered')
+            return
+        self.app.text_input[0].input(self.username)
+        self.app.text_input[1].input(self.password)
+        if not self._click('login', label='התחבר'):
+            self.result.errors.append('login: submit button not found')
+        elif not self.app.session_state['logged_in']:
+            self.result.errors.append(f"login: {self.username} was not logged in")
+
+    def monthly_report(self):
+        self._open('reports', 'pages.reports')
+        selects = [s for s in self.app.selectbox if s.key == 'quick_filter_select']
+        if selects:
+            self._timed('report_filter', lambda: selects[0].set_value("📅 30 ימים אחרונים").run())
+        start = time.perf_counter()
+        if not self._click('report_submit', label='הצג דוח'):
+            self.result.errors.append('report: search button not found')
+            return
+        # הדוח נטען בעבודת רקע - הדף נבדק שוב (כמו ה-fragment) עד שהתוצאות מוצגות
+        deadline = start + self.timeout
+        while 'report_job_id' in self.app.session_state:
+            if time.perf_counter() > deadline:
+                self.result.errors.append('report: job did not finish in time')
+                return
+            time.sleep(self.poll_interval)
+            self._timed('report_poll', self.app.run)
+        self.result.add('report', time.perf_counter() - start)
+
+    def export(self):
+        # כפתור הכנה (אם קיים) מייצר את הקובץ; אחרת לחיצה על הורדה = rerun נוסף
+        if not self._click('export', label='Excel'):
+            self._timed('export', self.app.run)
+
+    def list_users(self):
+        self._open('users_page', 'pages.users.user_list')
+        self._click('users_load', key='load_users_main')
+
+    def search_users(self, term: str):
+        self._open('search_page', 'pages.users.search_edit')
+        inputs = [t for t in self.app.text_input if t.key == 'search_term_input']
+        if inputs:
+            inputs[0].input(term)
+        self._click('search', key='search_users_btn')
+
+    def run(self, iterations: int, search_term: str) -> SessionResult:
+        self.login()
+        if self.result.errors:
+            return self.result
+        for _ in range(iterations):
+            if self.result.persona == 'manager':
+                self.monthly_report()
+                self.export()
+            else:
+                self.list_users()
+                self.search_users(search_term)
+        return self.result
+
+
+def _rss_bytes() -> int:
+    """RSS של התהליך (Linux); 0 אם לא זמין"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _session_state_bytes(app) -> int:
+    """גודל ה-session_state של סשן (pickle לכל מפתח; מפתחות שאינם ניתנים ל-pickle מדולגים)"""
+    state = app.session_state
+    # גרסאות חדשות עוטפות את SafeSessionState במיפוי (keys()), ישנות חושפות אותו ישירות
+    keys = list(state.keys()) if hasattr(state, 'keys') else list(state.filtered_state.keys())
+    total = 0
+    for key in keys:
+        try:
+            total += len(pickle.dumps(state[key], protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            continue
+    return total
+
+
+def _percentiles(samples: List[float]) -> Dict:
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 1)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.mean(ordered) * 1000, 1),
+        'p50_ms': pick(50),
+        'p95_ms': pick(95),
+        'p99_ms': pick(99),
+        'max_ms': round(ordered[-1] * 1000, 1),
+    }
+
+
+def _personas(sessions: int, admin_ratio: float, tenant: Tenant) -> List[Dict]:
+    """חלוקת הסשנים ל-admin/manager; מנהלי בתי ספר הם משתמשים מקומיים שונים מהענן"""
+    admins = int(round(sessions * admin_ratio))
+    personas = []
+    for i in range(sessions):
+        if i < admins:
+            personas.append({'persona': 'admin', 'username': ADMIN_USER, 'password': ADMIN_PASSWORD})
+        else:
+            # משתמשים מקומיים בסימולטור: אינדקסים שמתחלקים ב-4 (חברי Reports-View)
+            index = (i * 4) % tenant.user_count
+            username = tenant.username(index)
+            personas.append({'persona': 'manager', 'username': username,
+                             'password': tenant.get_user(username)['cards'][0]})
+    return personas
+
+
+def run_load_test(args) -> Dict:
+    tenant = Tenant(users=args.users, documents=args.documents, departments=args.departments,
+                    days=args.days, seed=args.seed)
+    faults = Faults(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=args.seed)
+    simulator = start_simulator(tenant, faults, api_key=API_KEY)
+    workdir = tempfile.mkdtemp(prefix='safeq-load-')
+
+    # config נטען פעם אחת בייבוא הראשון - הסביבה מוגדרת לפני שהאפליקציה נטענת
+    os.environ.update({
+        'SERVER_URL': simulator.url,
+        'API_KEY': API_KEY,
+        'USE_ENTRA_ID': 'false',
+        f'EMERGENCY_USER_{ADMIN_USER}': ADMIN_PASSWORD,
+        'DATABASE_PATH': os.path.join(workdir, 'audit.db'),
+        'AUDIT_LOG_PATH': os.path.join(workdir, 'audit.log'),
+        'JOBS_DIR': os.path.join(workdir, 'jobs'),
+        'METRICS_ENABLED': 'false',
+        'REPORT_PRECOMPUTE_ENABLED': 'false',
+    })
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    _share_runtime()
+
+    personas = _personas(args.sessions, args.admin_ratio, tenant)
+    delay = args.ramp_up / args.sessions if args.sessions else 0
+
+    def worker(index: int) -> SessionResult:
+        time.sleep(index * delay)
+        spec = personas[index]
+        session = LoadSession(index, spec['persona'], spec['username'], spec['password'], args.timeout)
+        return session.run(args.iterations, args.search_term)
+
+    try:
+        gc.collect()
+        rss_before = _rss_bytes()
+        simulator.stats.reset()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            results = list(pool.map(worker, range(args.sessions)))
+        elapsed = time.perf_counter() - start
+        gc.collect()
+        rss_after = _rss_bytes()
+        upstream = simulator.stats.snapshot()
+    finally:
+        simulator.shutdown()
+
+    for result in results:
+        result.state_bytes = _session_state_bytes(result.app)
+        result.app = None
+
+    steps: Dict[str, List[float]] = {}
+    for result in results:
+        for step, samples in result.steps.items():
+            steps.setdefault(step, []).extend(samples)
+    reruns = sum(len(samples) for samples in steps.values())
+    errors = [f"session {r.index} ({r.persona}): {e}" for r in results for e in r.errors]
+
+    return {
+        'sessions': args.sessions,
+        'iterations': args.iterations,
+        'elapsed_s': round(elapsed, 2),
+        'reruns': reruns,
+        'throughput_rps': round(reruns / elapsed, 2) if elapsed else 0.0,
+        'steps': {step: _percentiles(samples) for step, samples in sorted(steps.items())},
+        'memory': {
+            'rss_delta_mib': round((rss_after - rss_before) / 2 ** 20, 1),
+            'rss_per_session_kib': round((rss_after - rss_before) / 1024 / max(args.sessions, 1), 1),
+            'session_state_kib_mean': round(statistics.mean(r.state_bytes for r in results) / 1024, 1),
+            'session_state_kib_max': round(max(r.state_bytes for r in results) / 1024, 1),
+        },
+        'upstream': {
+            'requests': upstream['requests'],
+            'per_session': round(upstream['requests'] / max(args.sessions, 1), 1),
+            'endpoints': {name: entry['requests'] for name, entry in upstream['endpoints'].items()},
+        },
+        'errors': errors,
+    }
+
+
+def print_report(report: Dict):
+    print(f"\nSessions: {report['sessions']} x {report['iterations']} iteration(s) "
+          f"in {report['elapsed_s']}s - {report['reruns']} reruns, {report['throughput_rps']} reruns/s")
+
+    print(f"\n{'step':<16} {'count':>6} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for step, stats in report['steps'].items():
+        print(f"{step:<16} {stats['count']:>6} {stats['mean_ms']:>7.0f}ms {stats['p50_ms']:>7.0f}ms "
+              f"{stats['p95_ms']:>7.0f}ms {stats['p99_ms']:>7.0f}ms {stats['max_ms']:>7.0f}ms")
+
+    memory = report['memory']
+    print(f"\nMemory: RSS +{memory['rss_delta_mib']}MiB ({memory['rss_per_session_kib']}KiB/session), "
+          f"session_state mean {memory['session_state_kib_mean']}KiB, max {memory['session_state_kib_max']}KiB")
+
+    upstream = report['upstream']
+    print(f"\nUpstream calls: {upstream['requests']} ({upstream['per_session']}/session)")
+    for name, count in sorted(upstream['endpoints'].items(), key=lambda item: item[1], reverse=True):
+        print(f"  {name:<40} {count:>8}")
+
+    if report['errors']:
+        print(f"\n{len(report['errors'])} error(s):")
+        for line in report['errors'][:20]:
+            print(f"  {line}")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='SafeQ Cloud Manager multi-session load test')
+    parser.add_argument('--sessions', type=int, default=10, help='מספר סשנים מקבילים')
+    parser.add_argument('--iterations', type=int, default=1, help='חזרות על התרחיש בכל סשן (אחרי התחברות)')
+    parser.add_argument('--ramp-up', type=float, default=0, help='שניות עד שכל הסשנים התחילו')
+    parser.add_argument('--admin-ratio', type=float, default=0.2, help='חלק הסשנים של מנהלי מערכת')
+    parser.add_argument('--search-term', default='user00*', help='מחרוזת חיפוש לתרחיש המנהל')
+    parser.add_argument('--timeout', type=float, default=120, help='זמן מקסימלי ל-rerun בודד (שניות)')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--documents', type=int, default=200000)
+    parser.add_argument('--departments', type=int, default=50)
+    parser.add_argument('--days', type=int, default=60, help='טווח ההיסטוריה בסימולטור')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency-ms', type=float, default=0, help='השהיית רשת מדומה בסימולטור')
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--json', help='שמירת התוצאות ל-JSON')
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.sessions < 1:
+        print('--sessions must be at least 1')
+        return 2
+    report = run_load_test(args)
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\nSaved {args.json}")
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
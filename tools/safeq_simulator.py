@@ -0,0 +1,823 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SafeQ Cloud API Simulator
+שרת מקומי שמחקה את נקודות הקצה של SafeQ Cloud שהאפליקציה משתמשת בהן,
+לבדיקות ביצועים ועומס ללא גישה ל-tenant האמיתי.
+
+הנתונים סינתטיים ודטרמיניסטיים (לפי seed) ולא נשמרים בזיכרון: משתמש, קבוצה
+ומסמך נבנים מהאינדקס שלהם, כך שגם tenant של מיליוני מסמכים עולה מיד.
+שינויים (יצירה/עדכון/מחיקה/חברות בקבוצות) נשמרים בזיכרון מעל הנתונים הבסיסיים.
+
+נקודות קצה:
+    GET    /api/v1/users/all            ?providerid&maxrecords
+    GET    /api/v1/users                ?username
+    PUT    /api/v1/users                (יצירה, form)
+    POST   /api/v1/users/{username}     (עדכון פרט, form)
+    DELETE /api/v1/users/{username}
+    GET/PUT/DELETE /api/v1/users/{username}/groups
+    GET    /api/v1/groups               ?providerId&maxRecords
+    GET    /api/v1/groups/{group}/members
+    GET    /api/v1/documents/history    ?datestart&dateend&username&jobtype&status&maxrecords&pagetoken
+    POST   /api/v1/documents/history
+    GET    /api/v1/documents
+    GET    /api/v1/outputports, /api/v1/inputports
+
+נקודות ניהול:
+    GET  /__stats    - ספירת בקשות, סטטוסים וזמני תגובה לכל endpoint
+    POST /__config   - שינוי latency/failure בזמן ריצה (JSON)
+    POST /__reset    - איפוס הסטטיסטיקה
+
+הרצה:
+    python tools/safeq_simulator.py --users 50000 --groups 2000 --documents 5000000 \\
+        --latency-ms 40 --jitter-ms 20 --failure-rate 0.01
+
+    ואז SERVER_URL=http://127.0.0.1:8765 באפליקציה.
+"""
+
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, parse_qsl, unquote, urlparse
+
+JOB_TYPES = ('PRINT', 'PRINT', 'PRINT', 'COPY', 'COPY', 'SCAN', 'FAX')
+PAPER_SIZES = ('A4', 'A4', 'A4', 'A3', 'Letter')
+# רוב המסמכים הודפסו; חלק נמחקו/פגו/נכשלו/ממתינים
+STATUSES = (1, 1, 1, 1, 1, 1, 2, 3, 4, 0)
+
+MAX_HISTORY_PAGE = 2000
+
+# קבוצת ההרשאה של מנהלי בתי ספר (REPORTS_VIEW_GROUP)
+REPORTS_VIEW_GROUP = 'Reports-View'
+
+
+def _mix(value: int, seed: int) -> int:
+    """hash שלמים מהיר ודטרמיניסטי (splitmix64)"""
+    z = (value + seed * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+    return z ^ (z >> 31)
+
+
+def _parse_iso(value: str) -> datetime:
+    """ISO-8601 כפי שהאפליקציה שולחת (עם Z / מיקרו-שניות)"""
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _encode_token(index: int) -> str:
+    return base64.urlsafe_b64encode(f"doc:{index}".encode()).decode().rstrip('=')
+
+
+def _decode_token(token: str) -> int:
+    padded = token + '=' * (-len(token) % 4)
+    prefix, _, index = base64.urlsafe_b64decode(padded).decode().partition(':')
+    if prefix != 'doc':
+        raise ValueError('invalid page token')
+    return int(index)
+
+
+class Tenant:
+    """
+    tenant סינתטי
+
+    Args:
+        users: מספר משתמשים (כל רביעי מקומי, השאר Entra)
+        groups: מספר קבוצות
+        documents: מספר מסמכים בהיסטוריה, מפוזרים באופן אחיד על פני days
+        departments: מספר מחלקות/בתי ספר
+        days: טווח ההיסטוריה בימים, עד end
+        printers: מספר מדפסות (output ports)
+        seed: זרע לנתונים
+        end: סוף טווח ההיסטוריה (ברירת מחדל: חצות הלילה הקרוב UTC)
+        local_provider / entra_provider: מזהי הספקים (כמו PROVIDER_LOCAL / PROVIDER_ENTRA)
+    """
+
+    def __init__(self, users: int = 1000, groups: int = 100, documents: int = 100000,
+                 departments: int = 50, days: int = 365, printers: int = 200, seed: int = 1,
+                 end: Optional[datetime] = None, local_provider: int = 12348, entra_provider: int = 12351):
+        self.user_count = users
+        self.group_count = max(groups, 1)
+        self.document_count = documents
+        self.department_count = max(departments, 1)
+        self.printer_count = max(printers, 1)
+        self.seed = seed
+        self.local_provider = local_provider
+        self.entra_provider = entra_provider
+
+        if end is None:
+            end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        self.end_ms = int(end.timestamp() * 1000)
+        self.start_ms = self.end_ms - days * 86400 * 1000
+
+        # שכבת שינויים מעל הנתונים הבסיסיים
+        self._lock = threading.Lock()
+        self._created: Dict[str, Dict] = {}
+        self._updated: Dict[str, Dict] = {}
+        self._deleted: set = set()
+        self._memberships_added: Dict[str, set] = {}
+        self._memberships_removed: Dict[str, set] = {}
+        self._recorded_jobs: List[Dict] = []
+
+    # ---------- שמות ----------
+
+    def department_name(self, index: int) -> str:
+        # פורמט המחלקות האמיתי: "שם - מספר" (כמו בקבוצות Entra)
+        return f"בית ספר {index:03d} - {240000 + index}"
+
+    def group_name(self, index: int) -> str:
+        return f"group-{index:04d}"
+
+    def printer_name(self, index: int) -> str:
+        return f"PRN-{index:04d}"
+
+    def username(self, index: int) -> str:
+        if index % 4 == 0:
+            return f"local{index:06d}"
+        return f"user{index:06d}@school.example"
+
+    def user_index(self, username: str) -> Optional[int]:
+        name = username.lower()
+        for prefix, suffix in (('local', ''), ('user', '@school.example')):
+            if name.startswith(prefix) and name.endswith(suffix):
+                digits = name[len(prefix):len(name) - len(suffix)]
+                if digits.isdigit():
+                    index = int(digits)
+                    if index < self.user_count and self.username(index) == name:
+                        return index
+        return None
+
+    def group_index(self, group: str) -> Optional[int]:
+        if group.startswith('group-') and group[6:].isdigit():
+            index = int(group[6:])
+            if index < self.group_count:
+                return index
+        return None
+
+    # ---------- משתמשים ----------
+
+    def _base_user(self, index: int) -> Dict:
+        h = _mix(index, self.seed)
+        username = self.username(index)
+        department = self.department_name(index % self.department_count)
+        return {
+            'userName': username,
+            'providerId': self.local_provider if index % 4 == 0 else self.entra_provider,
+            'fullName': f"משתמש {index}",
+            'email': f"user{index:06d}@school.example",
+            'shortId': f"{h % 1000000:06d}",
+            'department': department,
+            'details': [
+                {'detailType': 0, 'detailData': f"משתמש {index}"},
+                {'detailType': 1, 'detailData': f"user{index:06d}@school.example"},
+                {'detailType': 11, 'detailData': department},
+            ],
+            'cards': [f"{h % 10 ** 10:010d}"],
+        }
+
+    def get_user(self, username: str) -> Optional[Dict]:
+        key = username.lower()
+        with self._lock:
+            if key in self._deleted:
+                return None
+            if key in self._created:
+                user = dict(self._created[key])
+            else:
+                index = self.user_index(key)
+                if index is None:
+                    return None
+                user = self._base_user(index)
+            user.update(self._updated.get(key, {}))
+        return user
+
+    def list_users(self, provider_id: Optional[int], max_records: Optional[int]) -> List[Dict]:
+        limit = max_records if max_records and max_records > 0 else None
+        result = []
+        for index in range(self.user_count):
+            if provider_id is not None and (self.local_provider if index % 4 == 0 else self.entra_provider) != provider_id:
+                continue
+            user = self.get_user(self.username(index))
+            if user is not None:
+                result.append(user)
+                if limit is not None and len(result) >= limit:
+                    return result
+        with self._lock:
+            created = [dict(user, **self._updated.get(key, {})) for key, user in self._created.items()
+                       if key not in self._deleted]
+        for user in created:
+            if provider_id is None or user.get('providerId') == provider_id:
+                result.append(user)
+                if limit is not None and len(result) >= limit:
+                    break
+        return result
+
+    def create_user(self, fields: List[Tuple[str, str]]) -> bool:
+        values = dict(fields)
+        username = values.get('username', '').strip()
+        if not username or self.get_user(username) is not None:
+            return False
+        detail_types = [value for key, value in fields if key == 'detailtype']
+        detail_data = [value for key, value in fields if key == 'detaildata']
+        user = {
+            'userName': username,
+            'providerId': int(values.get('providerid', self.local_provider)),
+            'fullName': '', 'email': '', 'shortId': '', 'department': '',
+            'details': [], 'cards': [],
+        }
+        for detail_type, data in zip(detail_types, detail_data):
+            self._apply_detail(user, int(detail_type), data)
+        key = username.lower()
+        with self._lock:
+            self._deleted.discard(key)
+            self._created[key] = user
+        return True
+
+    @staticmethod
+    def _apply_detail(user: Dict, detail_type: int, data: str):
+        field = {0: 'fullName', 1: 'email', 5: 'shortId', 6: 'shortId', 11: 'department'}.get(detail_type)
+        if field:
+            user[field] = data
+        if detail_type == 4:
+            user['cards'] = [data]
+        details = [d for d in user.get('details', []) if d.get('detailType') != detail_type]
+        details.append({'detailType': detail_type, 'detailData': data})
+        user['details'] = details
+
+    def update_user(self, username: str, detail_type: int, data: str) -> bool:
+        user = self.get_user(username)
+        if user is None:
+            return False
+        self._apply_detail(user, detail_type, data)
+        with self._lock:
+            self._updated[username.lower()] = {
+                key: user[key] for key in ('fullName', 'email', 'shortId', 'department', 'details', 'cards')
+            }
+        return True
+
+    def delete_user(self, username: str) -> bool:
+        if self.get_user(username) is None:
+            return False
+        with self._lock:
+            self._deleted.add(username.lower())
+        return True
+
+    # ---------- קבוצות ----------
+
+    def _base_groups_of(self, index: int) -> List[int]:
+        primary = index % self.group_count
+        secondary = (index // self.group_count) % self.group_count
+        return [primary] if primary == secondary else [primary, secondary]
+
+    def _base_members_of(self, group: int) -> List[int]:
+        g = self.group_count
+        members = set(range(group, self.user_count, g))
+        # חברות משנית: (i // g) % g == group
+        block = group * g
+        while block < self.user_count:
+            members.update(range(block, min(block + g, self.user_count)))
+            block += g * g
+        return sorted(members)
+
+    def department_index(self, group: str) -> Optional[int]:
+        number = group.rpartition(' - ')[2]
+        if number.isdigit():
+            index = int(number) - 240000
+            if 0 <= index < self.department_count and self.department_name(index) == group:
+                return index
+        return None
+
+    def _known_group(self, group: str) -> bool:
+        return group == REPORTS_VIEW_GROUP or self.group_index(group) is not None \
+            or self.department_index(group) is not None
+
+    def _base_user_groups(self, index: int) -> List[str]:
+        """
+        קבוצות בסיס: שתי קבוצות כלליות לכל משתמש, ומשתמשים מקומיים הם מנהלי
+        בית ספר (Reports-View + קבוצת המחלקה שלהם)
+        """
+        groups = [self.group_name(g) for g in self._base_groups_of(index)]
+        if index % 4 == 0:
+            groups += [REPORTS_VIEW_GROUP, self.department_name(index % self.department_count)]
+        return groups
+
+    def list_groups(self, max_records: Optional[int]) -> List[Dict]:
+        names = [REPORTS_VIEW_GROUP] + [self.department_name(i) for i in range(self.department_count)] + \
+            [self.group_name(i) for i in range(self.group_count)]
+        if max_records and max_records > 0:
+            names = names[:max_records]
+        return [{'groupId': name, 'groupName': name} for name in names]
+
+    def user_groups(self, username: str) -> Optional[List[Dict]]:
+        key = username.lower()
+        if self.get_user(key) is None:
+            return None
+        index = self.user_index(key)
+        groups = set(self._base_user_groups(index)) if index is not None else set()
+        with self._lock:
+            groups |= self._memberships_added.get(key, set())
+            groups -= self._memberships_removed.get(key, set())
+        return [{'groupId': name, 'groupName': name} for name in sorted(groups)]
+
+    def group_members(self, group: str) -> Optional[List[Dict]]:
+        if group == REPORTS_VIEW_GROUP:
+            indexes = range(0, self.user_count, 4)
+        elif self.department_index(group) is not None:
+            # רק המשתמשים המקומיים של המחלקה (מנהלים)
+            department = self.department_index(group)
+            indexes = [i for i in range(department, self.user_count, self.department_count) if i % 4 == 0]
+        elif self.group_index(group) is not None:
+            indexes = self._base_members_of(self.group_index(group))
+        else:
+            return None
+        names = [self.username(i) for i in indexes]
+        with self._lock:
+            names = [n for n in names if group not in self._memberships_removed.get(n, ())]
+            base = set(names)
+            names += sorted(u for u, added in self._memberships_added.items() if group in added and u not in base)
+        members = []
+        for name in names:
+            user = self.get_user(name)
+            if user is not None:
+                members.append(user)
+        return members
+
+    def set_membership(self, username: str, group: str, member: bool) -> bool:
+        key = username.lower()
+        if self.get_user(key) is None or not self._known_group(group):
+            return False
+        with self._lock:
+            added = self._memberships_added.setdefault(key, set())
+            removed = self._memberships_removed.setdefault(key, set())
+            if member:
+                added.add(group)
+                removed.discard(group)
+            else:
+                removed.add(group)
+                added.discard(group)
+        return True
+
+    # ---------- מסמכים ----------
+
+    def document_time(self, index: int) -> int:
+        span = self.end_ms - self.start_ms
+        return self.start_ms + index * span // max(self.document_count, 1)
+
+    def _first_index_at(self, timestamp_ms: int) -> int:
+        """האינדקס הראשון שזמנו >= timestamp (הזמנים עולים עם האינדקס)"""
+        lo, hi = 0, self.document_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.document_time(mid) < timestamp_ms:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def document(self, index: int) -> Dict:
+        h = _mix(index, self.seed + 7)
+        user_index = h % self.user_count if self.user_count else 0
+        total_pages = 1 + (h >> 8) % 20
+        copies = 1 + ((h >> 16) % 10 == 0)
+        color = (h >> 20) % 3 == 0
+        return {
+            'documentId': index,
+            'userName': self.username(user_index),
+            'fullName': f"משתמש {user_index}",
+            'dateTime': self.document_time(index),
+            'status': STATUSES[(h >> 24) % len(STATUSES)],
+            'jobType': JOB_TYPES[(h >> 28) % len(JOB_TYPES)],
+            'documentName': f"document-{index}.pdf",
+            'totalPages': total_pages * copies,
+            'colorPages': total_pages * copies if color else 0,
+            'copies': copies,
+            'duplex': (h >> 32) % 2 == 0,
+            'paperSize': PAPER_SIZES[(h >> 36) % len(PAPER_SIZES)],
+            'outputPortName': self.printer_name((h >> 40) % self.printer_count),
+            'tags': [{'name': self.department_name(user_index % self.department_count), 'tagType': 0}],
+        }
+
+    def history(self, params: Dict[str, str]) -> Dict:
+        """עמוד היסטוריה: מסנן לפי טווח, משתמש, סוג וסטטוס, עם nextPageToken"""
+        now_ms = int(time.time() * 1000)
+        date_end = _parse_iso(params['dateend']) if params.get('dateend') else None
+        date_start = _parse_iso(params['datestart']) if params.get('datestart') else None
+        end_ms = int(date_end.timestamp() * 1000) if date_end else now_ms
+        start_ms = int(date_start.timestamp() * 1000) if date_start else end_ms - 86400 * 1000
+
+        page_size = min(int(params.get('maxrecords') or 200), MAX_HISTORY_PAGE)
+        username = (params.get('username') or '').lower()
+        job_type = (params.get('jobtype') or '').upper()
+        statuses = {int(s) for s in params['status'].split(',') if s.strip()} if params.get('status') else None
+
+        first = self._first_index_at(start_ms)
+        stop = self._first_index_at(end_ms + 1)
+        index = max(first, _decode_token(params['pagetoken'])) if params.get('pagetoken') else first
+
+        # סינון אחרי יצירה - כמו בשרת אמיתי, עמוד מסונן יכול להיות קצר מ-maxrecords
+        scan_limit = page_size * 50
+        documents = []
+        scanned = 0
+        while index < stop and len(documents) < page_size and scanned < scan_limit:
+            doc = self.document(index)
+            index += 1
+            scanned += 1
+            if username and doc['userName'] != username:
+                continue
+            if job_type and doc['jobType'] != job_type:
+                continue
+            if statuses is not None and doc['status'] not in statuses:
+                continue
+            documents.append(doc)
+
+        with self._lock:
+            if index >= stop:
+                documents += [
+                    job for job in self._recorded_jobs
+                    if start_ms <= job['dateTime'] <= end_ms and (not username or job['userName'] == username)
+                ][:max(page_size - len(documents), 0)]
+
+        result = {'documents': documents, 'recordsOnPage': len(documents)}
+        if index < stop:
+            result['nextPageToken'] = _encode_token(index)
+        return result
+
+    def record_job(self, fields: Dict[str, str]) -> bool:
+        if not fields.get('jobtype'):
+            return False
+        when = _parse_iso(fields['datetime']) if fields.get('datetime') else datetime.now(timezone.utc)
+        with self._lock:
+            self._recorded_jobs.append({
+                'documentId': -(len(self._recorded_jobs) + 1),
+                'userName': fields.get('username', ''),
+                'dateTime': int(when.timestamp() * 1000),
+                'status': 1,
+                'jobType': fields['jobtype'].upper(),
+                'documentName': fields.get('title', ''),
+                'totalPages': int(fields.get('totalpages') or 0),
+                'colorPages': int(fields.get('colorpages') or 0),
+                'copies': 1,
+                'duplex': fields.get('duplex') == 'true',
+                'paperSize': fields.get('papersize', ''),
+                'outputPortName': '',
+                'tags': [],
+            })
+        return True
+
+    # ---------- מדפסות ----------
+
+    def output_ports(self) -> List[Dict]:
+        ports = []
+        for index in range(self.printer_count):
+            h = _mix(index, self.seed + 13)
+            ports.append({
+                'id': index + 1,
+                'name': self.printer_name(index),
+                'description': f"מדפסת {index}",
+                'address': f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+                'deviceSerial': f"SN{h % 10 ** 8:08d}",
+                'vendor': ('HP', 'Konica Minolta', 'Ricoh', 'Canon')[h % 4],
+                'containerName': self.department_name(index % self.department_count),
+                'monochrome': (h >> 8) % 3 == 0,
+                'embedded': True,
+            })
+        return ports
+
+    def input_ports(self) -> List[Dict]:
+        ports = []
+        for index in range(self.department_count):
+            ports.append({
+                'id': index + 1,
+                'name': f"Queue-{index:03d}",
+                'portType': ('Direct', 'Follow-Me', 'Virtual')[index % 3],
+                'containerName': self.department_name(index),
+                'outputPortName': self.printer_name(index % self.printer_count),
+            })
+        return ports
+
+
+class SimulatorStats:
+    """ספירת בקשות לכל endpoint (לבדיקת העומס שהאפליקציה מייצרת)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.endpoints: Dict[str, Dict] = {}
+
+    def record(self, endpoint: str, status: int, seconds: float, size: int):
+        with self._lock:
+            entry = self.endpoints.setdefault(endpoint, {
+                'requests': 0, 'statuses': {}, 'total_seconds': 0.0, 'max_seconds': 0.0, 'bytes': 0
+            })
+            entry['requests'] += 1
+            entry['statuses'][str(status)] = entry['statuses'].get(str(status), 0) + 1
+            entry['total_seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            entry['bytes'] += size
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            elapsed = time.time() - self.started
+            endpoints = {}
+            for name, entry in sorted(self.endpoints.items()):
+                endpoints[name] = dict(
+                    entry,
+                    statuses=dict(entry['statuses']),
+                    avg_ms=round(entry['total_seconds'] / entry['requests'] * 1000, 2),
+                    max_ms=round(entry['max_seconds'] * 1000, 2),
+                )
+            total = sum(e['requests'] for e in endpoints.values())
+            return {
+                'uptime_seconds': round(elapsed, 1),
+                'requests': total,
+                'requests_per_second': round(total / elapsed, 2) if elapsed else 0.0,
+                'endpoints': endpoints,
+            }
+
+
+class Faults:
+    """הזרקת השהיה ותקלות (ניתן לשינוי בזמן ריצה דרך /__config)"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, per_record_us: float = 0,
+                 failure_rate: float = 0, failure_status: int = 503, seed: int = 1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.per_record_us = per_record_us
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def update(self, values: Dict):
+        for key in ('latency_ms', 'jitter_ms', 'per_record_us', 'failure_rate'):
+            if key in values:
+                setattr(self, key, float(values[key]))
+        if 'failure_status' in values:
+            self.failure_status = int(values['failure_status'])
+
+    def as_dict(self) -> Dict:
+        return {
+            'latency_ms': self.latency_ms, 'jitter_ms': self.jitter_ms, 'per_record_us': self.per_record_us,
+            'failure_rate': self.failure_rate, 'failure_status': self.failure_status,
+        }
+
+    def delay(self, records: int) -> float:
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(self.latency_ms + jitter, 0) / 1000 + records * self.per_record_us / 1_000_000
+
+    def should_fail(self) -> bool:
+        if not self.failure_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.failure_rate
+
+
+# תבניות endpoint לסטטיסטיקה (ללא שמות משתמשים/קבוצות)
+def _endpoint_label(method: str, parts: List[str]) -> str:
+    template = list(parts)
+    if len(parts) >= 4 and parts[2] == 'users' and parts[3] != 'all':
+        template[3] = '{username}'
+    if len(parts) >= 4 and parts[2] == 'groups':
+        template[3] = '{group}'
+    return f"{method} /{'/'.join(template)}"
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'SafeQSimulator/1.0'
+
+    # מוגדרים על ה-server
+    @property
+    def tenant(self) -> Tenant:
+        return self.server.tenant
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+    def _read_body(self) -> str:
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length).decode('utf-8') if length else ''
+
+    def _send(self, status: int, payload=None) -> int:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+        return len(body)
+
+    def _handle(self, method: str):
+        started = time.perf_counter()
+        parsed = urlparse(self.path)
+        parts = [unquote(p) for p in parsed.path.strip('/').split('/') if p]
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        body = self._read_body()
+
+        if parts and parts[0].startswith('__'):
+            self._handle_admin(method, parts[0], body)
+            return
+
+        form = parse_qsl(body, keep_blank_values=True)
+
+        endpoint = _endpoint_label(method, parts)
+        api_key = self.server.api_key
+        if api_key and self.headers.get('X-Api-Key') != api_key:
+            size = self._send(401, {'error': 'invalid api key'})
+            self.server.stats.record(endpoint, 401, time.perf_counter() - started, size)
+            return
+
+        try:
+            status, payload = self._route(method, parts, query, form)
+        except (ValueError, KeyError) as e:
+            status, payload = 400, {'error': str(e)}
+
+        faults = self.server.faults
+        if faults.should_fail():
+            status, payload = faults.failure_status, {'error': 'injected failure'}
+
+        records = len(payload.get('documents', payload.get('items', ()))) if isinstance(payload, dict) else \
+            len(payload) if isinstance(payload, list) else 0
+        delay = faults.delay(records)
+        if delay:
+            time.sleep(delay)
+
+        size = self._send(status, payload)
+        self.server.stats.record(endpoint, status, time.perf_counter() - started, size)
+
+    def _route(self, method: str, parts: List[str], query: Dict[str, str], form: List[Tuple[str, str]]):
+        if len(parts) < 3 or parts[:2] != ['api', 'v1']:
+            return 404, {'error': 'not found'}
+
+        resource, rest = parts[2], parts[3:]
+        tenant = self.tenant
+
+        if resource == 'users':
+            if rest == ['all'] and method == 'GET':
+                provider = query.get('providerid')
+                max_records = query.get('maxrecords')
+                return 200, {'items': tenant.list_users(int(provider) if provider else None,
+                                                        int(max_records) if max_records else None)}
+            if not rest:
+                if method == 'GET':
+                    user = tenant.get_user(query.get('username', ''))
+                    return 200, {'items': [user] if user else []}
+                if method == 'PUT':
+                    return (200, {}) if tenant.create_user(form) else (409, {'error': 'user exists'})
+            elif len(rest) == 1:
+                username = rest[0]
+                if method == 'POST':
+                    fields = dict(form)
+                    ok = tenant.update_user(username, int(fields['detailtype']), fields.get('detaildata', ''))
+                    return (200, {}) if ok else (404, {'error': 'user not found'})
+                if method == 'DELETE':
+                    return (200, {}) if tenant.delete_user(username) else (404, {'error': 'user not found'})
+            elif len(rest) == 2 and rest[1] == 'groups':
+                username = rest[0]
+                if method == 'GET':
+                    groups = tenant.user_groups(username)
+                    return (200, {'items': groups}) if groups is not None else (404, {'error': 'user not found'})
+                if method in ('PUT', 'DELETE'):
+                    group = dict(form).get('groupid') if method == 'PUT' else query.get('groupid')
+                    ok = tenant.set_membership(username, group or '', method == 'PUT')
+                    return (200, {}) if ok else (404, {'error': 'user or group not found'})
+
+        elif resource == 'groups' and method == 'GET':
+            if not rest:
+                max_records = query.get('maxRecords') or query.get('maxrecords')
+                return 200, {'items': tenant.list_groups(int(max_records) if max_records else None)}
+            if len(rest) == 2 and rest[1] == 'members':
+                members = tenant.group_members(rest[0])
+                return (200, members) if members is not None else (404, {'error': 'group not found'})
+
+        elif resource == 'documents':
+            if rest == ['history']:
+                if method == 'GET':
+                    return 200, tenant.history(query)
+                if method == 'POST':
+                    return (200, {}) if tenant.record_job(dict(form)) else (400, {'error': 'jobtype required'})
+            if not rest and method == 'GET':
+                return 200, {'items': []}
+
+        elif resource == 'outputports' and method == 'GET':
+            return 200, {'items': tenant.output_ports()}
+
+        elif resource == 'inputports' and method == 'GET':
+            return 200, tenant.input_ports()
+
+        return 404, {'error': 'not found'}
+
+    def _handle_admin(self, method: str, name: str, body: str):
+        server = self.server
+        if name == '__stats' and method == 'GET':
+            self._send(200, dict(server.stats.snapshot(), faults=server.faults.as_dict()))
+        elif name == '__config' and method == 'POST':
+            server.faults.update(json.loads(body or '{}'))
+            self._send(200, server.faults.as_dict())
+        elif name == '__reset' and method == 'POST':
+            server.stats.reset()
+            self._send(200, {})
+        else:
+            self._send(404, {'error': 'not found'})
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, tenant: Tenant, faults: Faults, api_key: str = '', verbose: bool = False):
+        super().__init__(address, SimulatorHandler)
+        self.tenant = tenant
+        self.faults = faults
+        self.api_key = api_key
+        self.verbose = verbose
+        self.stats = SimulatorStats()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_simulator(tenant: Optional[Tenant] = None, faults: Optional[Faults] = None,
+                    host: str = '127.0.0.1', port: int = 0, api_key: str = '') -> SimulatorServer:
+    """הפעלת הסימולטור ב-thread רקע (port=0 = פורט פנוי אקראי); לעצירה: server.shutdown()"""
+    server = SimulatorServer((host, port), tenant or Tenant(), faults or Faults(), api_key=api_key)
+    threading.Thread(target=server.serve_forever, name='safeq-simulator', daemon=True).start()
+    return server
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='SafeQ Cloud API simulator')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--api-key', default='', help='X-Api-Key נדרש (ריק = ללא בדיקה)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--groups', type=int, default=100)
+    parser.add_argument('--documents', type=int, default=100000)
+    parser.add_argument('--departments', type=int, default=50)
+    parser.add_argument('--printers', type=int, default=200)
+    parser.add_argument('--days', type=int, default=365, help='טווח ההיסטוריה בימים')
+    parser.add_argument('--end-date', help='סוף טווח ההיסטוריה (YYYY-MM-DD, ברירת מחדל: מחר)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--local-provider', type=int, default=12348)
+    parser.add_argument('--entra-provider', type=int, default=12351)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--per-record-us', type=float, default=0, help='השהיה נוספת לכל רשומה בתגובה')
+    parser.add_argument('--failure-rate', type=float, default=0, help='שיעור תגובות שגיאה (0-1)')
+    parser.add_argument('--failure-status', type=int, default=503)
+    parser.add_argument('--verbose', action='store_true')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    end = _parse_iso(args.end_date) if args.end_date else None
+    tenant = Tenant(
+        users=args.users, groups=args.groups, documents=args.documents, departments=args.departments,
+        days=args.days, printers=args.printers, seed=args.seed, end=end,
+        local_provider=args.local_provider, entra_provider=args.entra_provider
+    )
+    faults = Faults(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, per_record_us=args.per_record_us,
+        failure_rate=args.failure_rate, failure_status=args.failure_status, seed=args.seed
+    )
+    server = SimulatorServer((args.host, args.port), tenant, faults, api_key=args.api_key, verbose=args.verbose)
+    print(f"SafeQ simulator on {server.url} - {args.users} users, {args.groups} groups, "
+          f"{args.documents} documents over {args.days} days")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()